@@ -0,0 +1,70 @@
+"""Compare PDF chunking before and after the token-aware structural chunker.
+
+Loads each PDF with ``document_loader.load_document`` and splits it with the
+previous ``CharacterTextSplitter('\\n', 1000, 200)`` and with
+``chunking.split_documents``, reporting chunk count, mean/max chunk tokens,
+the share of chunks longer than the embedding window (truncated by the
+model) and the time to embed all chunks without the embedding cache.
+
+Usage:
+    python benchmarks/bench_chunking.py sample_data/*.pdf
+    python benchmarks/bench_chunking.py --no-embed brochure.pdf
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_text_splitters.character import CharacterTextSplitter  # noqa: E402
+
+import chunking  # noqa: E402
+from document_loader import load_document  # noqa: E402
+from embedding_model import EMBEDDING_MAX_TOKENS, get_embedding_model, get_tokenizer  # noqa: E402
+
+
+def previous_split(documents):
+    """The splitter setup_vectorstore used before structural chunking."""
+    splitter = CharacterTextSplitter(separator='\n', chunk_size=1000, chunk_overlap=200, length_function=len)
+    return splitter.split_documents(documents)
+
+
+def report(label: str, chunks, embed: bool):
+    tokens = np.array(chunking.count_tokens([chunk.page_content for chunk in chunks]) or [0])
+    line = (f"{label:<8} {len(chunks):>7} chunks  mean {tokens.mean():6.1f} tokens  max {tokens.max():5d}  "
+            f"over window {np.mean(tokens > EMBEDDING_MAX_TOKENS):6.1%}")
+    if embed and chunks:
+        model = get_embedding_model().embeddings  # bypass the embedding cache
+        start = time.perf_counter()
+        model.embed_documents([chunk.page_content for chunk in chunks])
+        line += f"  embed {time.perf_counter() - start:7.2f}s"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="*", help="PDF files (default: sample_data/*.pdf)")
+    parser.add_argument("--no-embed", action="store_true", help="skip the embedding timing")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    pdfs = args.pdfs or sorted(glob.glob(os.path.join(backend_dir, "sample_data", "*.pdf")))
+    if not pdfs:
+        parser.error("no PDF files given and none found in sample_data/")
+
+    documents = []
+    for path in pdfs:
+        documents.extend(load_document(path))
+    counter = "model tokenizer" if get_tokenizer() is not None else "estimated (no tokenizer)"
+    print(f"\n{len(pdfs)} PDFs, {len(documents)} loaded documents, token counts: {counter}\n")
+
+    report("before", previous_split(documents), not args.no_embed)
+    report("after", chunking.split_documents(documents), not args.no_embed)
+
+
+if __name__ == "__main__":
+    main()
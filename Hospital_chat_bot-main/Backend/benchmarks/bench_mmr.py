@@ -0,0 +1,121 @@
+"""Compare the in-house vectorized MMR with LangChain's MMR retriever path.
+
+For each (k, fetch_k, lambda_mult) setting the chat endpoints use, times
+per query:
+
+- retrieval: LangChain's ``max_marginal_relevance_search_by_vector`` (search,
+  one ``reconstruct`` per candidate, MMR, docstore lookups) against
+  ``retrieval.mmr_search_by_vectors`` plus the same docstore lookups;
+- MMR stage only: ``maximal_marginal_relevance`` against
+  ``retrieval.mmr_select`` over the same pre-fetched candidate vectors.
+
+Agreement is the share of queries where both return the same chunks in the
+same order. Query embedding is excluded; vectors are synthetic.
+
+Usage:
+    python benchmarks/bench_mmr.py
+    python benchmarks/bench_mmr.py --vectors 50000 --queries 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import retrieval  # noqa: E402
+
+# (k, fetch_k, lambda_mult) used by the chat chain and lookup endpoints in main.py
+SETTINGS = [
+    (15, 30, 0.5),
+    (12, 25, 0.4),
+    (10, 25, 0.5),
+    (8, 20, 0.5),
+    (6, 15, 0.5),
+]
+
+
+def synthetic_vectors(count: int, dim: int) -> np.ndarray:
+    """Clustered unit vectors, so candidate sets contain near-duplicates as real chunks do."""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(1, count // 200), dim))
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.5 * rng.standard_normal((count, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def build_store(vectors: np.ndarray) -> FAISS:
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    chunk_ids = [f"chunk-{position}" for position in range(len(vectors))]
+    docstore = InMemoryDocstore({
+        chunk_id: Document(id=chunk_id, page_content=chunk_id) for chunk_id in chunk_ids
+    })
+    return FAISS(embedding_function=lambda text: [], index=index, docstore=docstore,
+                 index_to_docstore_id=dict(enumerate(chunk_ids)))
+
+
+def per_query_us(run, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        run(query)
+    return (time.perf_counter() - start) * 1e6 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.vectors, args.dim)
+    store = build_store(vectors)
+    rng = np.random.default_rng(1)
+    pairs = rng.integers(0, len(vectors), size=(args.queries, 2))
+    # Between two chunks but not at the exact midpoint, where the first pick is a tie
+    queries = 0.6 * vectors[pairs[:, 0]] + 0.4 * vectors[pairs[:, 1]]
+    queries += 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    print(f"{len(vectors)} vectors x {args.dim} dims, {len(queries)} queries (times in us/query)\n")
+    print(f"{'k':>3} {'fetch_k':>7} {'lambda':>6} | {'langchain':>10} {'in-house':>9} {'speedup':>7} | "
+          f"{'mmr only':>8} {'vectorized':>10} {'speedup':>7} | {'agreement':>9}")
+
+    for k, fetch_k, lambda_mult in SETTINGS:
+        def langchain_search(query):
+            return store.max_marginal_relevance_search_by_vector(
+                query.tolist(), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult)
+
+        def in_house_search(query):
+            [chunk_ids] = retrieval.mmr_search_by_vectors(store, query[None, :], k, fetch_k, lambda_mult)
+            return [store.docstore.search(chunk_id) for chunk_id in chunk_ids]
+
+        _, _, candidates = store.index.search_and_reconstruct(queries, fetch_k)
+        pairs = list(zip(queries, candidates))
+
+        langchain_us = per_query_us(langchain_search, queries)
+        in_house_us = per_query_us(in_house_search, queries)
+        reference_us = per_query_us(
+            lambda pair: maximal_marginal_relevance(pair[0], pair[1], k=k, lambda_mult=lambda_mult), pairs)
+        vectorized_us = per_query_us(
+            lambda pair: retrieval.mmr_select(pair[0], pair[1], k, lambda_mult), pairs)
+
+        agreement = sum(
+            [doc.id for doc in langchain_search(query)] == [doc.id for doc in in_house_search(query)]
+            for query in queries
+        ) / len(queries)
+        print(f"{k:>3} {fetch_k:>7} {lambda_mult:>6} | {langchain_us:>10.1f} {in_house_us:>9.1f} "
+              f"{langchain_us / in_house_us:>6.1f}x | {reference_us:>8.1f} {vectorized_us:>10.1f} "
+              f"{reference_us / vectorized_us:>6.1f}x | {agreement:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark CSV/Excel row-to-Document conversion.
+
+Compares the previous ``DataFrame.iterrows`` conversion with the vectorized,
+streaming path in ``document_loader.load_document`` on a synthetic doctor
+roster, reporting rows/second and peak Python memory for each.
+
+Usage:
+    python benchmarks/bench_tabular.py --rows 50000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.schema import Document  # noqa: E402
+from document_loader import load_document  # noqa: E402
+
+
+def make_roster(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    departments = ["Cardiology", "Neurology", "Orthopedics", "Pediatrics", "Oncology", "ENT"]
+    df = pd.DataFrame({
+        "Doctor Name": [f"Dr. Doctor {i}" for i in range(rows)],
+        "Department": rng.choice(departments, rows),
+        "Qualification": rng.choice(["MBBS", "MBBS, MD", "MBBS, MS", "DNB"], rows),
+        "Experience (years)": rng.integers(1, 40, rows),
+        "Phone": [f"0422-23{i % 100000:05d}" for i in range(rows)],
+        "Consultation Hours": rng.choice(["9 AM - 1 PM", "2 PM - 6 PM", "10 AM - 4 PM"], rows),
+        "Room": rng.integers(100, 999, rows).astype(float),
+    })
+    # Roughly 20% missing cells in the optional columns
+    for col in ["Qualification", "Consultation Hours", "Room"]:
+        df.loc[rng.random(rows) < 0.2, col] = None
+    return df
+
+
+def iterrows_baseline(file_path: str, doc_type: str):
+    """The conversion load_document used before vectorization."""
+    df = pd.read_csv(file_path) if doc_type == "csv" else pd.read_excel(file_path)
+    documents = []
+    for idx, row in df.iterrows():
+        row_text = " | ".join([f"{col}: {row[col]}" for col in df.columns if pd.notna(row[col])])
+        documents.append(Document(
+            page_content=row_text,
+            metadata={"source": os.path.basename(file_path), "row": idx + 1, "type": doc_type}
+        ))
+    return documents
+
+
+def measure(label: str, fn, rows: int):
+    start = time.perf_counter()
+    documents = fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<28} {len(documents):>8} docs  {elapsed:8.2f}s  "
+          f"{rows / elapsed:>10,.0f} rows/s  peak {peak / 1e6:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--skip-excel", action="store_true", help="only benchmark CSV input")
+    args = parser.parse_args()
+
+    df = make_roster(args.rows)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "roster.csv")
+        df.to_csv(csv_path, index=False)
+        print(f"CSV, {args.rows} rows")
+        measure("iterrows (before)", lambda: iterrows_baseline(csv_path, "csv"), args.rows)
+        measure("vectorized (after)", lambda: load_document(csv_path), args.rows)
+
+        if not args.skip_excel:
+            xlsx_path = os.path.join(tmp_dir, "roster.xlsx")
+            df.to_excel(xlsx_path, index=False)
+            print(f"\nExcel, {args.rows} rows")
+            measure("iterrows (before)", lambda: iterrows_baseline(xlsx_path, "excel"), args.rows)
+            measure("read-only stream (after)", lambda: load_document(xlsx_path), args.rows)
+
+
+if __name__ == "__main__":
+    main()
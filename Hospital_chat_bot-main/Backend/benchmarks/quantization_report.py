@@ -0,0 +1,96 @@
+"""Compare quantized vector indexes against the flat index for the current corpus.
+
+Reads the vectors of the saved index snapshot (INDEX_DIR, or --index-dir)
+and builds each candidate index over them, reporting resident memory, query
+latency and top-k overlap with exact flat search. Resident memory is the
+size of the codes the search scans; with re-ranking the full-precision
+vectors are also stored but stay on disk when the snapshot is memory-mapped.
+
+Usage:
+    python benchmarks/quantization_report.py
+    python benchmarks/quantization_report.py --synthetic 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import index_store  # noqa: E402
+
+CONFIGS = [
+    ("none", 0),
+    ("sq8", 0),
+    ("sq8", index_store.RERANK_FACTOR or 4),
+    ("pq", 0),
+    ("pq", index_store.RERANK_FACTOR or 4),
+]
+
+
+def load_snapshot_vectors(index_dir: str) -> np.ndarray:
+    index = faiss.read_index(os.path.join(index_dir, index_store.INDEX_FILE))
+    ivf = faiss.try_extract_index_ivf(index_store._base_index(index))
+    if ivf is not None and not isinstance(index, faiss.IndexRefine):
+        ivf.make_direct_map()
+    if index_store.index_quantization(index) != "none" and not isinstance(index, faiss.IndexRefine):
+        print("Note: snapshot has no full-precision vectors; using decoded (approximate) ones")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def synthetic_vectors(count: int, dim: int = 384) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(1, count // 200), dim))
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.5 * rng.standard_normal((count, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def resident_bytes(index) -> int:
+    if isinstance(index, faiss.IndexRefine):
+        return len(faiss.serialize_index(faiss.downcast_index(index.base_index)))
+    return len(faiss.serialize_index(index))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--index-dir", default=index_store.INDEX_DIR)
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead of the snapshot")
+    parser.add_argument("--index-type", default="flat", choices=["flat", "ivf", "hnsw"])
+    parser.add_argument("--k", type=int, default=30, help="results per query (the chat retriever fetches 30)")
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.synthetic) if args.synthetic else load_snapshot_vectors(args.index_dir)
+    num_vectors = len(vectors)
+    k = min(args.k, num_vectors)
+    rng = np.random.default_rng(1)
+    pairs = rng.integers(0, num_vectors, size=(args.queries, 2))
+    queries = (vectors[pairs[:, 0]] + vectors[pairs[:, 1]]) / 2
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    _, exact_ids = faiss.knn(queries, vectors, k)
+    print(f"{num_vectors} vectors x {vectors.shape[1]} dims, {len(queries)} queries, top-{k}\n")
+    print(f"{'index':<42} {'resident MB':>11} {'total MB':>9} {'build s':>8} {'ms/query':>9} {f'overlap@{k}':>11}")
+
+    for quantization, rerank_factor in CONFIGS:
+        start = time.perf_counter()
+        index = index_store.build_faiss_index(vectors, args.index_type, quantization, rerank_factor)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, ids = index.search(queries, k)
+        ms_per_query = (time.perf_counter() - start) * 1000 / len(queries)
+
+        overlap = sum(len(set(a) & set(e)) for a, e in zip(ids.tolist(), exact_ids.tolist()))
+        print(f"{index_store.describe_index(index):<42} {resident_bytes(index) / 1e6:>11.2f} "
+              f"{len(faiss.serialize_index(index)) / 1e6:>9.2f} {build_seconds:>8.2f} "
+              f"{ms_per_query:>9.3f} {overlap / (len(queries) * k):>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import base64
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote
+
+# Local mirror of downloaded blobs (placed next to this module by default)
+MIRROR_DIR = os.getenv("BLOB_MIRROR_DIR", os.path.join(os.path.dirname(__file__), "blob_mirror"))
+
+
+# =============================================================================
+# LOCAL DIRECTORY STAND-IN FOR THE FIREBASE STORAGE BUCKET
+# =============================================================================
+class LocalBlob:
+    """The subset of ``google.cloud.storage.Blob`` this server uses, backed by a file."""
+
+    def __init__(self, bucket: "LocalDirectoryBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.size = None
+        self.md5_hash = None
+        self.generation = None
+        self.time_created = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.bucket.root, *self.name.split('/'))
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def reload(self):
+        stat = os.stat(self.path)
+        with open(self.path, 'rb') as f:
+            digest = hashlib.md5()
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        self.size = stat.st_size
+        # Same encoding as GCS: base64 of the raw md5 digest
+        self.md5_hash = base64.b64encode(digest.digest()).decode('ascii')
+        self.generation = stat.st_mtime_ns
+        self.time_created = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+
+    def upload_from_filename(self, filename: str):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        shutil.copyfile(filename, self.path)
+        self.reload()
+
+    def download_to_filename(self, filename: str):
+        if not self.exists():
+            raise FileNotFoundError(f"No such blob: {self.name}")
+        shutil.copyfile(self.path, filename)
+
+    def delete(self):
+        if not self.exists():
+            raise FileNotFoundError(f"No such blob: {self.name}")
+        os.remove(self.path)
+
+
+class LocalDirectoryBucket:
+    """Serve ``bucket.blob`` / ``bucket.list_blobs`` from a local directory.
+
+    Lets the document pipeline run without Firebase credentials, e.g. for
+    development and offline testing.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def blob(self, name: str, chunk_size: Optional[int] = None) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def copy_blob(self, blob: LocalBlob, destination_bucket: "LocalDirectoryBucket", new_name: str) -> LocalBlob:
+        new_blob = LocalBlob(destination_bucket, new_name)
+        new_blob.upload_from_filename(blob.path)
+        return new_blob
+
+    def list_blobs(self, prefix: str = "") -> Iterable[LocalBlob]:
+        blobs = []
+        for dir_path, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                relative = os.path.relpath(os.path.join(dir_path, file_name), self.root)
+                name = relative.replace(os.sep, '/')
+                if name.startswith(prefix):
+                    blob = LocalBlob(self, name)
+                    blob.reload()
+                    blobs.append(blob)
+        return sorted(blobs, key=lambda b: b.name)
+
+
+# =============================================================================
+# BLOB MIRROR
+# =============================================================================
+class BlobMirror:
+    """On-disk copies of bucket blobs keyed by blob name and content version.
+
+    A blob is only downloaded when the mirror has no copy for its current
+    generation/md5, so reloading an unchanged bucket reads everything from
+    local disk. Files handed out by ``fetch`` belong to the mirror and must
+    not be deleted by callers.
+    """
+
+    def __init__(self, mirror_dir: str = MIRROR_DIR):
+        self.mirror_dir = mirror_dir
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'downloads': 0}
+
+    @staticmethod
+    def version_key(md5_hash: Optional[str], generation) -> Optional[str]:
+        if md5_hash:
+            return base64.b64decode(md5_hash).hex()
+        if generation:
+            return f"g{generation}"
+        return None
+
+    def _blob_dir(self, blob_name: str) -> str:
+        return os.path.join(self.mirror_dir, quote(blob_name, safe=''))
+
+    def _path_for(self, blob_name: str, version: str) -> str:
+        ext = os.path.splitext(blob_name)[1]
+        return os.path.join(self._blob_dir(blob_name), f"{version}{ext}")
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _install(self, blob_name: str, version: str, staged_path: str) -> str:
+        """Move a fully written file into place and drop older versions of the blob."""
+        final_path = self._path_for(blob_name, version)
+        os.replace(staged_path, final_path)
+        for entry in os.listdir(self._blob_dir(blob_name)):
+            entry_path = os.path.join(self._blob_dir(blob_name), entry)
+            if entry_path != final_path and not entry.endswith('.part'):
+                try:
+                    os.remove(entry_path)
+                except OSError:
+                    pass
+        return final_path
+
+    def fetch(self, blob, md5_hash: Optional[str] = None, generation=None) -> str:
+        """Return a local path holding ``blob``'s content, downloading only if needed."""
+        version = self.version_key(md5_hash, generation) or "unversioned"
+        final_path = self._path_for(blob.name, version)
+        if version != "unversioned" and os.path.exists(final_path):
+            self._count('hits')
+            return final_path
+
+        os.makedirs(self._blob_dir(blob.name), exist_ok=True)
+        staged_path = f"{final_path}.{uuid.uuid4().hex}.part"
+        try:
+            blob.download_to_filename(staged_path)
+            self._count('downloads')
+            return self._install(blob.name, version, staged_path)
+        finally:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+
+    def store(self, blob_name: str, md5_hash: Optional[str], generation, source_path: str) -> Optional[str]:
+        """Seed the mirror with a local file known to match the blob (e.g. right after upload)."""
+        version = self.version_key(md5_hash, generation)
+        if version is None:
+            return None
+        os.makedirs(self._blob_dir(blob_name), exist_ok=True)
+        staged_path = f"{self._path_for(blob_name, version)}.{uuid.uuid4().hex}.part"
+        try:
+            shutil.copyfile(source_path, staged_path)
+            return self._install(blob_name, version, staged_path)
+        finally:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+
+    def remove(self, blob_name: str):
+        shutil.rmtree(self._blob_dir(blob_name), ignore_errors=True)
+
+    def prune(self, blob_names: Iterable[str]):
+        """Delete mirrored copies of blobs that are no longer in the bucket."""
+        if not os.path.isdir(self.mirror_dir):
+            return
+        keep = {quote(name, safe='') for name in blob_names}
+        for entry in os.listdir(self.mirror_dir):
+            if entry not in keep:
+                shutil.rmtree(os.path.join(self.mirror_dir, entry), ignore_errors=True)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats)
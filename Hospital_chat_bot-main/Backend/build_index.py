@@ -0,0 +1,129 @@
+"""Build the vector index offline and write it as a versioned artifact.
+
+Documents are parsed, chunked and embedded with the same pipeline the API
+server uses (``load_document`` / ``setup_vectorstore``). The result is saved
+under INDEX_ARTIFACT_DIR (or --output-dir) as a ``<version>/`` snapshot plus
+a ``LATEST`` pointer. Servers started with the same INDEX_ARTIFACT_DIR load
+the latest artifact read-only at startup, so parsing and embedding stay out
+of the serving process (set REBUILD_ON_STARTUP=0 there to never build
+in-process). Index settings (VECTOR_INDEX_TYPE, VECTOR_QUANTIZATION, ...)
+are read from the environment and must match the servers'.
+
+Usage:
+    python build_index.py                          # documents in the configured bucket
+    python build_index.py --source-dir ./documents # PDF/CSV/Excel files in a local directory
+    python build_index.py --output-dir ./index_artifacts --keep 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import main as server
+import index_store
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.csv', '.xlsx', '.xls')
+# What each stage's throughput is counted in
+STAGE_UNITS = {
+    'listing': 'files',
+    'loading': 'files',
+    'chunking': 'pages',
+    'embedding': 'chunks',
+    'indexing': 'vectors',
+    'saving': 'chunks',
+}
+
+
+class StageTimer:
+    """Stands in for a ReindexJob and prints the time and throughput of each stage."""
+
+    def __init__(self):
+        self.stage = None
+        self.total = 0
+        self.done = 0
+        self.started_at = None
+        self.timings = {}
+
+    def start_stage(self, stage: str, total: int = 0):
+        self.finish()
+        self.stage = stage
+        self.total = total
+        self.done = 0
+        self.started_at = time.perf_counter()
+
+    def advance(self, count: int = 1):
+        self.done += count
+
+    def finish(self):
+        if self.stage is None:
+            return
+        elapsed = time.perf_counter() - self.started_at
+        count = self.done or self.total
+        unit = STAGE_UNITS.get(self.stage, 'items')
+        rate = f"{count / elapsed:10.1f} {unit}/s" if count and elapsed > 0 else ""
+        print(f"  {self.stage:<10} {elapsed:8.2f}s {count:>8} {unit:<7} {rate}")
+        self.timings[self.stage] = {'seconds': round(elapsed, 3), unit: count}
+        self.stage = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source-dir", help="build from files in this directory instead of the bucket")
+    parser.add_argument("--output-dir", default=index_store.ARTIFACT_DIR,
+                        help="artifact directory (default: INDEX_ARTIFACT_DIR)")
+    parser.add_argument("--keep", type=int, default=3, help="number of artifact versions to keep")
+    args = parser.parse_args()
+    if not args.output_dir:
+        parser.error("set INDEX_ARTIFACT_DIR or pass --output-dir")
+
+    timer = StageTimer()
+    build_start = time.perf_counter()
+    print("Build stages:")
+
+    timer.start_stage('listing')
+    if args.source_dir:
+        paths = sorted(
+            os.path.join(args.source_dir, entry) for entry in os.listdir(args.source_dir)
+            if entry.lower().endswith(SUPPORTED_EXTENSIONS)
+        )
+        files_info = [server.local_file_info(path, os.path.basename(path)) for path in paths]
+    else:
+        files_info = server.list_firebase_files()
+    timer.advance(len(files_info))
+    if not files_info:
+        timer.finish()
+        print("No documents found")
+        sys.exit(1)
+
+    if args.source_dir:
+        results, _ = server.load_local_files([(path, info['name']) for path, info in zip(paths, files_info)], timer)
+        documents = [doc for info in files_info for doc in results.get(info['name'], [])]
+        loaded_files = [info['name'] for info in files_info if info['name'] in results]
+    else:
+        documents, loaded_files = server.load_firebase_documents(files_info, timer)
+    if not documents:
+        timer.finish()
+        print("No documents could be processed")
+        sys.exit(1)
+
+    vectorstore = server.setup_vectorstore(documents, timer)
+    timer.finish()
+    # Files that failed are left out, so a server loading the artifact does not treat them as indexed
+    manifest = index_store.build_manifest([info for info in files_info if info['name'] in loaded_files],
+                                          server.count_documents_by_source(documents))
+    manifest['build'] = {
+        'source': os.path.abspath(args.source_dir) if args.source_dir else 'bucket',
+        'stages': dict(timer.timings),
+    }
+
+    timer.start_stage('saving', vectorstore.index.ntotal)
+    version_dir = index_store.save_artifact(vectorstore, manifest, args.output_dir, args.keep)
+    timer.finish()
+
+    print(f"\nBuilt {index_store.describe_index(vectorstore.index)} index of {vectorstore.index.ntotal} chunks "
+          f"from {len(loaded_files)} of {len(files_info)} files in {time.perf_counter() - build_start:.1f}s")
+    print(f"Artifact: {version_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import json
+import mmap
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+try:
+    from dedup import chunk_sources
+except ImportError:
+    from .dedup import chunk_sources  # type: ignore
+
+# Files making up the on-disk chunk store inside a snapshot directory
+IDS_FILE = "chunk_ids.json"
+OFFSETS_FILE = "chunk_offsets.npy"
+TEXT_FILE = "chunk_text.bin"
+META_FILE = "chunk_meta.bin"
+SOURCES_FILE = "source_chunks.json"
+
+
+# =============================================================================
+# SOURCE FILE -> CHUNK ID MAP
+# =============================================================================
+def _track_sources(source_chunk_ids: Dict[str, Set[str]], docs: Iterable[Tuple[str, Document]]) -> None:
+    for chunk_id, doc in docs:
+        for source in chunk_sources(doc.metadata):
+            source_chunk_ids.setdefault(source, set()).add(chunk_id)
+
+
+def _untrack_sources(source_chunk_ids: Dict[str, Set[str]], docs: Iterable[Tuple[str, Document]]) -> None:
+    for chunk_id, doc in docs:
+        for source in chunk_sources(doc.metadata):
+            chunk_ids = source_chunk_ids.get(source)
+            if chunk_ids is not None:
+                chunk_ids.discard(chunk_id)
+                if not chunk_ids:
+                    del source_chunk_ids[source]
+
+
+def _copy_source_map(source_chunk_ids: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    return {source: set(chunk_ids) for source, chunk_ids in source_chunk_ids.items()}
+
+
+# =============================================================================
+# WRITING
+# =============================================================================
+def write_chunks(directory: str, chunk_ids: List[str], docstore) -> None:
+    """Write the documents for ``chunk_ids`` (in index order) to ``directory``.
+
+    Chunk texts and their JSON metadata are concatenated into two flat files;
+    ``chunk_offsets.npy`` holds the start of record ``i`` in each file at row
+    ``i`` and the end of the last record at row ``n``. ``source_chunks.json``
+    maps each source file to the IDs of the chunks it contributed.
+    """
+    source_chunk_ids: Dict[str, Set[str]] = {}
+    offsets = np.zeros((len(chunk_ids) + 1, 2), dtype=np.int64)
+    with open(os.path.join(directory, TEXT_FILE), 'wb') as text_file, \
+            open(os.path.join(directory, META_FILE), 'wb') as meta_file:
+        for position, chunk_id in enumerate(chunk_ids):
+            doc = docstore.search(chunk_id)
+            if not isinstance(doc, Document):
+                raise ValueError(f"Chunk {chunk_id} is missing from the docstore")
+            text_bytes = doc.page_content.encode('utf-8')
+            meta_bytes = json.dumps(doc.metadata, ensure_ascii=False, default=str).encode('utf-8')
+            text_file.write(text_bytes)
+            meta_file.write(meta_bytes)
+            offsets[position + 1] = offsets[position] + (len(text_bytes), len(meta_bytes))
+            _track_sources(source_chunk_ids, [(chunk_id, doc)])
+
+    np.save(os.path.join(directory, OFFSETS_FILE), offsets)
+    with open(os.path.join(directory, IDS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(chunk_ids, f)
+    with open(os.path.join(directory, SOURCES_FILE), 'w', encoding='utf-8') as f:
+        json.dump({source: sorted(ids) for source, ids in source_chunk_ids.items()}, f, ensure_ascii=False)
+
+
+# =============================================================================
+# MEMORY-MAPPED DOCSTORE
+# =============================================================================
+def _map_file(path: str) -> Union[mmap.mmap, bytes]:
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""  # mmap cannot map an empty file
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class MappedDocstore(Docstore, AddableMixin):
+    """Chunk store read through memory maps of a saved snapshot.
+
+    Every worker process that opens the same snapshot shares one copy of the
+    chunk texts in the OS page cache. Chunks added or deleted after loading
+    (incremental uploads) are kept in a small per-process overlay until the
+    next snapshot is written. ``source_chunk_ids`` maps each source file to
+    the IDs of its chunks and is kept up to date by ``add`` and ``delete``.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, IDS_FILE), 'r', encoding='utf-8') as f:
+            self.chunk_ids: List[str] = json.load(f)
+        self._positions = {chunk_id: position for position, chunk_id in enumerate(self.chunk_ids)}
+        self._offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode='r')
+        self._text = _map_file(os.path.join(directory, TEXT_FILE))
+        self._meta = _map_file(os.path.join(directory, META_FILE))
+        with open(os.path.join(directory, SOURCES_FILE), 'r', encoding='utf-8') as f:
+            self.source_chunk_ids: Dict[str, Set[str]] = {
+                source: set(chunk_ids) for source, chunk_ids in json.load(f).items()
+            }
+        self._added: Dict[str, Document] = {}
+        self._deleted = set()
+
+    def _read(self, position: int) -> Document:
+        text_start, meta_start = self._offsets[position]
+        text_end, meta_end = self._offsets[position + 1]
+        return Document(
+            id=self.chunk_ids[position],
+            page_content=self._text[text_start:text_end].decode('utf-8'),
+            metadata=json.loads(self._meta[meta_start:meta_end]),
+        )
+
+    def _contains(self, chunk_id: str) -> bool:
+        if chunk_id in self._added:
+            return True
+        return chunk_id in self._positions and chunk_id not in self._deleted
+
+    def search(self, search: str) -> Union[str, Document]:
+        if search in self._added:
+            return self._added[search]
+        if not self._contains(search):
+            return f"ID {search} not found."
+        return self._read(self._positions[search])
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = {chunk_id for chunk_id in texts if self._contains(chunk_id)}
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+        _track_sources(self.source_chunk_ids, texts.items())
+
+    def delete(self, ids: List) -> None:
+        if not any(self._contains(chunk_id) for chunk_id in ids):
+            raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+        _untrack_sources(self.source_chunk_ids,
+                         [(chunk_id, self.search(chunk_id)) for chunk_id in ids if self._contains(chunk_id)])
+        for chunk_id in ids:
+            if self._added.pop(chunk_id, None) is None and chunk_id in self._positions:
+                self._deleted.add(chunk_id)
+
+    def items(self) -> Iterator[Tuple[str, Document]]:
+        for position, chunk_id in enumerate(self.chunk_ids):
+            if chunk_id not in self._deleted:
+                yield chunk_id, self._read(position)
+        yield from self._added.items()
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids) - len(self._deleted) + len(self._added)
+
+    def copy(self) -> "MappedDocstore":
+        """Copy sharing the mapped files, with an independent overlay."""
+        clone = object.__new__(MappedDocstore)
+        clone.__dict__.update(self.__dict__)
+        clone._added = dict(self._added)
+        clone._deleted = set(self._deleted)
+        clone.source_chunk_ids = _copy_source_map(self.source_chunk_ids)
+        return clone
+
+
+# =============================================================================
+# IN-MEMORY DOCSTORE
+# =============================================================================
+class SourceTrackedDocstore(InMemoryDocstore):
+    """``InMemoryDocstore`` that also keeps the source file -> chunk ID map.
+
+    Unlike the base class, ``add`` updates the dict in place instead of
+    copying it, so adding or replacing a few chunks stays cheap on a large
+    store; ``copy`` gives an independent store.
+    """
+
+    def __init__(self, _dict: Optional[Dict[str, Document]] = None,
+                 source_chunk_ids: Optional[Dict[str, Set[str]]] = None):
+        super().__init__(_dict)
+        if source_chunk_ids is None:
+            source_chunk_ids = {}
+            _track_sources(source_chunk_ids, self._dict.items())
+        self.source_chunk_ids = source_chunk_ids
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = set(texts).intersection(self._dict)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._dict.update(texts)
+        _track_sources(self.source_chunk_ids, texts.items())
+
+    def delete(self, ids: List) -> None:
+        docs = [(chunk_id, self._dict[chunk_id]) for chunk_id in ids if chunk_id in self._dict]
+        super().delete(ids)
+        _untrack_sources(self.source_chunk_ids, docs)
+
+    def copy(self) -> "SourceTrackedDocstore":
+        return SourceTrackedDocstore(dict(self._dict), _copy_source_map(self.source_chunk_ids))
+
+
+# =============================================================================
+# HELPERS FOR EITHER DOCSTORE TYPE
+# =============================================================================
+def iter_docstore(docstore) -> Iterator[Tuple[str, Document]]:
+    if isinstance(docstore, MappedDocstore):
+        return docstore.items()
+    return iter(docstore._dict.items())
+
+
+def replace_document(docstore, chunk_id: str, doc: Document) -> None:
+    """Swap the stored document for ``chunk_id`` (e.g. to update its metadata)."""
+    docstore.delete([chunk_id])
+    docstore.add({chunk_id: doc})
+
+
+def copy_docstore(docstore):
+    if isinstance(docstore, (MappedDocstore, SourceTrackedDocstore)):
+        return docstore.copy()
+    return SourceTrackedDocstore(dict(docstore._dict))
+
+
+def source_chunk_ids(docstore, source: str) -> List[str]:
+    """IDs of the chunks ``source`` contributed, including merged chunks it shares."""
+    if isinstance(docstore, (MappedDocstore, SourceTrackedDocstore)):
+        return sorted(docstore.source_chunk_ids.get(source, ()))
+    return [chunk_id for chunk_id, doc in iter_docstore(docstore) if source in chunk_sources(doc.metadata)]
+
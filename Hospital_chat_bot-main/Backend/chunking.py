@@ -0,0 +1,256 @@
+import os
+import re
+from typing import List, Tuple
+
+from langchain.schema import Document
+
+try:
+    from embedding_model import EMBEDDING_MAX_TOKENS, get_tokenizer
+except ImportError:
+    from .embedding_model import EMBEDDING_MAX_TOKENS, get_tokenizer  # type: ignore
+
+# Target size of a packed spreadsheet chunk, header line included; a little
+# under the embedding window to leave room for the [CLS]/[SEP] tokens
+TABULAR_CHUNK_TOKENS = int(os.getenv("TABULAR_CHUNK_TOKENS", EMBEDDING_MAX_TOKENS - 16))
+TABULAR_TYPES = ("csv", "excel")
+# Target size of a PDF chunk, same budget as spreadsheet chunks by default
+TEXT_CHUNK_TOKENS = int(os.getenv("TEXT_CHUNK_TOKENS", EMBEDDING_MAX_TOKENS - 16))
+# Texts tokenized per call when counting tokens
+_TOKENIZE_BATCH = 1000
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """Token count of each text under the embedding model's tokenizer.
+
+    Falls back to a conservative estimate of one token per three characters
+    when the tokenizer is not available.
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return [len(text) // 3 + 1 for text in texts]
+
+    counts = []
+    for start in range(0, len(texts), _TOKENIZE_BATCH):
+        encoded = tokenizer(texts[start:start + _TOKENIZE_BATCH], add_special_tokens=False)
+        counts.extend(len(ids) for ids in encoded["input_ids"])
+    return counts
+
+
+def chunk_tabular_documents(rows: List[Document], target_tokens: int = TABULAR_CHUNK_TOKENS) -> List[Document]:
+    """Pack spreadsheet rows into chunks of whole rows, without overlap.
+
+    ``rows`` are the per-row Documents from ``document_loader``: values-only
+    text with the column header in ``metadata["columns"]``. Consecutive rows
+    of the same file are joined under a single header line until adding the
+    next row would exceed ``target_tokens``. A row that is too long on its own
+    becomes a chunk by itself.
+    """
+    chunks: List[Document] = []
+    row_tokens = count_tokens([row.page_content for row in rows])
+    header_tokens = {}
+
+    group: List[Document] = []
+    group_tokens = 0
+
+    def flush():
+        if not group:
+            return
+        first, last = group[0].metadata, group[-1].metadata
+        chunks.append(Document(
+            page_content="\n".join([first["columns"]] + [row.page_content for row in group]),
+            metadata={"source": first["source"], "type": first["type"],
+                      "row": first["row"], "row_end": last["row"]},
+        ))
+        group.clear()
+
+    for row, tokens in zip(rows, row_tokens):
+        columns = row.metadata["columns"]
+        if columns not in header_tokens:
+            header_tokens[columns] = count_tokens([columns])[0]
+        if group and (group[0].metadata["source"] != row.metadata["source"]
+                      or group[0].metadata["columns"] != columns
+                      or header_tokens[columns] + group_tokens + tokens > target_tokens):
+            flush()
+        if not group:
+            group_tokens = 0
+        group.append(row)
+        group_tokens += tokens
+    flush()
+    return chunks
+
+
+# Line shapes used to recover document structure from extracted PDF text
+_LIST_ITEM = re.compile(
+    r"^\s*([-*\x7f\u2022\u2023\u2043\u2013\u25a0-\u25ff\u27a2\uf0a7\uf0b7\uf0d8]|\(?\d{1,3}[.)]|\(?[a-zA-Z][.)])\s+"
+)
+_TABLE_ROW = re.compile(r"\t|\S {3,}\S.* {3,}\S|\|.*\|")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\"'])")
+_MINOR_WORDS = {"a", "an", "and", "at", "by", "for", "in", "of", "on", "or", "the", "to", "with"}
+# A line at least this fraction of the block's longest line was wrapped by the PDF layout
+_WRAP_FRACTION = 0.75
+
+
+def _is_title(line: str) -> bool:
+    words = line.split()
+    if not words or len(words) > 12 or line[-1] in ".,;:!?":
+        return False
+    letters = [word for word in words if word[0].isalpha() and word.lower() not in _MINOR_WORDS]
+    return bool(letters) and (line.isupper() or all(word[0].isupper() for word in letters))
+
+
+def split_elements(text: str) -> List[Tuple[str, str]]:
+    """Split extracted page text into ``(kind, text)`` structural elements.
+
+    Kinds are ``title``, ``list`` (one list item), ``table`` (one table row)
+    and ``text`` (a paragraph). Blank lines always end an element (Unstructured
+    separates its elements with them); wrapped lines of the same paragraph,
+    as PyPDF emits them, are joined back together.
+    """
+    elements: List[Tuple[str, str]] = []
+    for block in re.split(r"\n\s*\n", text):
+        lines = [line.strip() for line in block.splitlines() if line.strip()]
+        wrap_width = _WRAP_FRACTION * max((len(line) for line in lines), default=0)
+        paragraph: List[str] = []
+        for line in lines:
+            if paragraph and len(paragraph[-1]) >= wrap_width:
+                # The previous line ran to the margin, so this one usually continues
+                # it, unless a sentence ended there and a heading or list follows
+                starts_new = paragraph[-1][-1] in ".:!?" and (_LIST_ITEM.match(line) or _is_title(line))
+                if not starts_new:
+                    paragraph.append(line)
+                    continue
+            if paragraph:
+                elements.append(("text", " ".join(paragraph)))
+                paragraph = []
+
+            if _LIST_ITEM.match(line):
+                elements.append(("list", line))
+            elif _TABLE_ROW.search(line):
+                elements.append(("table", line))
+            elif _is_title(line):
+                elements.append(("title", line))
+            elif elements and elements[-1][0] == "list" and line[0].islower():
+                # Wrapped continuation of the previous list item
+                elements[-1] = ("list", f"{elements[-1][1]} {line}")
+            else:
+                paragraph.append(line)
+        if paragraph:
+            elements.append(("text", " ".join(paragraph)))
+    return elements
+
+
+def _split_oversized(text: str, budget: int) -> List[Tuple[str, int]]:
+    """Break one element that exceeds ``budget`` at sentence, then word boundaries.
+
+    Returns ``(piece, tokens)`` pairs. Word piece tokenization works word by
+    word, so token counts of adjacent pieces simply add up.
+    """
+    pieces: List[Tuple[str, int]] = []
+    sentences = _SENTENCE_END.split(text)
+    for sentence, tokens in zip(sentences, count_tokens(sentences)):
+        if tokens <= budget:
+            pieces.append((sentence, tokens))
+            continue
+        words = sentence.split()
+        window: List[str] = []
+        window_tokens = 0
+        for word, word_tokens in zip(words, count_tokens(words)):
+            if window and window_tokens + word_tokens > budget:
+                pieces.append((" ".join(window), window_tokens))
+                window, window_tokens = [], 0
+            window.append(word)
+            window_tokens += word_tokens
+        if window:
+            pieces.append((" ".join(window), window_tokens))
+
+    # Re-join consecutive sentences that fit together
+    merged: List[Tuple[str, int]] = []
+    for piece, tokens in pieces:
+        if merged and merged[-1][1] + tokens <= budget:
+            merged[-1] = (f"{merged[-1][0]} {piece}", merged[-1][1] + tokens)
+        else:
+            merged.append((piece, tokens))
+    return merged
+
+
+def chunk_text_documents(documents: List[Document], target_tokens: int = TEXT_CHUNK_TOKENS) -> List[Document]:
+    """Pack the structural elements of each document into token-budgeted chunks.
+
+    Chunks end on element boundaries: a paragraph, list item or table row is
+    only split when it alone exceeds ``target_tokens``. A new section starts a
+    new chunk unless the whole section still fits in the current one, a chunk
+    never ends with a title, and a chunk that continues a section starts with
+    that section's title so it can still be matched on its heading. Chunks do
+    not overlap and keep the metadata (source, page) of their document.
+    """
+    chunks: List[Document] = []
+    for doc in documents:
+        elements = split_elements(doc.page_content)
+        if not elements:
+            continue
+        element_tokens = count_tokens([element_text for _, element_text in elements])
+
+        # Tokens from each title to the next one, so small sections can share a chunk
+        section_sizes = {}
+        for position in reversed(range(len(elements))):
+            following = section_sizes.get(position + 1, 0) if elements[position][0] != "title" else 0
+            section_sizes[position] = element_tokens[position] + following
+
+        parts: List[str] = []
+        parts_tokens = 0
+        # Titles wait here until their first body element joins the chunk
+        headings: List[str] = []
+        headings_tokens = 0
+        section_title = None
+        section_tokens = 0
+
+        def flush():
+            nonlocal parts, parts_tokens
+            if parts:
+                chunks.append(Document(page_content="\n".join(parts), metadata=dict(doc.metadata)))
+            parts, parts_tokens = [], 0
+
+        for position, ((kind, element_text), tokens) in enumerate(zip(elements, element_tokens)):
+            if kind == "title":
+                if parts and parts_tokens + headings_tokens + section_sizes[position] > target_tokens:
+                    flush()
+                if headings_tokens + tokens > target_tokens:
+                    headings, headings_tokens = [], 0  # a run of headings with no body; keep the latest
+                headings.append(element_text)
+                headings_tokens += tokens
+                section_title, section_tokens = element_text, tokens
+                continue
+
+            pieces = [(element_text, tokens)]
+            if tokens > target_tokens:
+                # Leave room to repeat the section title on continuation chunks
+                budget = target_tokens - section_tokens if section_tokens < target_tokens // 2 else target_tokens
+                pieces = _split_oversized(element_text, budget)
+
+            for piece, piece_tokens in pieces:
+                if parts and parts_tokens + headings_tokens + piece_tokens > target_tokens:
+                    flush()
+                    if not headings and section_title is not None and section_tokens + piece_tokens <= target_tokens:
+                        headings, headings_tokens = [section_title], section_tokens
+                parts.extend(headings)
+                parts_tokens += headings_tokens
+                headings, headings_tokens = [], 0
+                parts.append(piece)
+                parts_tokens += piece_tokens
+        parts.extend(headings)  # headings at the very end of the page
+        flush()
+    return chunks
+
+
+def split_documents(documents):
+    """Split loaded documents into the text chunks that get embedded.
+
+    Spreadsheet rows are packed row-aligned by ``chunk_tabular_documents``
+    and everything else (PDF text) by ``chunk_text_documents``.
+    """
+    rows = [doc for doc in documents if doc.metadata.get("type") in TABULAR_TYPES]
+    texts = [doc for doc in documents if doc.metadata.get("type") not in TABULAR_TYPES]
+
+    doc_chunks = chunk_text_documents(texts) + chunk_tabular_documents(rows)
+    print(f"Created {len(doc_chunks)} text chunks ({len(rows)} spreadsheet rows packed)")
+    return doc_chunks
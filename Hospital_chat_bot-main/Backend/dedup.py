@@ -0,0 +1,164 @@
+import os
+import re
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+
+try:
+    from chunking import TABULAR_TYPES
+except ImportError:
+    from .chunking import TABULAR_TYPES  # type: ignore
+
+# Chunks whose estimated Jaccard similarity (over word shingles) is at least
+# this are treated as copies of each other
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_JACCARD_THRESHOLD", 0.9))
+SHINGLE_WORDS = 3
+# MinHash signature length, split into LSH bands of _BAND_ROWS values
+MINHASH_PERMUTATIONS = 64
+_BAND_ROWS = 4
+# Squared L2 distance under which an indexed chunk is checked as a possible
+# copy of a new chunk (normalized embeddings; about cosine similarity 0.95)
+_CANDIDATE_MAX_DISTANCE = 0.1
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(0)
+_HASH_A = _rng.integers(1, _PRIME, size=(MINHASH_PERMUTATIONS, 1), dtype=np.uint64)
+_HASH_B = _rng.integers(0, _PRIME, size=(MINHASH_PERMUTATIONS, 1), dtype=np.uint64)
+
+
+# =============================================================================
+# MINHASH
+# =============================================================================
+def shingle_hashes(text: str) -> np.ndarray:
+    """crc32 hashes of the word ``SHINGLE_WORDS``-grams of normalized ``text``."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    hashes = shingle_hashes(text) % np.uint64(_PRIME)
+    return ((_HASH_A * hashes[None, :] + _HASH_B) % np.uint64(_PRIME)).min(axis=1)
+
+
+def estimated_jaccard(signature_a: np.ndarray, signature_b: np.ndarray) -> float:
+    return float(np.mean(signature_a == signature_b))
+
+
+def chunk_sources(metadata: Dict) -> List[str]:
+    """Every file a (possibly merged) chunk came from."""
+    return metadata.get("sources") or [metadata.get("source", "unknown")]
+
+
+def is_tabular(metadata: Dict) -> bool:
+    """Packed spreadsheet rows, where one changed cell is a real correction, not noise."""
+    return metadata.get("type") in TABULAR_TYPES
+
+
+# =============================================================================
+# DEDUPLICATION
+# =============================================================================
+def find_near_duplicates(texts: List[str], threshold: float = DEDUP_THRESHOLD) -> List[int]:
+    """Map each text to the index of its canonical copy (itself if unique).
+
+    The first occurrence of a group is canonical. Candidates come from LSH
+    buckets over the MinHash signatures and are confirmed by their estimated
+    Jaccard similarity against the canonical text only, so matches do not
+    chain across a series of small edits.
+    """
+    signatures = [minhash_signature(text) for text in texts]
+    buckets: Dict[tuple, List[int]] = {}
+    canonical = []
+    for position, signature in enumerate(signatures):
+        bands = [
+            (band, signature[band:band + _BAND_ROWS].tobytes())
+            for band in range(0, MINHASH_PERMUTATIONS, _BAND_ROWS)
+        ]
+        match = None
+        for key in bands:
+            for candidate in buckets.get(key, ()):
+                if estimated_jaccard(signature, signatures[candidate]) >= threshold:
+                    match = candidate
+                    break
+            if match is not None:
+                break
+
+        if match is None:
+            match = position
+            for key in bands:
+                buckets.setdefault(key, []).append(position)
+        canonical.append(match)
+    return canonical
+
+
+def merge_near_duplicates(chunks: List[Document]) -> List[Document]:
+    """Keep one canonical chunk per group of near-duplicates.
+
+    The canonical chunk keeps its own text and metadata; when its copies came
+    from other files, all of them are listed under ``metadata["sources"]``.
+    Prose (PDF) chunks of the same file are merged by MinHash similarity;
+    across files, and for spreadsheet chunks, only identical text is merged.
+    """
+    canonical = list(range(len(chunks)))
+    prose_by_source: Dict[tuple, List[int]] = {}
+    for position, chunk in enumerate(chunks):
+        if not is_tabular(chunk.metadata):
+            prose_by_source.setdefault(tuple(chunk_sources(chunk.metadata)), []).append(position)
+    for positions in prose_by_source.values():
+        texts = [chunks[position].page_content for position in positions]
+        for position, target in zip(positions, find_near_duplicates(texts)):
+            canonical[position] = positions[target]
+    first_copies: Dict[str, int] = {}
+    for position, chunk in enumerate(chunks):
+        if canonical[position] == position:
+            canonical[position] = first_copies.setdefault(chunk.page_content, position)
+        else:
+            canonical[position] = canonical[canonical[position]]
+
+    sources: Dict[int, List[str]] = {}
+    for position, target in enumerate(canonical):
+        merged = sources.setdefault(target, [])
+        for source in chunk_sources(chunks[position].metadata):
+            if source not in merged:
+                merged.append(source)
+
+    unique_chunks = []
+    for position, chunk in enumerate(chunks):
+        if canonical[position] != position:
+            continue
+        if len(sources[position]) > 1:
+            chunk = Document(page_content=chunk.page_content, metadata={**chunk.metadata, "sources": sources[position]})
+        unique_chunks.append(chunk)
+
+    if len(unique_chunks) < len(chunks):
+        print(f"Merged {len(chunks) - len(unique_chunks)} near-duplicate chunks")
+    return unique_chunks
+
+
+def match_indexed_chunks(vectorstore, texts: List[str], vectors) -> List[Optional[str]]:
+    """For each new chunk, the docstore ID of an indexed chunk with the same text, if any.
+
+    The nearest indexed vector is the only candidate. Indexed chunks come
+    from other files, where a near-duplicate is usually an older revision,
+    so only identical text matches.
+    """
+    matches: List[Optional[str]] = [None] * len(texts)
+    if vectorstore.index.ntotal == 0 or not texts:
+        return matches
+
+    distances, positions = vectorstore.index.search(np.asarray(vectors, dtype=np.float32), 1)
+    for i, (distance, position) in enumerate(zip(distances[:, 0], positions[:, 0])):
+        if position < 0 or distance > _CANDIDATE_MAX_DISTANCE:
+            continue
+        doc_id = vectorstore.index_to_docstore_id[int(position)]
+        doc = vectorstore.docstore.search(doc_id)
+        if not isinstance(doc, Document):
+            continue
+        if doc.page_content == texts[i]:
+            matches[i] = doc_id
+    return matches
@@ -0,0 +1,482 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import traceback
+import unicodedata
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd  # For Excel/CSV processing
+from langchain.schema import Document
+from langchain_community.document_loaders import UnstructuredPDFLoader
+from pypdf import PdfReader, PdfWriter
+
+# Kept free of FastAPI/Firebase state so it can run in parse worker processes.
+
+# Start method of every process that parses documents. Forking the server
+# (which runs download threads and holds the torch model) can deadlock the
+# child, so workers start as fresh interpreters that import only this module
+# and its dependencies ("forkserver" also works on Linux)
+PROCESS_CONTEXT = multiprocessing.get_context(os.getenv("PARSE_START_METHOD", "spawn"))
+# Set in parse pool workers, which already run one file per process
+_in_parse_worker = False
+
+# Spreadsheets are read and converted in batches of this many rows
+TABULAR_BATCH_ROWS = int(os.getenv("TABULAR_BATCH_ROWS", 10000))
+
+# A page's text layer is trusted when it has at least this many characters
+# and at most this share of unprintable/private-use characters; other pages
+# are re-extracted with Unstructured (OCR/layout analysis)
+PDF_MIN_CHARS_PER_PAGE = int(os.getenv("PDF_MIN_CHARS_PER_PAGE", 200))
+PDF_MAX_GARBAGE_RATIO = float(os.getenv("PDF_MAX_GARBAGE_RATIO", 0.05))
+# Processes that re-extract those pages with Unstructured outside the parse pool
+PDF_PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", os.cpu_count() or 1))
+# Unstructured page pools by size, started on first use and reused for every PDF
+_unstructured_pools: Dict[int, ProcessPoolExecutor] = {}
+_unstructured_pools_lock = threading.Lock()
+
+
+def render_row_texts(df: pd.DataFrame) -> pd.Series:
+    """Render every row as ``"value | value | ..."`` in column order.
+
+    Null cells are left empty so values stay aligned with the header line
+    that ``chunking`` puts at the top of each chunk; rows without any value
+    render as "". The text is built one column at a time with vectorized
+    string operations instead of iterating over rows.
+    """
+    present = df.notna()
+    row_texts = pd.Series("", index=df.index, dtype=object)
+    for position in range(df.shape[1]):
+        # By position, so repeated column names cannot select several columns
+        values = df.iloc[:, position].astype(str).where(present.iloc[:, position], "")
+        row_texts = values if position == 0 else row_texts + " | " + values
+    return row_texts.where(present.any(axis=1), "")
+
+
+def tabular_frames_to_documents(frames, file_name: str, doc_type: str) -> List[Document]:
+    """Convert DataFrame batches into one Document per non-empty row.
+
+    ``frames`` is any iterable of DataFrames whose index is the 0-based row
+    position in the file, e.g. ``pd.read_csv(..., chunksize=n)``. Row text
+    holds only the values; the column header is kept in the ``columns``
+    metadata so chunking can write it once per chunk.
+    """
+    documents = []
+    total_rows = 0
+    columns = []
+    for df in frames:
+        total_rows += len(df)
+        columns = list(df.columns)
+        header = " | ".join(str(col) for col in columns)
+        row_texts = render_row_texts(df)
+        for idx, row_text in zip(df.index, row_texts):
+            if not row_text:
+                continue
+            documents.append(Document(
+                page_content=row_text,
+                metadata={"source": file_name, "row": int(idx) + 1, "type": doc_type, "columns": header}
+            ))
+    print(f"Read {total_rows} rows from {file_name} with columns: {columns}")
+    return documents
+
+
+def dedupe_column_names(names: List[str]) -> List[str]:
+    """Rename repeated column names like ``pd.read_excel`` does (``X``, ``X.1``, ...).
+
+    Generated names skip any name already present in the header.
+    """
+    taken = set(names)
+    seen = set()
+    next_suffix = {}
+    unique = []
+    for name in names:
+        if name in seen:
+            suffix = next_suffix.get(name, 1)
+            while f"{name}.{suffix}" in taken:
+                suffix += 1
+            next_suffix[name] = suffix + 1
+            name = f"{name}.{suffix}"
+            taken.add(name)
+        seen.add(name)
+        unique.append(name)
+    return unique
+
+
+def iter_xlsx_frames(file_path: str, batch_rows: int):
+    """Stream the first worksheet of an .xlsx file as DataFrame batches.
+
+    The workbook is opened in openpyxl's read-only mode so rows are parsed
+    lazily and memory stays flat regardless of sheet size.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = dedupe_column_names([
+            str(name) if name is not None else f"Unnamed: {position}"
+            for position, name in enumerate(header)
+        ])
+        width = len(columns)
+
+        batch = []
+        offset = 0
+        for row in rows:
+            batch.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(batch) >= batch_rows:
+                yield pd.DataFrame(batch, columns=columns, index=range(offset, offset + len(batch)))
+                offset += len(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, index=range(offset, offset + len(batch)))
+    finally:
+        workbook.close()
+
+
+# =============================================================================
+# PDF EXTRACTION
+# =============================================================================
+def garbage_ratio(text: str) -> float:
+    """Share of characters that are control, private-use, unassigned or U+FFFD."""
+    if not text:
+        return 0.0
+    garbage = sum(
+        1 for char in text
+        if char == "\ufffd" or (char not in "\n\r\t" and unicodedata.category(char) in ("Cc", "Co", "Cn", "Cs"))
+    )
+    return garbage / len(text)
+
+
+def page_text_is_usable(text: str) -> bool:
+    stripped = text.strip()
+    return len(stripped) >= PDF_MIN_CHARS_PER_PAGE and garbage_ratio(stripped) <= PDF_MAX_GARBAGE_RATIO
+
+
+def extract_page_texts(file_path: str, first_page: int, last_page: int) -> List[str]:
+    """Text layer of pages ``first_page``..``last_page - 1`` via pypdf."""
+    reader = PdfReader(file_path)
+    texts = []
+    for page_number in range(first_page, last_page):
+        try:
+            texts.append(reader.pages[page_number].extract_text() or "")
+        except Exception as e:
+            print(f"pypdf could not read page {page_number + 1} of {file_path}: {e}")
+            texts.append("")
+    return texts
+
+
+def extract_page_unstructured(file_path: str, page_number: int) -> str:
+    """Re-extract one page with Unstructured by running it on a single-page copy."""
+    writer = PdfWriter()
+    writer.add_page(PdfReader(file_path).pages[page_number])
+    fd, page_path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer.write(f)
+        return "\n\n".join(doc.page_content for doc in UnstructuredPDFLoader(page_path).load())
+    finally:
+        os.remove(page_path)
+
+
+def _result_or_error(function, *args):
+    try:
+        return function(*args)
+    except Exception as e:
+        return e
+
+
+def _unstructured_pool(workers: int) -> ProcessPoolExecutor:
+    with _unstructured_pools_lock:
+        pool = _unstructured_pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=PROCESS_CONTEXT)
+            _unstructured_pools[workers] = pool
+        return pool
+
+
+def _discard_unstructured_pool(workers: int, pool: ProcessPoolExecutor):
+    """Drop a broken pool (a worker died) so the next PDF starts a new one."""
+    with _unstructured_pools_lock:
+        if _unstructured_pools.get(workers) is pool:
+            del _unstructured_pools[workers]
+    pool.shutdown(wait=False)
+
+
+def extract_pages_unstructured(file_path: str, page_numbers: List[int], workers: int) -> Dict[int, object]:
+    """Unstructured text (or the exception raised) for each of ``page_numbers``.
+
+    Pages are spread over a reused pool of ``workers`` processes when there
+    are several; otherwise they are extracted in-process.
+    """
+    if workers <= 1 or len(page_numbers) <= 1:
+        return {number: _result_or_error(extract_page_unstructured, file_path, number) for number in page_numbers}
+    pool = _unstructured_pool(workers)
+    try:
+        futures = {number: pool.submit(extract_page_unstructured, file_path, number) for number in page_numbers}
+        return {number: future.exception() or future.result() for number, future in futures.items()}
+    except BrokenProcessPool:
+        _discard_unstructured_pool(workers, pool)
+        raise
+
+
+def init_parse_worker():
+    """Initializer of parse pool processes (see ``load_pdf``)."""
+    global _in_parse_worker
+    _in_parse_worker = True
+
+
+def load_pdf(file_path: str, file_name: str, page_workers: Optional[int] = None) -> List[Document]:
+    """Extract a PDF page by page, one Document per non-empty page.
+
+    Every page is read from its text layer with pypdf, in-process; only pages
+    that fail ``page_text_is_usable`` (scans, broken font encodings) are sent
+    to the much slower Unstructured loader, over ``page_workers`` processes.
+    By default that is PDF_PAGE_WORKERS, or 1 (in-process) inside a parse
+    pool worker, where the pool already keeps the cores busy.
+    """
+    if page_workers is None:
+        page_workers = 1 if _in_parse_worker else PDF_PAGE_WORKERS
+    page_count = len(PdfReader(file_path).pages)
+    page_texts = extract_page_texts(file_path, 0, page_count)
+    extractors = ["pypdf"] * page_count
+
+    retry_pages = [number for number, text in enumerate(page_texts) if not page_text_is_usable(text)]
+    if retry_pages:
+        print(f"{len(retry_pages)} of {page_count} pages of {file_name} need Unstructured")
+        results = extract_pages_unstructured(file_path, retry_pages, page_workers)
+        for number, result in results.items():
+            if isinstance(result, Exception):
+                print(f"Unstructured failed on page {number + 1} of {file_name}: {result}")
+            elif len(result.strip()) > len(page_texts[number].strip()):
+                page_texts[number] = result
+                extractors[number] = "unstructured"
+
+    return [
+        Document(
+            page_content=text,
+            metadata={"source": file_name, "page": number, "total_pages": page_count, "extractor": extractor}
+        )
+        for number, (text, extractor) in enumerate(zip(page_texts, extractors))
+        if text.strip()
+    ]
+
+
+def load_document(file_path: str, source_name: Optional[str] = None, page_workers: Optional[int] = None):
+    """Load documents from PDF, Excel (.xlsx, .xls), or CSV files.
+
+    ``source_name`` is the name the file is stored under in Firebase; it is
+    recorded as the ``source`` metadata of every returned document so chunks
+    can be traced back to (and replaced for) their original upload.
+    ``page_workers`` is passed on to ``load_pdf``.
+    """
+    documents = []
+    file_name = source_name or os.path.basename(file_path)
+    file_ext = os.path.splitext(file_name)[1].lower()
+
+    # Handle CSV files
+    if file_ext == '.csv':
+        try:
+            frames = pd.read_csv(file_path, chunksize=TABULAR_BATCH_ROWS)
+            documents = tabular_frames_to_documents(frames, file_name, "csv")
+            print(f"Loaded {file_name} as CSV with {len(documents)} records")
+            return documents
+        except Exception as e:
+            print(f"CSV loading failed for {file_name}: {e}")
+            raise Exception(f"CSV processing failed for {file_name}: {e}")
+    
+    # Handle Excel files (.xlsx, .xls)
+    elif file_ext in ['.xlsx', '.xls']:
+        try:
+            if file_ext == '.xlsx':
+                frames = iter_xlsx_frames(file_path, TABULAR_BATCH_ROWS)
+            else:
+                # xlrd has no streaming mode; legacy .xls workbooks are read whole
+                frames = [pd.read_excel(file_path)]
+            documents = tabular_frames_to_documents(frames, file_name, "excel")
+            print(f"Loaded {file_name} as Excel with {len(documents)} records")
+            return documents
+        except Exception as e:
+            print(f"Excel loading failed for {file_name}: {e}")
+            raise Exception(f"Excel processing failed for {file_name}: {e}")
+    
+    # Handle PDF files
+    elif file_ext == '.pdf':
+        try:
+            documents = load_pdf(file_path, file_name, page_workers)
+        except Exception as e:
+            print(f"PDF loading failed for {file_name}: {e}")
+            raise Exception(f"PDF processing failed for {file_name}: {e}")
+        if not documents:
+            raise Exception(f"No text could be extracted from {file_name}")
+        extracted = sum(doc.metadata["extractor"] == "unstructured" for doc in documents)
+        print(f"Loaded {file_name} with {len(documents)} pages ({extracted} via Unstructured)")
+        return documents
+    
+    else:
+        raise Exception(f"Unsupported file format: {file_ext}. Supported formats: .pdf, .csv, .xlsx, .xls")
+
+
+# =============================================================================
+# PARSE POOL
+# =============================================================================
+class ParseTimeout(Exception):
+    pass
+
+
+def _parse_worker_main(conn, target: Callable):
+    """Loop of a ``ParsePool`` worker: parse each file received, send back its documents or error."""
+    init_parse_worker()
+    conn.send(('ready', None))
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        try:
+            result = ('ok', target(*task))
+        except Exception as e:
+            traceback.print_exc()
+            result = ('error', Exception(str(e)))
+        conn.send(result)
+
+
+class ParsePool:
+    """Worker processes that parse one file at a time, each file with its own deadline.
+
+    A file's ``timeout`` starts when a started worker picks it up. A worker still
+    busy at the deadline is killed at once and replaced for the files queued
+    behind it, whose futures then fail with ``ParseTimeout`` only if they
+    overrun themselves. Workers are started as needed, up to ``workers``.
+    """
+
+    def __init__(self, workers: int, timeout: float, target: Callable = load_document):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.target = target
+        self._pending = deque()  # (future, args) not yet sent to a worker
+        self._starting = {}  # conn -> process, until the worker has imported its modules
+        self._idle = []  # (process, conn)
+        self._busy = {}  # conn -> (process, future, deadline)
+        self._lock = threading.Lock()
+        self._closing = False
+        self._cancel = False
+        self._wakeup_reader, self._wakeup_writer = multiprocessing.Pipe(duplex=False)
+        self._thread = threading.Thread(target=self._run, name="parse-pool", daemon=True)
+        self._thread.start()
+
+    def submit(self, file_path: str, file_name: str) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("ParsePool is shut down")
+            self._pending.append((future, (file_path, file_name)))
+            self._wakeup_writer.send_bytes(b".")
+        return future
+
+    def shutdown(self, cancel: bool = False):
+        """Stop the workers once every file is parsed, or right away with ``cancel``."""
+        with self._lock:
+            self._closing = True
+            self._cancel = self._cancel or cancel
+            self._wakeup_writer.send_bytes(b".")
+        self._thread.join()
+
+    def _start_worker(self):
+        conn, child_conn = multiprocessing.Pipe()
+        process = PROCESS_CONTEXT.Process(target=_parse_worker_main, args=(child_conn, self.target), daemon=True)
+        process.start()
+        child_conn.close()
+        self._starting[conn] = process
+
+    def _stop_busy_worker(self, conn, error: Exception):
+        process, future, _ = self._busy.pop(conn)
+        process.kill()
+        process.join()
+        conn.close()
+        future.set_exception(error)
+
+    def _dispatch(self):
+        with self._lock:
+            if self._cancel:
+                while self._pending:
+                    self._pending.popleft()[0].cancel()
+                for conn in list(self._busy):
+                    self._stop_busy_worker(conn, Exception("Parsing was cancelled"))
+            while len(self._starting) + len(self._idle) + len(self._busy) < min(
+                    self.workers, len(self._pending) + len(self._busy)):
+                self._start_worker()
+            while self._pending and self._idle:
+                future, args = self._pending.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                process, conn = self._idle.pop()
+                conn.send(args)
+                self._busy[conn] = (process, future, time.monotonic() + self.timeout)
+            return self._closing and not self._pending and not self._busy
+
+    def _collect(self, conn):
+        if conn in self._starting:
+            process = self._starting.pop(conn)
+            try:
+                conn.recv()
+                self._idle.append((process, conn))
+            except (EOFError, OSError):
+                process.join()
+                conn.close()
+                # Fail a waiting file instead of restarting the worker forever
+                error = Exception(f"Parse worker failed to start (exit code {process.exitcode})")
+                with self._lock:
+                    while self._pending:
+                        future, _ = self._pending.popleft()
+                        if future.set_running_or_notify_cancel():
+                            future.set_exception(error)
+                            break
+            return
+        process, future, _ = self._busy.pop(conn)
+        try:
+            status, value = conn.recv()
+        except (EOFError, OSError):
+            process.join()
+            conn.close()
+            future.set_exception(Exception(f"Parse worker exited with code {process.exitcode}"))
+            return
+        self._idle.append((process, conn))
+        if status == 'ok':
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def _run(self):
+        while not self._dispatch():
+            deadline = min((entry[2] for entry in self._busy.values()), default=None)
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            for conn in wait(list(self._starting) + list(self._busy) + [self._wakeup_reader], timeout):
+                if conn is self._wakeup_reader:
+                    while conn.poll():
+                        conn.recv_bytes()
+                else:
+                    self._collect(conn)
+            now = time.monotonic()
+            for conn in [conn for conn, (_, _, deadline) in self._busy.items() if deadline <= now]:
+                self._stop_busy_worker(conn, ParseTimeout(f"Timed out after {self.timeout}s"))
+
+        workers = self._idle + [(process, conn) for conn, process in self._starting.items()]
+        for process, conn in workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process, conn in workers:
+            process.join()
+            conn.close()
+        self._idle, self._starting = [], {}
@@ -0,0 +1,249 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Path to the sqlite cache file (placed next to this module by default)
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(os.path.dirname(__file__), "embedding_cache.db"))
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_BATCH = 500
+# Query embeddings kept in memory (least recently used are evicted; 0 = off)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 2048))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+  model TEXT NOT NULL,
+  normalized INTEGER NOT NULL,
+  text_hash TEXT NOT NULL,
+  dim INTEGER NOT NULL,
+  vector BLOB NOT NULL,
+  PRIMARY KEY (model, normalized, text_hash)
+);
+"""
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _connect(cache_path: str):
+    conn = sqlite3.connect(cache_path, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def lookup(hashes: List[str], model: str, normalized: bool, cache_path: str = CACHE_PATH) -> Dict[str, List[float]]:
+    """Return the cached vectors for ``hashes`` that are present in the cache."""
+    found = {}
+    conn = _connect(cache_path)
+    try:
+        cur = conn.cursor()
+        for start in range(0, len(hashes), _QUERY_BATCH):
+            batch = hashes[start:start + _QUERY_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            cur.execute(
+                f"SELECT text_hash, vector FROM embeddings "
+                f"WHERE model = ? AND normalized = ? AND text_hash IN ({placeholders})",
+                (model, int(normalized), *batch)
+            )
+            for row_hash, blob in cur.fetchall():
+                found[row_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+    finally:
+        conn.close()
+    return found
+
+
+def store(vectors: Dict[str, List[float]], model: str, normalized: bool, cache_path: str = CACHE_PATH) -> None:
+    """Insert ``{text_hash: vector}`` pairs into the cache."""
+    if not vectors:
+        return
+    conn = _connect(cache_path)
+    try:
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, normalized, text_hash, dim, vector) VALUES (?, ?, ?, ?, ?)",
+            [
+                (model, int(normalized), row_hash, len(vector), np.asarray(vector, dtype=np.float32).tobytes())
+                for row_hash, vector in vectors.items()
+            ]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def record_lookup(hits: int, misses: int) -> None:
+    with _stats_lock:
+        _stats['hits'] += hits
+        _stats['misses'] += misses
+
+
+def get_stats(cache_path: str = CACHE_PATH) -> Dict:
+    """Hit/miss counters for this process plus the number of cached vectors."""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / total, 4) if total else 0.0
+    try:
+        conn = _connect(cache_path)
+        try:
+            stats['entries'] = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        finally:
+            conn.close()
+    except Exception:
+        stats['entries'] = None
+    return stats
+
+
+# =============================================================================
+# QUERY EMBEDDING LRU
+# =============================================================================
+def normalize_query(text: str) -> str:
+    """Cache key form of a query: runs of whitespace collapsed, ends trimmed."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class QueryCache:
+    """Bounded in-memory LRU of query embeddings keyed by normalized query text.
+
+    It holds the vectors of one model at a time: a lookup or store for a
+    different model (name or normalization) empties it first.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._model_key: Optional[Tuple[str, bool]] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _use_model(self, model_key: Tuple[str, bool]) -> None:
+        if model_key != self._model_key:
+            if self._model_key is not None:
+                print(f"Embedding model changed to {model_key[0]}; clearing the query embedding cache")
+            self._entries.clear()
+            self._model_key = model_key
+
+    def lookup(self, model_key: Tuple[str, bool], keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            self._use_model(model_key)
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+                    self.hits += 1
+        return found
+
+    def store(self, model_key: Tuple[str, bool], vectors: Dict[str, List[float]]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._use_model(model_key)
+            for key, vector in vectors.items():
+                self._entries[key] = np.asarray(vector, dtype=np.float32)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'entries': len(self._entries),
+                'max_size': self.max_size,
+                'model': self._model_key[0] if self._model_key else None,
+            }
+
+
+query_cache = QueryCache()
+
+
+# =============================================================================
+# CACHED EMBEDDING MODEL
+# =============================================================================
+class CachedEmbeddings(Embeddings):
+    """Wrap an embedding model with the on-disk, content-addressed vector cache.
+
+    Document embeddings are looked up by the SHA-256 of the chunk text together
+    with the model name and normalization flag, so only chunks that have never
+    been seen before are sent through the model. Query embeddings are kept in
+    the in-memory ``query_cache`` LRU instead.
+    """
+
+    def __init__(self, embeddings, model_name: str, normalized: bool, cache_path: Optional[str] = None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.normalized = normalized
+        self.cache_path = cache_path or CACHE_PATH
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        try:
+            cached = lookup(list(set(hashes)), self.model_name, self.normalized, self.cache_path)
+        except Exception as e:
+            print(f"Embedding cache lookup failed: {e}")
+            cached = {}
+
+        missing = {}
+        for row_hash, text in zip(hashes, texts):
+            if row_hash not in cached and row_hash not in missing:
+                missing[row_hash] = text
+        miss_count = sum(1 for row_hash in hashes if row_hash in missing)
+        record_lookup(len(hashes) - miss_count, miss_count)
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_vectors))
+            try:
+                store(computed, self.model_name, self.normalized, self.cache_path)
+            except Exception as e:
+                print(f"Embedding cache write failed: {e}")
+            cached.update(computed)
+
+        return [list(cached[row_hash]) for row_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several queries, computing the ones not in ``query_cache`` in one forward pass.
+
+        HuggingFaceEmbeddings encodes queries and documents the same way, so a
+        batch costs one pass yet gives the same vectors as ``embed_query``.
+        """
+        model_key = (self.model_name, self.normalized)
+        keys = [normalize_query(text) for text in texts]
+        cached = query_cache.lookup(model_key, keys)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in cached]
+        if len(missing) == 1:
+            computed = {missing[0]: self.embeddings.embed_query(missing[0])}
+        elif missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(missing)))
+        else:
+            computed = {}
+        query_cache.store(model_key, computed)
+
+        vectors = {**cached, **{key: np.asarray(vector, dtype=np.float32) for key, vector in computed.items()}}
+        return [vectors[key].tolist() for key in keys]
@@ -0,0 +1,69 @@
+import os
+import threading
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+try:
+    import embedding_cache
+except ImportError:
+    from . import embedding_cache  # type: ignore
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+NORMALIZE_EMBEDDINGS = True
+# Torch intra-op threads used for encoding (0 = torch default, one per core)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))
+# Texts per forward pass through the model
+EMBEDDING_ENCODE_BATCH_SIZE = int(os.getenv("EMBEDDING_ENCODE_BATCH_SIZE", 32))
+# Longest input the model embeds; sentence-transformers truncates the rest
+EMBEDDING_MAX_TOKENS = int(os.getenv("EMBEDDING_MAX_TOKENS", 256))
+
+_model_lock = threading.Lock()
+_model = None
+_tokenizer = None
+_tokenizer_loaded = False
+
+
+def get_embedding_model():
+    """Return the process-wide embedding model, loading it on first use.
+
+    The sentence-transformers weights are read from disk once per process and
+    shared by index builds, incremental uploads and query embedding. The model
+    is wrapped with the on-disk embedding cache.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if EMBEDDING_THREADS > 0:
+                    import torch
+                    torch.set_num_threads(EMBEDDING_THREADS)
+                print(f"Loading embedding model {EMBEDDING_MODEL_NAME}...")
+                embeddings = HuggingFaceEmbeddings(
+                    model_name=EMBEDDING_MODEL_NAME,
+                    model_kwargs={'device': 'cpu'},
+                    encode_kwargs={
+                        'normalize_embeddings': NORMALIZE_EMBEDDINGS,
+                        'batch_size': EMBEDDING_ENCODE_BATCH_SIZE,
+                    }
+                )
+                _model = embedding_cache.CachedEmbeddings(embeddings, EMBEDDING_MODEL_NAME, NORMALIZE_EMBEDDINGS)
+    return _model
+
+
+def get_tokenizer():
+    """Return the embedding model's tokenizer, or None if it cannot be loaded.
+
+    Only the tokenizer files are read, so chunking can count tokens without
+    loading the model weights.
+    """
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        with _model_lock:
+            if not _tokenizer_loaded:
+                try:
+                    from transformers import AutoTokenizer
+                    _tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+                except Exception as e:
+                    print(f"Tokenizer for {EMBEDDING_MODEL_NAME} unavailable, estimating token counts: {e}")
+                _tokenizer_loaded = True
+    return _tokenizer
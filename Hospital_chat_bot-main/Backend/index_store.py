@@ -0,0 +1,512 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import chunk_store
+    from lexical_index import BM25Index
+except ImportError:
+    from . import chunk_store  # type: ignore
+    from .lexical_index import BM25Index  # type: ignore
+
+# Local snapshot of the built vector store (placed next to this module by default)
+INDEX_DIR = os.getenv("INDEX_DIR", os.path.join(os.path.dirname(__file__), "vector_index"))
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 3
+INDEX_FILE = "index.faiss"
+# Open snapshots memory-mapped so that every worker process shares a single
+# page-cache copy of the vectors and chunk texts. Off by default on Windows,
+# where a mapped snapshot cannot be replaced while it is open.
+INDEX_MMAP = os.getenv("INDEX_MMAP", "0" if os.name == "nt" else "1") == "1"
+# Versioned snapshots written by build_index.py; the server only reads them
+ARTIFACT_DIR = os.getenv("INDEX_ARTIFACT_DIR")
+LATEST_FILE = "LATEST"
+
+# Index type: "flat" (exact), "ivf" or "hnsw" (approximate), or "auto" to use
+# flat search for small corpora and IVF once there are ANN_MIN_CHUNKS chunks
+INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "auto").lower()
+ANN_MIN_CHUNKS = int(os.getenv("ANN_MIN_CHUNKS", 20000))
+IVF_NLIST = int(os.getenv("IVF_NLIST", 0))  # 0 = 4 * sqrt(number of chunks)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))
+HNSW_M = int(os.getenv("HNSW_M", 32))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 80))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+# Opt-in vector compression: "none", "sq8" (int8 scalar quantization, 4x
+# smaller) or "pq" (product quantization, PQ_M bytes per vector). Combines
+# with any index type.
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+PQ_M = int(os.getenv("PQ_M", 48))  # must divide the embedding dimension
+# Quantized search fetches RERANK_FACTOR x k candidates and re-ranks them
+# against the full-precision vectors (0 = no re-ranking). In memory-mapped
+# snapshots those vectors stay on disk and only the re-ranked rows are read.
+RERANK_FACTOR = int(os.getenv("QUANTIZED_RERANK_FACTOR", 4))
+# faiss needs roughly this many training points per IVF list / PQ centroid
+_MIN_POINTS_PER_LIST = 39
+_PQ_CENTROIDS = 256
+
+# Result of the most recent recall/latency sampling check
+last_index_check: Dict = {}
+
+
+# =============================================================================
+# INDEX CONSTRUCTION
+# =============================================================================
+def resolve_index_type(num_vectors: int, index_type: str = INDEX_TYPE) -> str:
+    if index_type == "auto":
+        return "ivf" if num_vectors >= ANN_MIN_CHUNKS else "flat"
+    if index_type not in ("flat", "ivf", "hnsw"):
+        raise ValueError(f"Unknown VECTOR_INDEX_TYPE '{index_type}'. Use flat, ivf, hnsw or auto")
+    if index_type == "ivf" and num_vectors < _MIN_POINTS_PER_LIST:
+        return "flat"  # too few vectors to train even a single list
+    return index_type
+
+
+def resolve_quantization(num_vectors: int, quantization: str = VECTOR_QUANTIZATION) -> str:
+    if quantization not in ("none", "sq8", "pq"):
+        raise ValueError(f"Unknown VECTOR_QUANTIZATION '{quantization}'. Use none, sq8 or pq")
+    if num_vectors == 0:
+        return "none"  # nothing to train the quantizer on
+    if quantization == "pq" and num_vectors < _PQ_CENTROIDS * _MIN_POINTS_PER_LIST:
+        return "sq8"  # too few vectors to train the PQ codebooks
+    return quantization
+
+
+def _base_index(index):
+    """The index doing the candidate search (inside the re-ranking wrapper, if any)."""
+    if isinstance(index, faiss.IndexRefine):
+        return faiss.downcast_index(index.base_index)
+    return index
+
+
+def index_kind(index) -> str:
+    base = _base_index(index)
+    if faiss.try_extract_index_ivf(base) is not None:
+        return "ivf"
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def index_quantization(index) -> str:
+    base = _base_index(index)
+    if isinstance(base, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer, faiss.IndexHNSWSQ)):
+        return "sq8"
+    if isinstance(base, (faiss.IndexPQ, faiss.IndexIVFPQ, faiss.IndexHNSWPQ)):
+        return "pq"
+    return "none"
+
+
+def apply_search_params(index) -> None:
+    """Set the configured query-time accuracy/speed knobs on ``index``."""
+    base = _base_index(index)
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        ivf.nprobe = min(IVF_NPROBE, ivf.nlist)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = HNSW_EF_SEARCH
+
+
+def build_faiss_index(vectors: np.ndarray, index_type: str = INDEX_TYPE,
+                      quantization: str = VECTOR_QUANTIZATION, rerank_factor: int = RERANK_FACTOR):
+    """Build and fill a FAISS index of the configured type over ``vectors``.
+
+    All types use L2 distance, matching what LangChain's FAISS wrapper
+    expects (and equivalent to cosine ranking for normalized embeddings).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dim = vectors.shape
+    index_type = resolve_index_type(num_vectors, index_type)
+    quantization = resolve_quantization(num_vectors, quantization)
+    sq8 = faiss.ScalarQuantizer.QT_8bit
+
+    if index_type == "ivf":
+        nlist = IVF_NLIST or int(4 * np.sqrt(num_vectors))
+        nlist = max(1, min(nlist, num_vectors // _MIN_POINTS_PER_LIST))
+        quantizer = faiss.IndexFlatL2(dim)
+        if quantization == "sq8":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, sq8, faiss.METRIC_L2)
+        elif quantization == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, 8)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+    elif index_type == "hnsw":
+        if quantization == "sq8":
+            index = faiss.IndexHNSWSQ(dim, sq8, HNSW_M)
+        elif quantization == "pq":
+            index = faiss.IndexHNSWPQ(dim, PQ_M, HNSW_M)
+        else:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        if quantization == "sq8":
+            index = faiss.IndexScalarQuantizer(dim, sq8, faiss.METRIC_L2)
+        elif quantization == "pq":
+            index = faiss.IndexPQ(dim, PQ_M, 8)
+        else:
+            index = faiss.IndexFlatL2(dim)
+
+    if quantization != "none" and rerank_factor > 0:
+        index = faiss.IndexRefineFlat(index)
+        index.k_factor = rerank_factor
+
+    if not index.is_trained:
+        index.train(vectors)
+    apply_search_params(index)
+    index.add(vectors)
+    return index
+
+
+def describe_index(index) -> str:
+    base = _base_index(index)
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        description = f"ivf(nlist={ivf.nlist}, nprobe={ivf.nprobe})"
+    elif isinstance(base, faiss.IndexHNSW):
+        description = f"hnsw(M={HNSW_M}, efSearch={base.hnsw.efSearch})"
+    else:
+        description = "flat"
+
+    quantization = index_quantization(index)
+    if quantization != "none":
+        description += f"+{quantization}"
+        if isinstance(index, faiss.IndexRefine):
+            description += f"(rerank x{int(index.k_factor)})"
+    return description
+
+
+def copy_index(index):
+    """Writable in-memory copy of ``index``.
+
+    ``faiss.clone_index`` would keep viewing a memory-mapped index's storage,
+    so the copy goes through serialization instead.
+    """
+    copy = faiss.deserialize_index(faiss.serialize_index(index))
+    apply_search_params(copy)
+    return copy
+
+
+def check_index_quality(index, vectors: np.ndarray, k: int = 10, samples: int = 200) -> Dict:
+    """Estimate recall@k and per-query latency of ``index`` against exact search.
+
+    Queries are midpoints of random pairs of indexed vectors, which land
+    between topics the way real questions do instead of matching a stored
+    chunk exactly. Ground truth comes from brute-force search over ``vectors``.
+    """
+    global last_index_check
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors = len(vectors)
+    k = min(k, num_vectors)
+    rng = np.random.default_rng(0)
+    pairs = rng.integers(0, num_vectors, size=(min(samples, num_vectors), 2))
+    queries = (vectors[pairs[:, 0]] + vectors[pairs[:, 1]]) / 2
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    start = time.perf_counter()
+    _, exact_ids = faiss.knn(queries, vectors, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    _, ann_ids = index.search(queries, k)
+    ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    hits = sum(len(set(a) & set(e)) for a, e in zip(ann_ids.tolist(), exact_ids.tolist()))
+    last_index_check = {
+        "index": describe_index(index),
+        "vectors": num_vectors,
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": round(hits / (len(queries) * k), 4),
+        "ms_per_query": round(ann_ms, 3),
+        "exact_ms_per_query": round(exact_ms, 3),
+        "checked_at": datetime.now().isoformat(),
+    }
+    print(f"Index check {last_index_check['index']} over {num_vectors} vectors: "
+          f"recall@{k}={last_index_check['recall_at_k']:.3f}, "
+          f"{ann_ms:.3f} ms/query (exact search {exact_ms:.3f} ms/query)")
+    return last_index_check
+
+
+def remove_vectors(vectorstore, ids: List[str]) -> None:
+    """Delete chunk ``ids`` from a LangChain FAISS store.
+
+    HNSW and re-ranking indexes do not support removal, so for those the
+    index is rebuilt from the vectors that remain.
+    """
+    try:
+        vectorstore.delete(ids)
+        return
+    except RuntimeError:
+        pass
+
+    doomed = set(ids)
+    keep_positions = [
+        position for position, doc_id in sorted(vectorstore.index_to_docstore_id.items())
+        if doc_id not in doomed
+    ]
+    old_index = vectorstore.index
+    if keep_positions:
+        vectors = old_index.reconstruct_batch(np.array(keep_positions, dtype=np.int64))
+    else:
+        vectors = np.zeros((0, old_index.d), dtype=np.float32)
+    rerank_factor = int(old_index.k_factor) if isinstance(old_index, faiss.IndexRefine) else 0
+    vectorstore.index = build_faiss_index(vectors, index_kind(old_index),
+                                          index_quantization(old_index), rerank_factor)
+    vectorstore.docstore.delete(list(doomed))
+    vectorstore.index_to_docstore_id = {
+        new_position: vectorstore.index_to_docstore_id[old_position]
+        for new_position, old_position in enumerate(keep_positions)
+    }
+
+
+# =============================================================================
+# SNAPSHOTS
+# =============================================================================
+def build_manifest(files_info: List[Dict], document_counts: Optional[Dict[str, int]] = None) -> Dict:
+    """Describe the source files an index was built from.
+
+    ``files_info`` is the listing returned by ``list_firebase_files``. Each
+    entry is keyed by file name and keeps the content hash reported by the
+    bucket so a later listing can be compared against it.
+    """
+    document_counts = document_counts or {}
+    files = {}
+    for info in files_info:
+        files[info['name']] = {
+            'size': info.get('size', 0),
+            'md5': info.get('md5'),
+            'generation': info.get('generation'),
+            'documents': document_counts.get(info['name'], 0),
+        }
+    return {
+        'version': MANIFEST_VERSION,
+        'created': datetime.now().isoformat(),
+        'index_settings': index_settings(),
+        'files': files,
+    }
+
+
+def index_settings() -> Dict:
+    """Settings that change how the index is built; a snapshot built with others is rebuilt."""
+    return {
+        'type': INDEX_TYPE,
+        'quantization': VECTOR_QUANTIZATION,
+        'pq_m': PQ_M,
+        'rerank_factor': RERANK_FACTOR,
+    }
+
+
+def manifest_matches(manifest: Dict, files_info: List[Dict]) -> bool:
+    """Check whether a saved manifest still describes the current bucket listing."""
+    saved_files = manifest.get('files', {})
+    if set(saved_files) != {info['name'] for info in files_info}:
+        return False
+
+    for info in files_info:
+        saved = saved_files[info['name']]
+        if info.get('md5') or saved.get('md5'):
+            if info.get('md5') != saved.get('md5'):
+                return False
+        elif info.get('generation') != saved.get('generation') or info.get('size', 0) != saved.get('size', 0):
+            return False
+    return True
+
+
+def find_indexed_copy(manifest: Dict, md5_hash: str, file_name: str) -> Optional[str]:
+    """Name of a file in ``manifest`` whose content has ``md5_hash``.
+
+    ``file_name`` itself is preferred, so re-uploading an unchanged file is
+    recognized as such. Files that produced no documents are ignored.
+    """
+    if not md5_hash:
+        return None
+    matches = [
+        name for name, info in manifest.get('files', {}).items()
+        if info.get('md5') == md5_hash and info.get('documents', 0)
+    ]
+    if file_name in matches:
+        return file_name
+    return matches[0] if matches else None
+
+
+def read_manifest(index_dir: str = INDEX_DIR) -> Optional[Dict]:
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except Exception as e:
+        print(f"Could not read index manifest: {e}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+@contextmanager
+def index_write_lock(index_dir: str = INDEX_DIR):
+    """Exclusive lock on ``index_dir`` shared by every server worker process.
+
+    Held while a worker updates the index, so two workers never build from
+    the same snapshot and overwrite each other's changes. Without ``fcntl``
+    (Windows) only the calling process is serialized.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(index_dir)), exist_ok=True)
+    with open(f"{index_dir}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def save_index(vectorstore, manifest: Dict, index_dir: str = INDEX_DIR) -> None:
+    """Write the FAISS index, chunk store, BM25 index and manifest to ``index_dir``.
+
+    The snapshot is written to a sibling staging directory first and moved
+    into place afterwards, so a crash (or a second worker saving at the same
+    time) never leaves a half-written snapshot behind. Workers that still
+    have the previous snapshot mapped keep reading it until they reopen.
+    With ``vectorstore`` None only the manifest is written, recording that
+    the index is empty.
+    """
+    parent_dir = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    staging_dir = f"{index_dir}.{uuid.uuid4().hex}.tmp"
+
+    try:
+        os.makedirs(staging_dir)
+        if vectorstore is not None:
+            faiss.write_index(vectorstore.index, os.path.join(staging_dir, INDEX_FILE))
+            chunk_ids = [vectorstore.index_to_docstore_id[position] for position in range(vectorstore.index.ntotal)]
+            chunk_store.write_chunks(staging_dir, chunk_ids, vectorstore.docstore)
+            lexical_index = getattr(vectorstore, 'lexical_index', None)
+            if lexical_index is not None:
+                lexical_index.save(staging_dir)
+        with open(os.path.join(staging_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        if os.path.exists(index_dir):
+            shutil.rmtree(index_dir, ignore_errors=True)
+        os.replace(staging_dir, index_dir)
+        print(f"Saved vector store snapshot to {index_dir}")
+    finally:
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def open_index(embeddings, index_dir: str = INDEX_DIR):
+    """Open the snapshot in ``index_dir`` as a LangChain FAISS store.
+
+    With INDEX_MMAP the index, chunk texts and BM25 postings are read through
+    memory maps and must not be modified in place; copy them first (see
+    ``copy_index``). A snapshot saved without a BM25 index opens with
+    ``lexical_index`` None.
+    """
+    mapped_docstore = chunk_store.MappedDocstore(index_dir)
+    if INDEX_MMAP:
+        index = faiss.read_index(os.path.join(index_dir, INDEX_FILE), faiss.IO_FLAG_MMAP_IFC)
+        docstore = mapped_docstore
+    else:
+        index = faiss.read_index(os.path.join(index_dir, INDEX_FILE))
+        docstore = chunk_store.SourceTrackedDocstore(dict(mapped_docstore.items()),
+                                                     mapped_docstore.source_chunk_ids)
+    apply_search_params(index)
+
+    vectorstore = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(mapped_docstore.chunk_ids)),
+    )
+    vectorstore.lexical_index = BM25Index.load(index_dir, mmap=INDEX_MMAP)
+    return vectorstore
+
+
+def load_index(embeddings, files_info: List[Dict], index_dir: str = INDEX_DIR):
+    """Load the saved snapshot if its manifest matches ``files_info``.
+
+    Returns ``(vectorstore, manifest)``, or ``(None, None)`` when there is no
+    usable snapshot and the index has to be rebuilt.
+    """
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        return None, None
+
+    if not manifest_matches(manifest, files_info):
+        print("Saved vector store is out of date with Firebase Storage")
+        return None, None
+
+    if manifest.get('index_settings') != index_settings():
+        print("Saved vector store was built with different index settings")
+        return None, None
+
+    try:
+        vectorstore = open_index(embeddings, index_dir)
+    except Exception as e:
+        print(f"Could not load saved vector store: {e}")
+        return None, None
+
+    return vectorstore, manifest
+
+
+# =============================================================================
+# BUILD ARTIFACTS
+# =============================================================================
+def save_artifact(vectorstore, manifest: Dict, artifact_dir: str = ARTIFACT_DIR, keep: int = 3) -> str:
+    """Save a snapshot as a new version under ``artifact_dir`` and mark it latest.
+
+    Each version is a complete snapshot directory named after its build time.
+    ``LATEST`` names the newest one and is replaced atomically once the
+    snapshot is in place. Only the ``keep`` newest versions are kept.
+    """
+    version = datetime.now().strftime("%Y%m%d-%H%M%S")
+    manifest = {**manifest, 'artifact_version': version}
+    version_dir = os.path.join(artifact_dir, version)
+    save_index(vectorstore, manifest, version_dir)
+
+    latest_path = os.path.join(artifact_dir, LATEST_FILE)
+    staging_path = f"{latest_path}.{uuid.uuid4().hex}.tmp"
+    with open(staging_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(staging_path, latest_path)
+
+    versions = sorted(
+        entry for entry in os.listdir(artifact_dir)
+        if os.path.isfile(os.path.join(artifact_dir, entry, MANIFEST_FILE))
+    )
+    for old_version in versions[:-keep] if keep > 0 else []:
+        # Servers still mapping an old version keep reading it until they reopen
+        shutil.rmtree(os.path.join(artifact_dir, old_version), ignore_errors=True)
+    return version_dir
+
+
+def latest_artifact(artifact_dir: str = ARTIFACT_DIR) -> Optional[str]:
+    """Directory of the newest build artifact, if there is one."""
+    if not artifact_dir:
+        return None
+    try:
+        with open(os.path.join(artifact_dir, LATEST_FILE), 'r', encoding='utf-8') as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    version_dir = os.path.join(artifact_dir, version)
+    return version_dir if version and os.path.isdir(version_dir) else None
@@ -0,0 +1,253 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Okapi BM25 parameters (term frequency saturation, document length normalization)
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+# Overlay chunks added after the postings were built are folded into new
+# postings once they exceed this share of the index (at least _MIN_OVERLAY)
+OVERLAY_RATIO = 0.1
+_MIN_OVERLAY = 1000
+
+# Files making up a saved BM25 index inside a snapshot directory
+IDS_FILE = "bm25_ids.json"
+TERMS_FILE = "bm25_terms.json"
+OFFSETS_FILE = "bm25_offsets.npy"
+POSITIONS_FILE = "bm25_positions.npy"
+COUNTS_FILE = "bm25_counts.npy"
+LENGTHS_FILE = "bm25_lengths.npy"
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric runs, so names, codes and numbers stay whole tokens."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """In-memory inverted index scoring chunks with Okapi BM25.
+
+    The postings of all terms are stored as flat arrays (``offsets[row]`` to
+    ``offsets[row + 1]`` in ``positions``/``counts`` belong to the term at
+    ``row``), so a query only touches the postings of its own terms and a
+    saved index can be memory-mapped and shared by every worker process.
+    Chunks added or deleted afterwards (incremental uploads) go to a small
+    overlay, like ``chunk_store.MappedDocstore``; scores always use the
+    statistics of the live chunks, so they match a fresh build.
+    """
+
+    def __init__(self, chunks: Iterable[Tuple[str, str]], k1: float = BM25_K1, b: float = BM25_B):
+        chunk_ids = []
+        term_counts = []
+        for chunk_id, text in chunks:
+            chunk_ids.append(chunk_id)
+            term_counts.append(Counter(tokenize(text)))
+        self.k1 = k1
+        self.b = b
+        self._set_postings(chunk_ids, term_counts)
+
+    # -- construction ---------------------------------------------------------
+    def _set_postings(self, chunk_ids: List[str], term_counts: List[Counter]) -> None:
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for position, terms in enumerate(term_counts):
+            for term, count in terms.items():
+                positions, counts = postings.setdefault(term, ([], []))
+                positions.append(position)
+                counts.append(count)
+        self._set_arrays(
+            chunk_ids,
+            np.asarray([sum(terms.values()) for terms in term_counts], dtype=np.float32),
+            {term: (np.asarray(positions, dtype=np.int32), np.asarray(counts, dtype=np.float32))
+             for term, (positions, counts) in postings.items()},
+        )
+
+    def _set_arrays(self, chunk_ids: List[str], lengths: np.ndarray,
+                    postings: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> None:
+        terms = sorted(postings)
+        sizes = np.fromiter((len(postings[term][0]) for term in terms), dtype=np.int64, count=len(terms))
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        empty = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+        self._load_arrays(
+            chunk_ids,
+            {term: row for row, term in enumerate(terms)},
+            offsets,
+            np.concatenate([postings[term][0] for term in terms] or [empty[0]]),
+            np.concatenate([postings[term][1] for term in terms] or [empty[1]]),
+            lengths,
+        )
+
+    def _load_arrays(self, chunk_ids: List[str], terms: Dict[str, int], offsets: np.ndarray,
+                     positions: np.ndarray, counts: np.ndarray, lengths: np.ndarray) -> None:
+        self.chunk_ids = chunk_ids
+        self._positions = {chunk_id: position for position, chunk_id in enumerate(chunk_ids)}
+        self._terms = terms
+        self._offsets = offsets
+        self._postings_positions = positions
+        self._postings_counts = counts
+        self._lengths = lengths
+        self._live = np.ones(len(chunk_ids), dtype=bool)
+        self._added: Dict[str, Counter] = {}
+        self._live_count = len(chunk_ids)
+        self._total_length = float(lengths.sum())
+        self._length_norm = None
+
+    # -- incremental updates (on copies that are not being served) ------------
+    def add(self, chunks: Iterable[Tuple[str, str]]) -> None:
+        for chunk_id, text in chunks:
+            if chunk_id in self._added or self._is_live(chunk_id):
+                raise ValueError(f"Chunk {chunk_id} is already indexed")
+            terms = Counter(tokenize(text))
+            self._added[chunk_id] = terms
+            self._total_length += sum(terms.values())
+        self._length_norm = None
+        if len(self._added) > max(_MIN_OVERLAY, OVERLAY_RATIO * self._live_count):
+            self._compact()
+
+    def delete(self, chunk_ids: Iterable[str]) -> None:
+        for chunk_id in chunk_ids:
+            terms = self._added.pop(chunk_id, None)
+            if terms is not None:
+                self._total_length -= sum(terms.values())
+            elif self._is_live(chunk_id):
+                position = self._positions[chunk_id]
+                self._live[position] = False
+                self._live_count -= 1
+                self._total_length -= float(self._lengths[position])
+        self._length_norm = None
+
+    def copy(self) -> "BM25Index":
+        """Copy sharing the postings arrays, with an independent overlay."""
+        clone = object.__new__(BM25Index)
+        clone.__dict__.update(self.__dict__)
+        clone._live = self._live.copy()
+        clone._added = dict(self._added)
+        return clone
+
+    def _is_live(self, chunk_id: str) -> bool:
+        position = self._positions.get(chunk_id)
+        return position is not None and bool(self._live[position])
+
+    def _live_postings(self) -> Tuple[List[str], np.ndarray, Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+        """Postings of the live chunks, overlay included, renumbered from 0."""
+        kept = np.flatnonzero(self._live)
+        renumber = np.full(len(self.chunk_ids), -1, dtype=np.int32)
+        renumber[kept] = np.arange(len(kept), dtype=np.int32)
+        chunk_ids = [self.chunk_ids[position] for position in kept] + list(self._added)
+        lengths = np.concatenate([
+            np.asarray(self._lengths, dtype=np.float32)[kept],
+            np.asarray([sum(terms.values()) for terms in self._added.values()], dtype=np.float32),
+        ])
+
+        postings = {}
+        for term, row in self._terms.items():
+            positions, counts = self._term_postings(row)
+            live = self._live[positions]
+            if live.any():
+                postings[term] = (renumber[positions[live]], np.asarray(counts[live], dtype=np.float32))
+        added_postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for position, terms in enumerate(self._added.values(), start=len(kept)):
+            for term, count in terms.items():
+                added_positions, added_counts = added_postings.setdefault(term, ([], []))
+                added_positions.append(position)
+                added_counts.append(count)
+        for term, (added_positions, added_counts) in added_postings.items():
+            positions, counts = postings.get(term, (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)))
+            postings[term] = (np.concatenate([positions, np.asarray(added_positions, dtype=np.int32)]),
+                              np.concatenate([counts, np.asarray(added_counts, dtype=np.float32)]))
+        return chunk_ids, lengths, postings
+
+    def _compact(self) -> None:
+        """Fold the overlay and deletions into new postings arrays."""
+        self._set_arrays(*self._live_postings())
+
+    # -- persistence ------------------------------------------------------------
+    def save(self, directory: str) -> None:
+        """Write the live chunks' postings (overlay folded in) to ``directory``."""
+        chunk_ids, lengths, postings = self._live_postings()
+        saved = object.__new__(BM25Index)
+        saved.k1, saved.b = self.k1, self.b
+        saved._set_arrays(chunk_ids, lengths, postings)
+        np.save(os.path.join(directory, OFFSETS_FILE), saved._offsets)
+        np.save(os.path.join(directory, POSITIONS_FILE), saved._postings_positions)
+        np.save(os.path.join(directory, COUNTS_FILE), saved._postings_counts)
+        np.save(os.path.join(directory, LENGTHS_FILE), saved._lengths)
+        with open(os.path.join(directory, IDS_FILE), 'w', encoding='utf-8') as f:
+            json.dump(chunk_ids, f)
+        with open(os.path.join(directory, TERMS_FILE), 'w', encoding='utf-8') as f:
+            json.dump(saved._terms, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> Optional["BM25Index"]:
+        """Open a saved index (postings memory-mapped with ``mmap``); None if the snapshot has none."""
+        if not os.path.exists(os.path.join(directory, TERMS_FILE)):
+            return None
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(directory, IDS_FILE), 'r', encoding='utf-8') as f:
+            chunk_ids = json.load(f)
+        with open(os.path.join(directory, TERMS_FILE), 'r', encoding='utf-8') as f:
+            terms = json.load(f)
+        index = object.__new__(cls)
+        index.k1, index.b = BM25_K1, BM25_B
+        index._load_arrays(
+            chunk_ids,
+            terms,
+            np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, POSITIONS_FILE), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, COUNTS_FILE), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, LENGTHS_FILE), mmap_mode=mmap_mode),
+        )
+        return index
+
+    # -- search -------------------------------------------------------------------
+    def __len__(self) -> int:
+        return self._live_count + len(self._added)
+
+    def _term_postings(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return self._postings_positions[start:end], self._postings_counts[start:end]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Top ``k`` ``(chunk_id, score)`` pairs for ``query``, best first; chunks sharing no term are left out."""
+        num_chunks = len(self)
+        if k <= 0 or num_chunks == 0:
+            return []
+        average_length = self._total_length / num_chunks or 1.0
+        if self._length_norm is None:
+            # Per-chunk denominator term of BM25: k1 * (1 - b + b * length / average length)
+            self._length_norm = self.k1 * (1 - self.b + self.b * np.asarray(self._lengths) / average_length)
+
+        scores = np.zeros(len(self.chunk_ids), dtype=np.float32)
+        added_scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            row = self._terms.get(term)
+            if row is not None:
+                positions, counts = self._term_postings(row)
+                live = self._live[positions]
+                positions, counts = positions[live], counts[live]
+            else:
+                positions, counts = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+            added = [(chunk_id, terms[term]) for chunk_id, terms in self._added.items() if term in terms]
+            frequency = len(positions) + len(added)
+            if not frequency:
+                continue
+            idf = math.log(1 + (num_chunks - frequency + 0.5) / (frequency + 0.5))
+            scores[positions] += idf * counts * (self.k1 + 1) / (counts + self._length_norm[positions])
+            for chunk_id, count in added:
+                norm = self.k1 * (1 - self.b + self.b * sum(self._added[chunk_id].values()) / average_length)
+                added_scores[chunk_id] = added_scores.get(chunk_id, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        results = [(self.chunk_ids[position], float(scores[position])) for position in matched]
+        results.extend(added_scores.items())
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results[:k]
@@ -1,10 +1,20 @@
 # main.py - Complete Corrected Version
 import re
 import os
+import sys
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
 import tempfile
+import threading
 import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 # Load environment variables first
 from dotenv import load_dotenv
@@ -12,6 +22,8 @@ load_dotenv()
 
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import firebase_admin
 from firebase_admin import credentials, storage
@@ -48,14 +60,36 @@ except Exception:
             return None
 
 # LangChain imports
-from langchain_community.document_loaders import UnstructuredPDFLoader, PyPDFLoader, CSVLoader, UnstructuredExcelLoader
-from langchain_text_splitters.character import CharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_groq import ChatGroq
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain
-import pandas as pd  # For Excel/CSV processing
+from langchain.schema import Document
+import numpy as np
+
+# Document parsing, shared embedding model, local vector store snapshots,
+# embedding cache and blob mirror
+# (absolute import when run as script, relative when packaged)
+try:
+    import index_store
+    import chunk_store
+    import dedup
+    import retrieval
+    import embedding_cache
+    import blob_storage
+    from document_loader import ParsePool, ParseTimeout, load_document
+    from chunking import split_documents
+    from embedding_model import get_embedding_model
+except ImportError:
+    from . import index_store  # type: ignore
+    from . import chunk_store  # type: ignore
+    from . import dedup  # type: ignore
+    from . import retrieval  # type: ignore
+    from . import embedding_cache  # type: ignore
+    from . import blob_storage  # type: ignore
+    from .document_loader import ParsePool, ParseTimeout, load_document  # type: ignore
+    from .chunking import split_documents  # type: ignore
+    from .embedding_model import get_embedding_model  # type: ignore
 
 # =============================================================================
 # CONFIGURATION & INITIALIZATION
@@ -73,6 +107,93 @@ if admin_router is not None:
 
 PORT = int(os.getenv("PORT", 8000))
 
+# Document reload pipeline: concurrent Firebase downloads feeding parse worker processes
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 8))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+PARSE_TIMEOUT_SECONDS = float(os.getenv("PARSE_TIMEOUT_SECONDS", 300))
+# Rebuild the index at startup when no saved snapshot or build artifact
+# matches; set to 0 when indexes are built offline with build_index.py
+REBUILD_ON_STARTUP = os.getenv("REBUILD_ON_STARTUP", "1") == "1"
+# Each server worker serves its own copy of the index; updates saved by one
+# worker are picked up by the others this often (seconds, 0 = never)
+SNAPSHOT_CHECK_SECONDS = float(os.getenv("SNAPSHOT_CHECK_SECONDS", 5))
+# Chunks are embedded in batches of this size so reindex jobs can report progress
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 256))
+
+# Uploads are streamed to disk (and on to Firebase) in chunks and capped in size
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", 200)) * 1024 * 1024)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Batch uploads: files per request, total request size and concurrent transfers to Firebase
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 100))
+MAX_BATCH_UPLOAD_BYTES = int(float(os.getenv("MAX_BATCH_UPLOAD_MB", 1024)) * 1024 * 1024)
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 8))
+# Resumable upload chunk size for Firebase; must be a multiple of 256 KB
+STORAGE_CHUNK_BYTES = 8 * 1024 * 1024
+
+class UploadTooLarge(Exception):
+    pass
+
+class UploadSizeLimitMiddleware:
+    """Answer uploads over the size cap with 413 before FastAPI spools the body."""
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits  # path -> maximum request body bytes
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit:
+            await self.reject(scope, receive, send, limit)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise UploadTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                return  # the app's error response for the cut-off body is replaced below
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self.reject(scope, receive, send, limit)
+
+    @staticmethod
+    async def reject(scope, receive, send, limit: int):
+        detail = (upload_too_large_message() if scope["path"] == "/upload-document"
+                  else f"Upload too large. Maximum total size of a batch is {limit // (1024 * 1024)} MB")
+        response = JSONResponse(status_code=413, content={"detail": detail}, headers={"Connection": "close"})
+        await response(scope, receive, send)
+
+# Added before CORS so that CORS wraps it and the 413 still carries CORS headers
+app.add_middleware(UploadSizeLimitMiddleware, limits={
+    # Multipart framing (boundaries, part headers) comes on top of the file itself
+    "/upload-document": MAX_UPLOAD_BYTES + UPLOAD_CHUNK_BYTES,
+    "/upload-documents": MAX_BATCH_UPLOAD_BYTES,
+})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -87,42 +208,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Firebase Admin SDK
-try:
-    if not firebase_admin._apps:
-        firebase_config = {
-            "type": "service_account",
-            "project_id": os.getenv("FIREBASE_PROJECT_ID"),
-            "private_key_id": os.getenv("FIREBASE_PRIVATE_KEY_ID"),
-            "private_key": os.getenv("FIREBASE_PRIVATE_KEY", "").replace('\\n', '\n'),
-            "client_email": os.getenv("FIREBASE_CLIENT_EMAIL"),
-            "client_id": os.getenv("FIREBASE_CLIENT_ID"),
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-        }
-
-        cred = credentials.Certificate(firebase_config)
-        firebase_admin.initialize_app(cred, {
-            'storageBucket': f"{firebase_config['project_id']}.firebasestorage.app"
-        })
+# Use a local directory in place of Firebase Storage (development / offline testing)
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR")
 
-    bucket = storage.bucket()
+if LOCAL_STORAGE_DIR:
+    bucket = blob_storage.LocalDirectoryBucket(LOCAL_STORAGE_DIR)
     FIREBASE_INITIALIZED = True
-    # If admin_api module is available, wire Firestore client for DB operations
+    print(f"Using local storage directory {LOCAL_STORAGE_DIR} instead of Firebase Storage")
+else:
+    # Initialize Firebase Admin SDK
     try:
-        if _admin_api is not None and _firestore is not None:
-            setattr(_admin_api, 'FIREBASE_INITIALIZED', True)
-            setattr(_admin_api, 'db', _firestore.client())
-    except Exception:
-        pass
-    print("Firebase initialized successfully")
-except Exception as e:
-    print(f"Firebase initialization failed: {e}")
-    FIREBASE_INITIALIZED = False
+        if not firebase_admin._apps:
+            firebase_config = {
+                "type": "service_account",
+                "project_id": os.getenv("FIREBASE_PROJECT_ID"),
+                "private_key_id": os.getenv("FIREBASE_PRIVATE_KEY_ID"),
+                "private_key": os.getenv("FIREBASE_PRIVATE_KEY", "").replace('\\n', '\n'),
+                "client_email": os.getenv("FIREBASE_CLIENT_EMAIL"),
+                "client_id": os.getenv("FIREBASE_CLIENT_ID"),
+                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                "token_uri": "https://oauth2.googleapis.com/token",
+            }
+
+            cred = credentials.Certificate(firebase_config)
+            firebase_admin.initialize_app(cred, {
+                'storageBucket': f"{firebase_config['project_id']}.firebasestorage.app"
+            })
+
+        bucket = storage.bucket()
+        FIREBASE_INITIALIZED = True
+        # If admin_api module is available, wire Firestore client for DB operations
+        try:
+            if _admin_api is not None and _firestore is not None:
+                setattr(_admin_api, 'FIREBASE_INITIALIZED', True)
+                setattr(_admin_api, 'db', _firestore.client())
+        except Exception:
+            pass
+        print("Firebase initialized successfully")
+    except Exception as e:
+        print(f"Firebase initialization failed: {e}")
+        FIREBASE_INITIALIZED = False
 
 vectorstore = None
 conversation_chain = None
-loaded_documents = []
+loaded_document_counts: Dict[str, int] = {}  # source file name -> pages/rows loaded
+loaded_manifest: Dict = {}  # manifest of the installed index (what each file's indexed content is)
+index_swap_lock = threading.Lock()
+# Every installed vector store gets a new version; retrieval results are cached per version
+index_versions = itertools.count(1)
+# Snapshots saved before this worker started were already considered at startup
+worker_started_at = datetime.now().isoformat()
+blob_mirror = blob_storage.BlobMirror()
 
 # =============================================================================
 # IMPROVED SESSION MANAGEMENT WITH BETTER NUMBER TRACKING
@@ -243,123 +379,117 @@ class ChatResponse(BaseModel):
 # =============================================================================
 # DOCUMENT PROCESSING FUNCTIONS
 # =============================================================================
-def load_document(file_path: str):
-    """Load documents from PDF, Excel (.xlsx, .xls), or CSV files."""
-    documents = []
-    file_name = os.path.basename(file_path)
-    file_ext = os.path.splitext(file_name)[1].lower()
-
-    # Handle CSV files
-    if file_ext == '.csv':
-        try:
-            df = pd.read_csv(file_path)
-            print(f"Loaded CSV with {len(df)} rows and columns: {list(df.columns)}")
-            
-            from langchain.schema import Document
-            documents = []
-            for idx, row in df.iterrows():
-                row_text = " | ".join([f"{col}: {row[col]}" for col in df.columns if pd.notna(row[col])])
-                documents.append(Document(
-                    page_content=row_text,
-                    metadata={"source": file_name, "row": idx + 1, "type": "csv"}
-                ))
-            
-            print(f"Loaded {file_name} as CSV with {len(documents)} records")
-            return documents
-        except Exception as e:
-            print(f"CSV loading failed for {file_name}: {e}")
-            raise Exception(f"CSV processing failed for {file_name}: {e}")
-    
-    # Handle Excel files (.xlsx, .xls)
-    elif file_ext in ['.xlsx', '.xls']:
-        try:
-            df = pd.read_excel(file_path)
-            print(f"Loaded Excel with {len(df)} rows and columns: {list(df.columns)}")
-            
-            from langchain.schema import Document
-            documents = []
-            for idx, row in df.iterrows():
-                row_text = " | ".join([f"{col}: {row[col]}" for col in df.columns if pd.notna(row[col])])
-                documents.append(Document(
-                    page_content=row_text,
-                    metadata={"source": file_name, "row": idx + 1, "type": "excel"}
-                ))
-            
-            print(f"Loaded {file_name} as Excel with {len(documents)} records")
-            return documents
-        except Exception as e:
-            print(f"Excel loading failed for {file_name}: {e}")
-            raise Exception(f"Excel processing failed for {file_name}: {e}")
-    
-    # Handle PDF files
-    elif file_ext == '.pdf':
-        try:
-            loader = UnstructuredPDFLoader(file_path)
-            documents = loader.load()
-            if documents:
-                print(f"Loaded {file_name} using UnstructuredPDFLoader")
-                return documents
-        except Exception as e:
-            print(f"UnstructuredPDFLoader failed for {file_name}: {e}")
-
-        try:
-            loader = PyPDFLoader(file_path)
-            documents = loader.load()
-            if documents:
-                print(f"Loaded {file_name} using PyPDFLoader")
-                return documents
-        except Exception as e:
-            print(f"PyPDFLoader failed for {file_name}: {e}")
-
-        raise Exception(f"All PDF processing methods failed for {file_name}")
-    
-    else:
-        raise Exception(f"Unsupported file format: {file_ext}. Supported formats: .pdf, .csv, .xlsx, .xls")
-
-def setup_vectorstore(documents):
+def count_documents_by_source(documents) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for doc in documents:
+        source = doc.metadata.get("source", "unknown")
+        counts[source] = counts.get(source, 0) + 1
+    return counts
+
+def embed_chunks(doc_chunks, embeddings, job=None):
+    """Embed chunk texts in batches, reporting progress to ``job`` if given."""
+    texts = [chunk.page_content for chunk in doc_chunks]
+    if job is not None:
+        job.start_stage('embedding', len(texts))
+
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[start:start + EMBED_BATCH_SIZE]
+        vectors.extend(embeddings.embed_documents(batch))
+        if job is not None:
+            job.advance(len(batch))
+    return list(zip(texts, vectors))
+
+def setup_vectorstore(documents, job=None):
     if not documents:
         raise ValueError("No documents provided for vectorstore creation")
 
     print(f"Processing {len(documents)} document pages...")
 
-    text_splitter = CharacterTextSplitter(
-        separator='\n',
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
-    )
+    if job is not None:
+        job.start_stage('chunking', len(documents))
+    doc_chunks = dedup.merge_near_duplicates(split_documents(documents))
+    if not doc_chunks:
+        raise ValueError("No text chunks could be created from the documents")
 
-    doc_chunks = text_splitter.split_documents(documents)
-    print(f"Created {len(doc_chunks)} text chunks")
+    embeddings = get_embedding_model()
 
-    if len(doc_chunks) > 2000:
-        print("Large document detected. Limiting to 2000 chunks for performance.")
-        doc_chunks = doc_chunks[:2000]
-
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
+    print("Creating vector store...")
+    text_embeddings = embed_chunks(doc_chunks, embeddings, job)
+    vectors = np.array([vector for _, vector in text_embeddings], dtype=np.float32)
+    if job is not None:
+        job.start_stage('indexing', len(vectors))
+    index = index_store.build_faiss_index(vectors)
+
+    chunk_ids = [str(uuid.uuid4()) for _ in doc_chunks]
+    vectorstore = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=chunk_store.SourceTrackedDocstore({
+            chunk_id: Document(id=chunk_id, page_content=chunk.page_content, metadata=chunk.metadata)
+            for chunk_id, chunk in zip(chunk_ids, doc_chunks)
+        }),
+        index_to_docstore_id=dict(enumerate(chunk_ids)),
     )
+    # BM25 over the same chunks, fused with vector results for exact-token lookups
+    retrieval.ensure_lexical_index(vectorstore)
+    print(f"Vector store created successfully! ({len(chunk_ids)} chunks, {index_store.describe_index(index)} index)")
 
-    print("Creating vector store...")
-    vectorstore = FAISS.from_documents(doc_chunks, embeddings)
-    print("Vector store created successfully!")
+    if index_store.describe_index(index) != "flat":
+        index_store.check_index_quality(index, vectors)
 
     return vectorstore
 
+def copy_vectorstore(source, share_index: bool = False):
+    """Copy of a vector store that can be modified while ``source`` keeps serving."""
+    store_copy = FAISS(
+        embedding_function=source.embedding_function,
+        index=source.index if share_index else index_store.copy_index(source.index),
+        docstore=chunk_store.copy_docstore(source.docstore),
+        index_to_docstore_id=dict(source.index_to_docstore_id),
+        normalize_L2=source._normalize_L2,
+        distance_strategy=source.distance_strategy,
+    )
+    lexical_index = getattr(source, 'lexical_index', None)
+    if lexical_index is not None and not share_index:
+        lexical_index = lexical_index.copy()
+    store_copy.lexical_index = lexical_index
+    return store_copy
+
+def install_vectorstore(new_vectorstore, manifest: Dict, index_version: Optional[int] = None):
+    """Swap a built vector store and a chain over it into service; ``None`` takes the index out of service."""
+    global vectorstore, conversation_chain, loaded_document_counts, loaded_manifest
+
+    document_counts = {
+        name: info.get('documents', 0) for name, info in manifest.get('files', {}).items()
+        if info.get('documents', 0)
+    }
+    if new_vectorstore is not None:
+        # A new version keys a fresh retrieval cache, unless this is a reopened copy of the same chunks
+        new_vectorstore.index_version = index_version or next(index_versions)
+        retrieval.ensure_lexical_index(new_vectorstore)
+    new_chain = create_chain(new_vectorstore) if new_vectorstore is not None else None
+    with index_swap_lock:
+        vectorstore, conversation_chain = new_vectorstore, new_chain
+        loaded_document_counts, loaded_manifest = document_counts, manifest
+
+def updated_manifest(files_info: Dict[str, Dict], document_counts: Dict[str, int],
+                     removed: Iterable[str] = ()) -> Dict:
+    """``loaded_manifest`` with the ``files_info`` entries added or replaced and ``removed`` dropped."""
+    files = {name: info for name, info in loaded_manifest.get('files', {}).items() if name not in removed}
+    files.update(files_info)
+    return index_store.build_manifest([{**info, 'name': name} for name, info in files.items()], document_counts)
+
 def create_chain(vectorstore):
     from langchain.prompts import PromptTemplate
     
     llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0)
 
-    retriever = vectorstore.as_retriever(
-        search_type="mmr",
-        search_kwargs={
-            "k": 15,  # Increased from 10 to 15 for better context
-            "fetch_k": 30,  # Increased from 25 to 30
-            "lambda_mult": 0.5
-        }
+    retriever = retrieval.CachedMMRRetriever(
+        vectorstore=vectorstore,
+        k=15,  # Increased from 10 to 15 for better context
+        fetch_k=30,  # Increased from 25 to 30
+        lambda_mult=0.5
     )
 
     memory = ConversationBufferMemory(
@@ -416,19 +546,64 @@ Answer in a helpful, informative tone:"""
 # =============================================================================
 # FIREBASE FUNCTIONS
 # =============================================================================
+def local_file_info(file_path: str, file_name: str) -> Dict:
+    """A ``list_firebase_files`` style entry for a local copy of ``file_name``."""
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b''):
+            digest.update(block)
+    return {
+        'name': file_name,
+        'size': os.path.getsize(file_path),
+        'md5': base64.b64encode(digest.digest()).decode('ascii'),
+        'generation': None,
+    }
+
 def upload_file_to_firebase(file_path: str, file_name: str):
     if not FIREBASE_INITIALIZED:
         return False, "Firebase not initialized"
 
     try:
-        blob = bucket.blob(f"documents/{file_name}")
+        blob = bucket.blob(f"documents/{file_name}", chunk_size=STORAGE_CHUNK_BYTES)
         blob.upload_from_filename(file_path)
         print(f"Uploaded {file_name} to Firebase Storage")
+        try:
+            # The upload response carries the new md5/generation; mirror the file so
+            # the next reload does not download it again
+            blob_mirror.store(blob.name, blob.md5_hash, blob.generation, file_path)
+        except Exception as e:
+            print(f"Could not mirror {file_name}: {e}")
         return True, f"File '{file_name}' uploaded successfully"
     except Exception as e:
         print(f"Upload failed for {file_name}: {e}")
         return False, f"Upload failed: {str(e)}"
 
+def copy_firebase_file(source_name: str, file_name: str):
+    """Copy an already stored document to a new name inside the bucket (no upload)."""
+    if not FIREBASE_INITIALIZED:
+        return False, "Firebase not initialized"
+
+    try:
+        bucket.copy_blob(bucket.blob(f"documents/{source_name}"), bucket, f"documents/{file_name}")
+        print(f"Copied {source_name} to {file_name} in Firebase Storage")
+        return True, f"File '{file_name}' stored as a copy of '{source_name}'"
+    except Exception as e:
+        print(f"Copy failed for {file_name}: {e}")
+        return False, f"Copy failed: {str(e)}"
+
+def delete_firebase_file(file_name: str) -> bool:
+    """Delete a document blob and its mirrored copy; False if there was no such blob."""
+    if not FIREBASE_INITIALIZED:
+        return False
+
+    blob = bucket.blob(f"documents/{file_name}")
+    if not blob.exists():
+        return False
+    blob.delete()
+    blob_mirror.remove(blob.name)
+    print(f"Deleted {file_name} from Firebase Storage")
+    return True
+
 def list_firebase_files():
     if not FIREBASE_INITIALIZED:
         return []
@@ -445,6 +620,8 @@ def list_firebase_files():
                     'name': blob.name.replace('documents/', ''),
                     'size': blob.size or 0,
                     'created': blob.time_created.isoformat() if blob.time_created else '',
+                    'md5': blob.md5_hash,
+                    'generation': blob.generation,
                     'status': 'loaded'
                 })
 
@@ -453,66 +630,623 @@ def list_firebase_files():
         print(f"Error listing files: {e}")
         return []
 
-def download_firebase_file(file_name: str):
+def fetch_firebase_file(file_info: Dict) -> Optional[str]:
+    """Local copy of a Firebase document from the blob mirror; the caller must not delete it."""
     if not FIREBASE_INITIALIZED:
         return None
 
+    file_name = file_info['name']
     try:
         blob = bucket.blob(f"documents/{file_name}")
-        if not blob.exists():
-            return None
-
-        file_ext = os.path.splitext(file_name)[1] or '.tmp'
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_ext)
-        temp_file_path = temp_file.name
-        temp_file.close()
-
-        blob.download_to_filename(temp_file_path)
-        return temp_file_path
+        return blob_mirror.fetch(blob, file_info.get('md5'), file_info.get('generation'))
     except Exception as e:
         print(f"Download failed for {file_name}: {e}")
         return None
 
-def reload_all_documents():
-    global vectorstore, conversation_chain, loaded_documents
+def save_vectorstore_snapshot(snapshot_vectorstore, manifest: Dict):
+    """Persist a built index with its manifest so the next start can skip the rebuild."""
+    try:
+        index_store.save_index(snapshot_vectorstore, manifest)
+    except Exception as e:
+        print(f"Could not save vector store snapshot: {e}")
+        return
 
-    print("Reloading all documents from Firebase...")
+    if index_store.INDEX_MMAP and snapshot_vectorstore is not None:
+        # Serve the mapped copy, shared with the other workers, instead of a private one
+        try:
+            saved_vectorstore = index_store.open_index(get_embedding_model())
+            install_vectorstore(saved_vectorstore, manifest,
+                                getattr(snapshot_vectorstore, 'index_version', None))
+        except Exception as e:
+            print(f"Could not open saved vector store snapshot: {e}")
+
+def refresh_vectorstore_snapshot() -> bool:
+    """Install the snapshot in INDEX_DIR if another server worker saved a newer one."""
+    manifest = index_store.read_manifest()
+    served = max(loaded_manifest.get('created', ''), worker_started_at)
+    if manifest is None or manifest.get('created', '') <= served:
+        return False
+    if not manifest.get('files'):
+        # Another worker deleted the last document
+        install_vectorstore(None, manifest)
+        print(f"Vector store emptied at {manifest['created']} by another worker")
+        return True
+    try:
+        saved_vectorstore = index_store.open_index(get_embedding_model())
+    except Exception as e:
+        print(f"Could not open saved vector store snapshot: {e}")
+        return False
+    if index_store.read_manifest() != manifest:
+        return False  # replaced while opening; the next check picks up the newer one
+    install_vectorstore(saved_vectorstore, manifest)
+    print(f"Loaded vector store snapshot saved at {manifest['created']} by another worker")
+    return True
+
+async def watch_vectorstore_snapshot():
+    """Pick up index updates saved by the other server workers."""
+    while True:
+        await asyncio.sleep(SNAPSHOT_CHECK_SECONDS)
+        try:
+            await run_in_threadpool(refresh_vectorstore_snapshot)
+        except Exception as e:
+            print(f"Vector store snapshot check failed: {e}")
+
+def load_vectorstore_snapshot():
+    """Load the latest build artifact or saved snapshot if it still matches the documents in Firebase."""
     firebase_files = list_firebase_files()
     if not firebase_files:
         return False, "No documents found in Firebase"
 
+    start_time = time.time()
+    saved_vectorstore, manifest = None, None
+    artifact_dir = index_store.latest_artifact()
+    if artifact_dir is not None:
+        saved_vectorstore, manifest = index_store.load_index(get_embedding_model(), firebase_files, artifact_dir)
+        if saved_vectorstore is not None:
+            print(f"Using index build artifact {manifest.get('artifact_version')}")
+    if saved_vectorstore is None:
+        saved_vectorstore, manifest = index_store.load_index(get_embedding_model(), firebase_files)
+    if saved_vectorstore is None:
+        return False, "No up-to-date vector store snapshot found"
+
+    install_vectorstore(saved_vectorstore, manifest)
+    return True, f"Loaded vector store snapshot for {len(firebase_files)} documents in {time.time() - start_time:.1f}s"
+
+def _remove_temp_file(temp_file_path: str):
+    try:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+    except OSError as e:
+        print(f"Could not remove temp file {temp_file_path}: {e}")
+
+def start_parse_pool() -> ParsePool:
+    """Parse worker processes; each file gets PARSE_TIMEOUT_SECONDS from when a worker starts on it."""
+    return ParsePool(PARSE_WORKERS, PARSE_TIMEOUT_SECONDS)
+
+def _collect_parse_results(parse_futures: Dict, job=None):
+    """Wait for each file's parse. Returns ``(documents_by_file, errors_by_file)``."""
+    results: Dict[str, List] = {}
+    errors: Dict[str, str] = {}
+    for file_name, future in parse_futures.items():
+        try:
+            documents = future.result()
+            results[file_name] = documents
+            print(f"✓ Successfully loaded {file_name} with {len(documents)} document(s)")
+        except ParseTimeout as e:
+            errors[file_name] = str(e)
+            print(f"✗ Timed out processing {file_name}: {e}")
+        except Exception as e:
+            errors[file_name] = str(e)
+            print(f"✗ Failed to process {file_name}: {str(e)}")
+        if job is not None:
+            job.advance()
+    return results, errors
+
+def load_firebase_documents(firebase_files: List[Dict], job=None):
+    """Download and parse ``firebase_files`` concurrently. Returns ``(documents, loaded_files)``."""
+    file_names = [file_info['name'] for file_info in firebase_files]
+    results: Dict[str, List] = {}
+    parse_futures = {}
+    if job is not None:
+        job.start_stage('loading', len(file_names))
+
+    download_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS)
+    parse_pool = start_parse_pool()
+    try:
+        download_futures = {
+            download_pool.submit(fetch_firebase_file, file_info): file_info['name']
+            for file_info in firebase_files
+        }
+        for future in as_completed(download_futures):
+            file_name = download_futures[future]
+            local_path = future.result()
+            if not local_path:
+                print(f"✗ Failed to download {file_name} from Firebase")
+                if job is not None:
+                    job.advance()
+                continue
+            print(f"Processing {file_name}...")
+            parse_futures[file_name] = parse_pool.submit(local_path, file_name)
+
+        results, _ = _collect_parse_results(parse_futures, job)
+    finally:
+        download_pool.shutdown(wait=True)
+        # Every file is parsed by now unless an error cut the reload short
+        parse_pool.shutdown(cancel=True)
+
     all_documents = []
-    successful_loads = 0
+    for file_name in file_names:
+        all_documents.extend(results.get(file_name, []))
+    return all_documents, [file_name for file_name in file_names if file_name in results]
+
+def load_local_files(files: List[Tuple[str, str]], job=None):
+    """Parse local ``(file_path, file_name)`` files. Returns ``(documents_by_file, errors_by_file)``."""
+    if job is not None:
+        job.start_stage('loading', len(files))
+
+    parse_pool = start_parse_pool()
+    try:
+        parse_futures = {
+            file_name: parse_pool.submit(file_path, file_name)
+            for file_path, file_name in files
+        }
+        results, errors = _collect_parse_results(parse_futures, job)
+    finally:
+        parse_pool.shutdown(cancel=True)
+    return results, errors
 
-    for file_info in firebase_files:
-        file_name = file_info['name']
-        print(f"Processing {file_name}...")
+def reload_all_documents(job=None):
+    """Rebuild the index from every document in Firebase and swap it in."""
+    print("Reloading all documents from Firebase...")
+    firebase_files = list_firebase_files()
+    if not firebase_files:
+        return False, "No documents found in Firebase"
+
+    all_documents, loaded_files = load_firebase_documents(firebase_files, job)
+    blob_mirror.prune(f"documents/{file_info['name']}" for file_info in firebase_files)
+
+    if all_documents:
+        print(f"Total documents loaded: {len(all_documents)}")
+        new_vectorstore = setup_vectorstore(all_documents, job)
+        # Files that failed stay out of the manifest, so the next start sees them as new
+        manifest = index_store.build_manifest([info for info in firebase_files if info['name'] in loaded_files],
+                                              count_documents_by_source(all_documents))
+        install_vectorstore(new_vectorstore, manifest)
+        if job is not None:
+            job.start_stage('saving')
+        save_vectorstore_snapshot(new_vectorstore, manifest)
+        return True, f"Successfully loaded {len(loaded_files)} out of {len(firebase_files)} documents"
+
+    return False, "No documents could be processed"
 
-        temp_file_path = download_firebase_file(file_name)
-        if temp_file_path:
+def release_source_chunks(target_vectorstore, source_name: str) -> int:
+    """Drop ``source_name``'s chunks from ``target_vectorstore``; returns the number deleted."""
+    stale_ids = []
+    shared = []
+    for doc_id in chunk_store.source_chunk_ids(target_vectorstore.docstore, source_name):
+        doc = target_vectorstore.docstore.search(doc_id)
+        sources = dedup.chunk_sources(doc.metadata)
+        (stale_ids if len(sources) == 1 else shared).append((doc_id, doc, sources))
+
+    for doc_id, doc, sources in shared:
+        remaining = [source for source in sources if source != source_name]
+        metadata = {**doc.metadata, "source": remaining[0], "sources": remaining}
+        if len(remaining) == 1:
+            del metadata["sources"]
+        chunk_store.replace_document(target_vectorstore.docstore, doc_id,
+                                     Document(id=doc_id, page_content=doc.page_content, metadata=metadata))
+
+    if stale_ids:
+        index_store.remove_vectors(target_vectorstore, [doc_id for doc_id, _, _ in stale_ids])
+        if target_vectorstore.lexical_index is not None:
+            target_vectorstore.lexical_index.delete(doc_id for doc_id, _, _ in stale_ids)
+    return len(stale_ids)
+
+def add_source_to_chunk(target_vectorstore, doc_id: str, source_name: str):
+    """Record that ``source_name`` also contains the already indexed chunk ``doc_id``."""
+    doc = target_vectorstore.docstore.search(doc_id)
+    sources = dedup.chunk_sources(doc.metadata)
+    if source_name not in sources:
+        metadata = {**doc.metadata, "sources": sources + [source_name]}
+        chunk_store.replace_document(target_vectorstore.docstore, doc_id,
+                                     Document(id=doc_id, page_content=doc.page_content, metadata=metadata))
+
+def load_stored_document(file_name: str) -> Tuple[List, Dict]:
+    """Parse ``file_name`` from Firebase. Returns ``(documents, file_info)``."""
+    local_path = fetch_firebase_file({'name': file_name})
+    if not local_path:
+        raise ValueError(f"Could not download {file_name} from Firebase")
+    file_info = local_file_info(local_path, file_name)
+    documents = load_document(local_path, file_name)
+    if not documents:
+        raise ValueError(f"No content could be extracted from {file_name}")
+    return documents, file_info
+
+def merge_into_index(documents_by_file: Dict[str, List], files_info: Dict[str, Dict], job=None,
+                     copies: List[Tuple[str, str]] = ()) -> int:
+    """Replace the given files' chunks in the index with one update; returns the number of chunks added."""
+    documents_by_file, files_info = dict(documents_by_file), dict(files_info)
+    indexed_files = loaded_manifest.get('files', {})
+    for file_name, existing_name in copies:
+        if existing_name not in indexed_files:
+            # The original was deleted after the upload matched it; index the stored copy itself
+            print(f"{existing_name} is no longer indexed, parsing {file_name} instead")
             try:
-                documents = load_document(temp_file_path)
-                all_documents.extend(documents)
-                successful_loads += 1
-                print(f"✓ Successfully loaded {file_name} with {len(documents)} document(s)")
-                os.remove(temp_file_path)
+                documents_by_file[file_name], files_info[file_name] = load_stored_document(file_name)
             except Exception as e:
                 print(f"✗ Failed to process {file_name}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
+    copies = [(file_name, existing_name) for file_name, existing_name in copies if existing_name in indexed_files]
+    if not documents_by_file and not copies:
+        return 0
+
+    all_documents = [doc for documents in documents_by_file.values() for doc in documents]
+    current_vectorstore = vectorstore
+    if current_vectorstore is None:
+        new_vectorstore = setup_vectorstore(all_documents, job)
+        document_counts = {}
+        chunk_count = new_vectorstore.index.ntotal
+    else:
+        replaced = [
+            file_name for file_name in list(documents_by_file) + [file_name for file_name, _ in copies]
+            if chunk_store.source_chunk_ids(current_vectorstore.docstore, file_name)
+        ]
+        # Work on a copy so the live index is never mutated while serving; when
+        # no vectors are added or removed the copy can share the index
+        new_vectorstore = copy_vectorstore(current_vectorstore, share_index=not all_documents and not replaced)
+        for file_name in replaced:
+            removed = release_source_chunks(new_vectorstore, file_name)
+            if removed:
+                print(f"Removed {removed} stale chunks for {file_name}")
+
+        new_chunks = []
+        if all_documents:
+            doc_chunks = dedup.merge_near_duplicates(split_documents(all_documents))
+            text_embeddings = embed_chunks(doc_chunks, new_vectorstore.embedding_function, job)
+
+            # Chunks already indexed from other files only gain a source
+            matches = dedup.match_indexed_chunks(
+                new_vectorstore,
+                [text for text, _ in text_embeddings],
+                [vector for _, vector in text_embeddings],
+            )
+            for chunk, text_embedding, match in zip(doc_chunks, text_embeddings, matches):
+                if match is None:
+                    new_chunks.append((chunk, text_embedding))
+                else:
+                    for source_name in dedup.chunk_sources(chunk.metadata):
+                        add_source_to_chunk(new_vectorstore, match, source_name)
+            if len(new_chunks) < len(doc_chunks):
+                print(f"{len(doc_chunks) - len(new_chunks)} new chunks were already indexed")
+            if new_chunks:
+                new_ids = new_vectorstore.add_embeddings(
+                    [text_embedding for _, text_embedding in new_chunks],
+                    metadatas=[chunk.metadata for chunk, _ in new_chunks],
+                )
+                if new_vectorstore.lexical_index is not None:
+                    new_vectorstore.lexical_index.add(
+                        (chunk_id, text) for chunk_id, (_, (text, _)) in zip(new_ids, new_chunks)
+                    )
+        document_counts = dict(loaded_document_counts)
+        chunk_count = len(new_chunks)
+
+        for file_name, existing_name in copies:
+            for doc_id in chunk_store.source_chunk_ids(new_vectorstore.docstore, existing_name):
+                add_source_to_chunk(new_vectorstore, doc_id, file_name)
+            document_counts[file_name] = document_counts.get(existing_name, 0)
+            files_info[file_name] = indexed_files[existing_name]
+    for file_name, documents in documents_by_file.items():
+        document_counts[file_name] = len(documents)
+
+    manifest = updated_manifest(files_info, document_counts)
+    install_vectorstore(new_vectorstore, manifest)
+    if job is not None:
+        job.start_stage('saving')
+    save_vectorstore_snapshot(new_vectorstore, manifest)
+    return chunk_count
+
+def index_document_file(file_path: str, file_name: str, job=None):
+    """Parse a single file and merge its chunks into the index."""
+    if job is not None:
+        job.start_stage('loading', 1)
+    try:
+        file_info = local_file_info(file_path, file_name)
+        documents = load_document(file_path, file_name)
+    except Exception as e:
+        print(f"✗ Failed to process {file_name}: {str(e)}")
+        return False, f"Failed to process {file_name}: {str(e)}"
+    if job is not None:
+        job.advance()
+    if not documents:
+        return False, f"No content could be extracted from {file_name}"
+
+    chunk_count = merge_into_index({file_name: documents}, {file_name: file_info}, job)
+    print(f"Indexed {file_name}: {chunk_count} chunks added to the vector store")
+    return True, f"Indexed {file_name} ({chunk_count} chunks)"
+
+def index_uploaded_file(temp_file_path: str, file_name: str, job=None):
+    """Index an uploaded temp file, then delete it."""
+    try:
+        return index_document_file(temp_file_path, file_name, job)
+    finally:
+        _remove_temp_file(temp_file_path)
+
+def find_indexed_copy(md5_hash: str, file_name: str) -> Optional[str]:
+    """Indexed file whose content is identical to an upload (``file_name`` itself preferred)."""
+    return index_store.find_indexed_copy(loaded_manifest, md5_hash, file_name)
+
+def index_file_copy(file_name: str, existing_name: str, job=None):
+    """Index an upload identical to ``existing_name`` by reusing its chunks; nothing is parsed or embedded."""
+    merge_into_index({}, {}, job, [(file_name, existing_name)])
+    if file_name not in loaded_manifest.get('files', {}):
+        return False, f"Failed to index {file_name}: {existing_name} was deleted and the copy could not be processed"
+    print(f"Indexed {file_name} as a copy of {existing_name}")
+    return True, f"Indexed {file_name} (same content as {existing_name}, no reindex needed)"
+
+def index_uploaded_files(uploads: List[Tuple[str, str]], copies: List[Tuple[str, str]] = (), job=None):
+    """Parse a batch of uploads in parallel, merge them into the index and delete the temp files."""
+    file_results: Dict[str, Dict] = job.file_results if job is not None else {}
+    try:
+        files_info = {file_name: local_file_info(temp_file_path, file_name) for temp_file_path, file_name in uploads}
+        results, errors = load_local_files(uploads, job)
+    finally:
+        for temp_file_path, _ in uploads:
+            _remove_temp_file(temp_file_path)
+
+    for file_name, error in errors.items():
+        file_results[file_name] = {"status": "failed", "message": f"Failed to process {file_name}: {error}"}
+    documents_by_file = {}
+    for file_name, documents in results.items():
+        if documents:
+            documents_by_file[file_name] = documents
         else:
-            print(f"✗ Failed to download {file_name} from Firebase")
+            file_results[file_name] = {"status": "failed",
+                                       "message": f"No content could be extracted from {file_name}"}
+    if not documents_by_file and not copies:
+        return False, f"None of the {len(uploads)} files could be processed"
+
+    chunk_count = merge_into_index(documents_by_file, {file_name: files_info[file_name] for file_name in results},
+                                   job, copies)
+    indexed_files = loaded_manifest.get('files', {})
+    for file_name in list(documents_by_file) + [file_name for file_name, _ in copies]:
+        if file_name not in indexed_files:
+            file_results[file_name] = {"status": "failed", "message": f"Failed to process {file_name}"}
+            continue
+        file_results[file_name] = {
+            "status": "indexed",
+            "documents": loaded_document_counts.get(file_name, 0),
+            "chunks": len(chunk_store.source_chunk_ids(vectorstore.docstore, file_name)),
+        }
+    for file_name, existing_name in copies:
+        # A copy whose original was deleted meanwhile was parsed on its own instead
+        if file_name in indexed_files and existing_name in indexed_files:
+            file_results[file_name]["copy_of"] = existing_name
+    indexed = sum(result["status"] == "indexed" for result in file_results.values())
+    print(f"Indexed {indexed} uploaded files: {chunk_count} chunks added to the vector store")
+    return True, f"Indexed {indexed} of {len(uploads) + len(copies)} files ({chunk_count} chunks added)"
+
+def remove_document_file(file_name: str, job=None):
+    """Evict ``file_name``'s chunks from the index without rebuilding it."""
+    current_vectorstore = vectorstore
+    document_counts = dict(loaded_document_counts)
+    document_counts.pop(file_name, None)
+    if current_vectorstore is None:
+        return True, f"Removed {file_name} (no index loaded)"
+
+    new_vectorstore = copy_vectorstore(current_vectorstore)
+    removed = release_source_chunks(new_vectorstore, file_name)
+
+    if new_vectorstore.index.ntotal == 0:
+        # An empty snapshot tells the other workers to drop their index too
+        manifest = index_store.build_manifest([])
+        install_vectorstore(None, manifest)
+        if job is not None:
+            job.start_stage('saving')
+        save_vectorstore_snapshot(None, manifest)
+        print(f"Removed {file_name}: no chunks left in the vector store")
+        return True, f"Removed {file_name} ({removed} chunks); the index is now empty"
+
+    manifest = updated_manifest({}, document_counts, removed=[file_name])
+    install_vectorstore(new_vectorstore, manifest)
+    if job is not None:
+        job.start_stage('saving')
+    save_vectorstore_snapshot(new_vectorstore, manifest)
+
+    print(f"Removed {file_name}: {removed} chunks deleted from the vector store")
+    return True, f"Removed {file_name} ({removed} chunks)"
 
-    if all_documents:
-        print(f"Total documents loaded: {len(all_documents)}")
-        vectorstore = setup_vectorstore(all_documents)
-        conversation_chain = create_chain(vectorstore)
-        loaded_documents = all_documents
-        return True, f"Successfully loaded {successful_loads} out of {len(firebase_files)} documents"
+# =============================================================================
+# BACKGROUND REINDEX JOBS
+# =============================================================================
+# Job progress is also written here, so that any server worker can report it
+REINDEX_JOBS_DIR = os.getenv("REINDEX_JOBS_DIR", f"{index_store.INDEX_DIR}_jobs")
+# Progress updates are written at most this often; stage and status changes always
+JOB_SAVE_INTERVAL_SECONDS = 1.0
 
-    return False, "No documents could be processed"
+def job_file_path(job_id: str) -> str:
+    return os.path.join(REINDEX_JOBS_DIR, f"{job_id}.json")
+
+def read_job_file(job_id: str) -> Optional[Dict]:
+    """State of a job saved by any server worker, or None if unknown."""
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        return None
+    try:
+        with open(job_file_path(job_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_job_file(job_id: str, state: Dict):
+    """Atomically replace the saved state of a job."""
+    path = job_file_path(job_id)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.makedirs(REINDEX_JOBS_DIR, exist_ok=True)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not save state of reindex job {job_id}: {e}")
+        _remove_temp_file(temp_path)
+
+def read_job_files() -> List[Dict]:
+    if not os.path.isdir(REINDEX_JOBS_DIR):
+        return []
+    jobs = []
+    for entry in os.listdir(REINDEX_JOBS_DIR):
+        if entry.endswith('.json'):
+            job = read_job_file(entry[:-len('.json')])
+            if job is not None:
+                jobs.append(job)
+    return jobs
+
+class ReindexJob:
+    """Progress of an index build running on the reindex worker thread."""
+
+    def __init__(self, kind: str, description: str):
+        self.job_id = str(uuid.uuid4())
+        self.kind = kind  # 'reload', 'upload' or 'delete'
+        self.description = description
+        self.status = 'queued'  # 'queued', 'running', 'completed' or 'failed'
+        self.message = ""
+        self.stage = None  # 'loading', 'chunking', 'embedding', 'indexing' or 'saving'
+        self.stage_total = 0
+        self.stage_done = 0
+        self.stage_started_at = None
+        self.files_total = 0
+        self.files_done = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.file_results: Dict[str, Dict] = {}  # per-file outcome of batch uploads
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.saved_at = 0.0
+
+    def save(self, force: bool = True):
+        """Write the job's state to REINDEX_JOBS_DIR; progress-only updates are throttled."""
+        now = time.time()
+        if not force and now - self.saved_at < JOB_SAVE_INTERVAL_SECONDS:
+            return
+        self.saved_at = now
+        write_job_file(self.job_id, self.to_dict())
+
+    def start_stage(self, stage: str, total: int = 0):
+        self.stage = stage
+        self.stage_total = total
+        self.stage_done = 0
+        self.stage_started_at = time.time()
+        if stage == 'loading':
+            self.files_total = total
+        elif stage == 'embedding':
+            self.chunks_total = total
+        self.save()
+
+    def advance(self, count: int = 1):
+        self.stage_done += count
+        if self.stage == 'loading':
+            self.files_done = self.stage_done
+        elif self.stage == 'embedding':
+            self.chunks_embedded = self.stage_done
+        self.save(force=False)
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimated time left in the current stage, extrapolated from its rate so far."""
+        if self.status != 'running' or not self.stage_done or not self.stage_started_at:
+            return None
+        elapsed = time.time() - self.stage_started_at
+        remaining = max(self.stage_total - self.stage_done, 0)
+        return round(elapsed / self.stage_done * remaining, 1)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "description": self.description,
+            "status": self.status,
+            "message": self.message,
+            "stage": self.stage,
+            "files_total": self.files_total,
+            "files_done": self.files_done,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "eta_seconds": self.eta_seconds(),
+            "file_results": self.file_results,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "worker_pid": os.getpid(),
+        }
+
+reindex_jobs: Dict[str, ReindexJob] = {}
+MAX_TRACKED_JOBS = 50
+# A single thread runs this worker's builds one at a time, and the index
+# write lock serializes them with the other server workers' builds
+reindex_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reindex")
+
+def _run_reindex_job(job: ReindexJob, target, *args):
+    try:
+        with index_store.index_write_lock():
+            job.status = 'running'
+            job.started_at = datetime.now()
+            job.save()
+            # Build on top of whatever another worker saved last
+            refresh_vectorstore_snapshot()
+            success, message = target(*args, job=job)
+        job.status = 'completed' if success else 'failed'
+        job.message = message
+    except Exception as e:
+        print(f"Reindex job {job.job_id} failed: {e}")
+        traceback.print_exc()
+        job.status = 'failed'
+        job.message = str(e)
+    finally:
+        job.finished_at = datetime.now()
+        job.save()
+
+def _prune_job_files():
+    """Delete the saved state of the oldest finished jobs of all workers beyond MAX_TRACKED_JOBS."""
+    saved_jobs = read_job_files()
+    finished = [j for j in saved_jobs if j['status'] in ('completed', 'failed')]
+    for old_job in sorted(finished, key=lambda j: j['created_at'])[:max(0, len(saved_jobs) - MAX_TRACKED_JOBS + 1)]:
+        _remove_temp_file(job_file_path(old_job['job_id']))
+
+def _worker_alive(pid: Optional[int]) -> bool:
+    if pid is None or os.name == 'nt':
+        # No cheap liveness check (os.kill would terminate it); a single server process is assumed
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def fail_orphaned_jobs() -> int:
+    """Mark saved jobs left queued or running by a server worker that has exited as failed."""
+    orphaned = 0
+    for saved_job in read_job_files():
+        if saved_job['status'] in ('queued', 'running') and not _worker_alive(saved_job.get('worker_pid')):
+            saved_job.update(status='failed', message="The server worker stopped before this job finished",
+                             eta_seconds=None, finished_at=datetime.now().isoformat())
+            write_job_file(saved_job['job_id'], saved_job)
+            orphaned += 1
+    return orphaned
+
+def submit_reindex_job(kind: str, description: str, target, *args) -> ReindexJob:
+    """Queue ``target(*args, job=job)`` on the reindex worker and return its job."""
+    finished = [j for j in reindex_jobs.values() if j.status in ('completed', 'failed')]
+    for old_job in sorted(finished, key=lambda j: j.created_at)[:max(0, len(reindex_jobs) - MAX_TRACKED_JOBS + 1)]:
+        reindex_jobs.pop(old_job.job_id, None)
+    _prune_job_files()
+
+    job = ReindexJob(kind, description)
+    reindex_jobs[job.job_id] = job
+    job.save()
+    reindex_executor.submit(_run_reindex_job, job, target, *args)
+    return job
 
 # =============================================================================
 # IMPROVED NUMBER REFERENCE DETECTION
@@ -627,38 +1361,12 @@ def get_doctor_detailed_info(doctor_name: str, specialty: str) -> str:
         return None
     
     try:
-        retriever = vectorstore.as_retriever(
-            search_type="mmr",
-            search_kwargs={'k': 8, 'fetch_k': 20, 'lambda_mult': 0.5}
-        )
-        
         # Clean the doctor name for better search
         clean_name = re.sub(r'Dr\.?\s*', '', doctor_name).strip()
         
-        # Multiple search strategies
-        search_queries = [
-            f"{clean_name} {specialty} doctor information",
-            f"Dr. {clean_name} {specialty}",
-            f"{clean_name} qualifications experience contact",
-            f"doctor {clean_name} hospital staff"
-        ]
-        
-        all_docs = []
-        for query in search_queries:
-            try:
-                docs = retriever.invoke(query)
-                all_docs.extend(docs)
-            except Exception as e:
-                print(f"Search query failed '{query}': {e}")
-        
-        # Remove duplicates
-        unique_docs = []
-        seen_content = set()
-        for doc in all_docs:
-            content_hash = hash(doc.page_content[:100])
-            if content_hash not in seen_content:
-                seen_content.add(content_hash)
-                unique_docs.append(doc)
+        # BM25 matches the name as an exact token; the vector side covers
+        # chunks that describe the doctor or department in other words
+        unique_docs = retrieval.hybrid_search(vectorstore, f"Dr. {clean_name} {specialty}", k=10, fetch_k=20, lambda_mult=0.5)
         
         context = "\n\n".join([doc.page_content for doc in unique_docs[:10]])
         
@@ -767,26 +1475,9 @@ def get_doctors_list():
             "consulting doctors cardiologists surgeons physicians"
         ]
         
-        all_docs = []
-        for query in search_queries:
-            try:
-                retriever = vectorstore.as_retriever(
-                    search_type="mmr",
-                    search_kwargs={'k': 10, 'fetch_k': 25, 'lambda_mult': 0.5}
-                )
-                docs = retriever.invoke(query)
-                all_docs.extend(docs)
-            except Exception as e:
-                print(f"Error in query '{query}': {e}")
-        
-        # Remove duplicates
-        unique_docs = []
-        seen_content = set()
-        for doc in all_docs:
-            content_hash = hash(doc.page_content[:100])  # Hash first 100 chars for deduplication
-            if content_hash not in seen_content:
-                seen_content.add(content_hash)
-                unique_docs.append(doc)
+        # One batched embedding pass and index search for all phrasings,
+        # merged with repeated chunks dropped
+        unique_docs = retrieval.multi_query_search(vectorstore, search_queries, k=10, fetch_k=25, lambda_mult=0.5)
         
         context = "\n\n".join([doc.page_content for doc in unique_docs[:20]])
         
@@ -827,25 +1518,9 @@ def get_departments_list():
             "hospital departments list"
         ]
         
-        all_docs = []
-        for query in search_queries:
-            try:
-                retriever = vectorstore.as_retriever(
-                    search_type="mmr",
-                    search_kwargs={'k': 6, 'fetch_k': 15, 'lambda_mult': 0.5}
-                )
-                docs = retriever.invoke(query)
-                all_docs.extend(docs)
-            except Exception as e:
-                print(f"Error in query '{query}': {e}")
-        
-        # Remove duplicates
-        unique_docs = []
-        seen_content = set()
-        for doc in all_docs:
-            if doc.page_content not in seen_content:
-                seen_content.add(doc.page_content)
-                unique_docs.append(doc)
+        # One batched embedding pass and index search for all phrasings,
+        # merged with repeated chunks dropped
+        unique_docs = retrieval.multi_query_search(vectorstore, search_queries, k=6, fetch_k=15, lambda_mult=0.5)
         
         context = "\n\n".join([doc.page_content for doc in unique_docs[:10]])
         
@@ -883,9 +1558,8 @@ def handle_medical_query(message: str, user_role: str) -> str:
     
     try:
         # Use broader search for medical queries
-        retriever = vectorstore.as_retriever(
-            search_type="mmr",
-            search_kwargs={'k': 12, 'fetch_k': 25, 'lambda_mult': 0.4}
+        retriever = retrieval.CachedMMRRetriever(
+            vectorstore=vectorstore, k=12, fetch_k=25, lambda_mult=0.4
         )
         
         # Expand search terms for better context retrieval
@@ -1137,9 +1811,8 @@ For detailed directions and map, please visit: https://www.kghospital.com/"""
                     answer = raw_doctor_list
                     # Extract and store structured doctor info WITH RAW LIST
                     try:
-                        retriever = vectorstore.as_retriever(
-                            search_type="mmr",
-                            search_kwargs={'k': 10, 'fetch_k': 25, 'lambda_mult': 0.5}
+                        retriever = retrieval.CachedMMRRetriever(
+                            vectorstore=vectorstore, k=10, fetch_k=25, lambda_mult=0.5
                         )
                         docs = retriever.invoke("list all doctors and their specialties")
                         context = "\n\n".join([doc.page_content for doc in docs])
@@ -1225,9 +1898,8 @@ For detailed directions and map, please visit: https://www.kghospital.com/"""
                 if re.search(r'\d+\.\s+Dr\.', answer):
                     # This looks like a doctor list - extract and store it
                     try:
-                        retriever = vectorstore.as_retriever(
-                            search_type="mmr",
-                            search_kwargs={'k': 10, 'fetch_k': 25, 'lambda_mult': 0.5}
+                        retriever = retrieval.CachedMMRRetriever(
+                            vectorstore=vectorstore, k=10, fetch_k=25, lambda_mult=0.5
                         )
                         docs = retriever.invoke(message.message)
                         context = "\n\n".join([doc.page_content for doc in docs])
@@ -1571,10 +2243,34 @@ async def root():
         "status": "running",
         "version": "1.0.0",
         "firebase_initialized": FIREBASE_INITIALIZED,
-        "documents_loaded": len(loaded_documents) > 0,
+        "documents_loaded": sum(loaded_document_counts.values()) > 0,
         "active_sessions": len(user_sessions)
     }
 
+def upload_too_large_message() -> str:
+    return f"File too large. Maximum upload size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+
+async def save_upload_to_temp_file(file: UploadFile, suffix: str) -> Tuple[str, str]:
+    """Copy an upload to a temp file in chunks. Returns the path and the md5 in the bucket's encoding."""
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    digest = hashlib.md5()
+    bytes_written = 0
+    try:
+        with temp_file:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                bytes_written += len(chunk)
+                if bytes_written > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=upload_too_large_message())
+                digest.update(chunk)
+                temp_file.write(chunk)
+    except Exception:
+        os.remove(temp_file.name)
+        raise
+    return temp_file.name, base64.b64encode(digest.digest()).decode('ascii')
+
 @app.post("/upload-document")
 async def upload_document(file: UploadFile = File(...)):
     allowed_extensions = ['.pdf', '.csv', '.xlsx', '.xls']
@@ -1586,56 +2282,232 @@ async def upload_document(file: UploadFile = File(...)):
             detail=f"Unsupported file format. Allowed formats: {', '.join(allowed_extensions)}"
         )
 
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_ext)
-    temp_file_path = temp_file.name
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=upload_too_large_message())
 
+    temp_file_path = None
     try:
-        content = await file.read()
-        temp_file.write(content)
-        temp_file.close()
-
-        success, message = upload_file_to_firebase(temp_file_path, file.filename)
+        temp_file_path, md5_hash = await save_upload_to_temp_file(file, file_ext)
 
-        if success:
-            reload_success, reload_message = reload_all_documents()
+        # Content that is already indexed is neither uploaded nor parsed again
+        existing_name = find_indexed_copy(md5_hash, file.filename)
+        if existing_name == file.filename:
+            os.remove(temp_file_path)
+            return {"message": f"'{file.filename}' is unchanged and already indexed",
+                    "filename": file.filename, "job_id": None, "status": "unchanged"}
+        if existing_name is not None:
             os.remove(temp_file_path)
+            success, message = await run_in_threadpool(copy_firebase_file, existing_name, file.filename)
+            if not success:
+                raise HTTPException(status_code=500, detail=message)
+            job = submit_reindex_job('upload', f"Index {file.filename} (copy of {existing_name})",
+                                     index_file_copy, file.filename, existing_name)
+            return {"message": f"'{file.filename}' has the same content as '{existing_name}'; "
+                               f"reusing its indexed chunks",
+                    "filename": file.filename, "job_id": job.job_id, "status": job.status}
 
-            if reload_success:
-                return {"message": f"Document uploaded and processed successfully: {message}",
-                        "reload_status": reload_message, "filename": file.filename}
-            else:
-                return {"message": f"Document uploaded but processing failed: {reload_message}",
-                        "filename": file.filename}
+        success, message = await run_in_threadpool(upload_file_to_firebase, temp_file_path, file.filename)
+
+        if success:
+            # Indexing runs in the background; the job owns (and deletes) the temp file
+            job = submit_reindex_job('upload', f"Index {file.filename}", index_uploaded_file,
+                                     temp_file_path, file.filename)
+            return {"message": f"Document uploaded successfully, indexing in background: {message}",
+                    "filename": file.filename, "job_id": job.job_id, "status": job.status}
         else:
             os.remove(temp_file_path)
             raise HTTPException(status_code=500, detail=message)
 
+    except HTTPException:
+        if temp_file_path and os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
     except Exception as e:
-        if os.path.exists(temp_file_path):
+        if temp_file_path and os.path.exists(temp_file_path):
             os.remove(temp_file_path)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+def upload_files_to_firebase(saved_files: List[Tuple[str, str]]) -> List[Tuple[bool, str]]:
+    """Upload ``(temp_file_path, file_name)`` pairs concurrently; results in the same order."""
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+        return list(pool.map(lambda saved: upload_file_to_firebase(*saved), saved_files))
+
+@app.post("/upload-documents")
+async def upload_documents(files: List[UploadFile] = File(...)):
+    """Upload several documents and index them together with a single index update."""
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400,
+                            detail=f"Too many files. Maximum batch size is {MAX_BATCH_FILES} files")
+
+    allowed_extensions = ['.pdf', '.csv', '.xlsx', '.xls']
+    file_results = []
+    received = []  # (temp_file_path, file_name, md5_hash)
+    saved_files = []
+    copies = []
+    try:
+        for file in files:
+            file_ext = os.path.splitext(file.filename)[1].lower()
+            if file_ext not in allowed_extensions:
+                file_results.append({"filename": file.filename, "status": "rejected",
+                                     "message": f"Unsupported file format. Allowed formats: {', '.join(allowed_extensions)}"})
+            elif any(file.filename == name for _, name, _ in received):
+                file_results.append({"filename": file.filename, "status": "rejected",
+                                     "message": "Duplicate file name in this batch"})
+            elif file.size is not None and file.size > MAX_UPLOAD_BYTES:
+                file_results.append({"filename": file.filename, "status": "rejected",
+                                     "message": upload_too_large_message()})
+            else:
+                try:
+                    temp_file_path, md5_hash = await save_upload_to_temp_file(file, file_ext)
+                except HTTPException as e:
+                    file_results.append({"filename": file.filename, "status": "rejected", "message": e.detail})
+                    continue
+                received.append((temp_file_path, file.filename, md5_hash))
+                file_results.append({"filename": file.filename, "status": "uploaded", "message": ""})
+
+        # Content that is already indexed is neither uploaded nor parsed again; an
+        # indexed file is only reused if this batch does not replace its content
+        results_by_name = {result["filename"]: result for result in file_results if result["status"] == "uploaded"}
+        matches = {file_name: find_indexed_copy(md5_hash, file_name) for _, file_name, md5_hash in received}
+        replaced = {file_name for file_name, existing_name in matches.items() if existing_name != file_name}
+        for temp_file_path, file_name, _ in received:
+            existing_name = matches[file_name]
+            if existing_name == file_name:
+                _remove_temp_file(temp_file_path)
+                results_by_name[file_name].update(status="unchanged", message="Already indexed with the same content")
+            elif existing_name is not None and existing_name not in replaced:
+                _remove_temp_file(temp_file_path)
+                copies.append((file_name, existing_name))
+            else:
+                saved_files.append((temp_file_path, file_name))
+
+        stored = await run_in_threadpool(upload_files_to_firebase, saved_files)
+        copied = await run_in_threadpool(
+            lambda: [copy_firebase_file(existing_name, file_name) for file_name, existing_name in copies]
+        )
+    except Exception as e:
+        for temp_file_path, _, _ in received:
+            _remove_temp_file(temp_file_path)
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+    uploads = []
+    stored_copies = []
+    for (temp_file_path, file_name), (success, message) in zip(saved_files, stored):
+        results_by_name[file_name]["message"] = message
+        if success:
+            uploads.append((temp_file_path, file_name))
+        else:
+            results_by_name[file_name]["status"] = "failed"
+            _remove_temp_file(temp_file_path)
+    for (file_name, existing_name), (success, message) in zip(copies, copied):
+        results_by_name[file_name]["message"] = message
+        if success:
+            stored_copies.append((file_name, existing_name))
+        else:
+            results_by_name[file_name]["status"] = "failed"
+
+    if not uploads and not stored_copies:
+        if any(result["status"] == "unchanged" for result in file_results):
+            return {"message": "All documents are unchanged and already indexed",
+                    "files": file_results, "job_id": None, "status": "unchanged"}
+        raise HTTPException(status_code=400, detail={"message": "No files were uploaded", "files": file_results})
+
+    # One background job parses every file and updates the index once; it owns the temp files
+    job = submit_reindex_job('upload', f"Index {len(uploads) + len(stored_copies)} uploaded files",
+                             index_uploaded_files, uploads, stored_copies)
+    return {"message": f"{len(uploads) + len(stored_copies)} of {len(files)} documents uploaded, indexing in background",
+            "files": file_results, "job_id": job.job_id, "status": job.status}
+
 @app.get("/documents")
 async def list_documents():
     documents = list_firebase_files()
     return {"documents": documents, "count": len(documents), "firebase_status": FIREBASE_INITIALIZED}
 
+@app.delete("/documents/{file_name}")
+async def delete_document(file_name: str):
+    try:
+        blob_deleted = await run_in_threadpool(delete_firebase_file, file_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
+
+    current_vectorstore = vectorstore
+    indexed = file_name in loaded_document_counts or (
+        current_vectorstore is not None
+        and bool(chunk_store.source_chunk_ids(current_vectorstore.docstore, file_name))
+    )
+    if not blob_deleted and not indexed:
+        raise HTTPException(status_code=404, detail=f"Document '{file_name}' not found")
+
+    # Runs on the reindex worker so it is ordered with uploads of the same file
+    job = submit_reindex_job('delete', f"Remove {file_name}", remove_document_file, file_name)
+    return {"message": "Document deleted, removing it from the index in background",
+            "filename": file_name, "job_id": job.job_id, "status": job.status}
+
 @app.post("/reload-documents")
 async def reload_documents_endpoint():
-    success, message = reload_all_documents()
-    if success:
-        return {"message": message, "status": "success", "documents_loaded": len(loaded_documents)}
-    else:
-        raise HTTPException(status_code=500, detail=message)
+    job = submit_reindex_job('reload', "Rebuild index from all documents", reload_all_documents)
+    return {"message": "Document reload started", "status": job.status, "job_id": job.job_id,
+            "documents_loaded": sum(loaded_document_counts.values())}
+
+@app.get("/reindex-jobs")
+async def list_reindex_jobs():
+    # Jobs of every server worker; this worker's own are reported live
+    jobs = {job['job_id']: job for job in read_job_files()}
+    jobs.update((job_id, job.to_dict()) for job_id, job in reindex_jobs.items())
+    jobs = sorted(jobs.values(), key=lambda j: j['created_at'], reverse=True)
+    return {"jobs": jobs, "count": len(jobs)}
+
+@app.get("/reindex-jobs/{job_id}")
+async def get_reindex_job(job_id: str):
+    job = reindex_jobs.get(job_id)
+    if job is not None:
+        return job.to_dict()
+    # Submitted to another server worker
+    saved_job = read_job_file(job_id)
+    if saved_job is None:
+        raise HTTPException(status_code=404, detail=f"Reindex job '{job_id}' not found")
+    return saved_job
+
+def get_process_memory() -> Dict:
+    """Memory use of this worker process in MB."""
+    memory: Dict = {"pid": os.getpid()}
+    fields = {"VmRSS": "rss_mb", "RssAnon": "anon_mb", "RssFile": "file_mb", "Pss": "pss_mb"}
+    for path in ("/proc/self/status", "/proc/self/smaps_rollup"):
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    key, _, value = line.partition(':')
+                    if key in fields:
+                        memory[fields[key]] = round(int(value.split()[0]) / 1024, 1)
+        except OSError:
+            pass
+    if "rss_mb" not in memory:
+        try:
+            import resource
+            # No /proc (e.g. macOS): only the peak RSS is available
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            memory["peak_rss_mb"] = round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+        except ImportError:
+            pass
+    return memory
 
 @app.get("/system/status")
 async def system_status():
     return {
         "firebase_initialized": FIREBASE_INITIALIZED,
-        "documents_loaded": len(loaded_documents),
+        "documents_loaded": sum(loaded_document_counts.values()),
         "vectorstore_ready": vectorstore is not None,
         "conversation_chain_ready": conversation_chain is not None,
         "groq_api_configured": bool(os.getenv("GROQ_API_KEY")),
+        "vector_index": index_store.describe_index(vectorstore.index) if vectorstore is not None else None,
+        "index_version": getattr(vectorstore, 'index_version', None),
+        "index_check": index_store.last_index_check or None,
+        "embedding_cache": embedding_cache.get_stats(),
+        "query_embedding_cache": embedding_cache.query_cache.get_stats(),
+        "retrieval_cache": retrieval.result_cache.get_stats(),
+        "blob_mirror": blob_mirror.get_stats(),
+        "index_memory_mapped": index_store.INDEX_MMAP,
+        "process_memory": get_process_memory(),
         "active_sessions": len(user_sessions),
         "timestamp": datetime.now().isoformat()
     }
@@ -1645,13 +2517,26 @@ async def startup_event():
     print("Starting KG Hospital Chatbot API...")
     print(f"Firebase Status: {'Connected' if FIREBASE_INITIALIZED else 'Not Connected'}")
 
+    orphaned = fail_orphaned_jobs()
+    if orphaned:
+        print(f"Marked {orphaned} reindex jobs of stopped server workers as failed")
+
     if FIREBASE_INITIALIZED:
-        print("Loading initial documents...")
-        success, message = reload_all_documents()
-        if success:
-            print(message)
-        else:
+        print("Loading saved vector store snapshot...")
+        success, message = load_vectorstore_snapshot()
+        print(message)
+        if not success and REBUILD_ON_STARTUP:
+            print("Loading initial documents...")
+            # Only one server worker builds; the others wait and load its snapshot
+            with index_store.index_write_lock():
+                success, message = load_vectorstore_snapshot()
+                if not success:
+                    success, message = reload_all_documents()
             print(message)
+        elif not success:
+            print("Starting without an index; build one with build_index.py or POST /reload-documents")
+        if SNAPSHOT_CHECK_SECONDS > 0:
+            asyncio.create_task(watch_vectorstore_snapshot())
 
     print("KG Hospital Chatbot API is ready!")
 
@@ -0,0 +1,281 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+try:
+    from chunk_store import iter_docstore
+    from embedding_cache import normalize_query
+    from lexical_index import BM25Index
+except ImportError:
+    from .chunk_store import iter_docstore  # type: ignore
+    from .embedding_cache import normalize_query  # type: ignore
+    from .lexical_index import BM25Index  # type: ignore
+
+# Retrieval results (chunk IDs) kept per index version (0 = off)
+RESULT_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", 1024))
+# Rank offset in reciprocal-rank fusion; larger values flatten the gap between top ranks
+RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+
+
+# =============================================================================
+# RESULT CACHE
+# =============================================================================
+class ResultCache:
+    """Bounded LRU of retrieved chunk IDs.
+
+    Keys start with the ``index_version`` of the vector store that was
+    searched. Every index swap installs a store with a new version, so
+    results from an older index can never be returned for a newer one;
+    their entries simply age out.
+    """
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, Tuple[str, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            chunk_ids = self._entries.get(key)
+            if chunk_ids is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return chunk_ids
+
+    def put(self, key: tuple, chunk_ids: Tuple[str, ...]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = chunk_ids
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'entries': len(self._entries),
+                'max_size': self.max_size,
+            }
+
+
+result_cache = ResultCache()
+
+
+def _cached_search(vectorstore, key: tuple, search: Callable[[], List[Document]]) -> List[Document]:
+    """Run ``search`` unless the chunk IDs for ``key`` on this index version are cached."""
+    version = getattr(vectorstore, "index_version", None)
+    if version is None:
+        return search()
+
+    chunk_ids = result_cache.get((version,) + key)
+    if chunk_ids is not None:
+        docs = [vectorstore.docstore.search(chunk_id) for chunk_id in chunk_ids]
+        if all(isinstance(doc, Document) for doc in docs):
+            return docs
+
+    docs = search()
+    result_cache.put((version,) + key, tuple(doc.id for doc in docs))
+    return docs
+
+
+# =============================================================================
+# MMR
+# =============================================================================
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def mmr_select(query_vector: np.ndarray, candidates: np.ndarray, k: int = 4,
+               lambda_mult: float = 0.5) -> List[int]:
+    """Maximal marginal relevance over pre-fetched candidate vectors.
+
+    Returns candidate positions in selection order, the same selection as
+    LangChain's ``maximal_marginal_relevance`` (cosine similarity, first
+    candidate wins ties). All pairwise similarities come from one matrix
+    product; each greedy step then updates the running "most similar
+    selected candidate" score with a single vectorized maximum instead of
+    recomputing similarities to the whole selected set.
+    """
+    count = min(k, len(candidates))
+    if count <= 0:
+        return []
+    unit = _unit_rows(np.asarray(candidates, dtype=np.float32))
+    to_query = unit @ _unit_rows(np.asarray(query_vector, dtype=np.float32).reshape(-1))
+    pairwise = unit @ unit.T
+
+    relevance = lambda_mult * to_query
+    redundancy = np.full(len(unit), -np.inf, dtype=np.float32)
+    chosen = np.zeros(len(unit), dtype=bool)
+    selected = [int(np.argmax(to_query))]
+    while True:
+        last = selected[-1]
+        chosen[last] = True
+        if len(selected) == count:
+            return selected
+        np.maximum(redundancy, pairwise[last], out=redundancy)
+        scores = relevance - (1 - lambda_mult) * redundancy
+        scores[chosen] = -np.inf
+        selected.append(int(np.argmax(scores)))
+
+
+def mmr_search_by_vectors(vectorstore, query_vectors: np.ndarray, k: int = 4, fetch_k: int = 20,
+                          lambda_mult: float = 0.5) -> List[List[str]]:
+    """Chunk IDs MMR picks for each query vector, from one batched index search.
+
+    ``search_and_reconstruct`` returns the candidates' vectors together with
+    the search results (and also works for IVF indexes, which cannot
+    ``reconstruct`` single ids), so no vector is fetched twice.
+    """
+    query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(query_vectors)
+    _, positions, candidate_vectors = vectorstore.index.search_and_reconstruct(
+        query_vectors, min(fetch_k, vectorstore.index.ntotal)
+    )
+
+    results = []
+    for query_vector, query_positions, query_candidates in zip(query_vectors, positions, candidate_vectors):
+        found = query_positions >= 0  # -1 pads missing results
+        query_positions, query_candidates = query_positions[found], query_candidates[found]
+        results.append([
+            vectorstore.index_to_docstore_id[int(query_positions[selected])]
+            for selected in mmr_select(query_vector, query_candidates, k, lambda_mult)
+        ])
+    return results
+
+
+# =============================================================================
+# MULTI-QUERY RETRIEVAL
+# =============================================================================
+def embed_queries(embeddings, queries: List[str]) -> np.ndarray:
+    """Embed all ``queries`` in one batch when the model supports it."""
+    if hasattr(embeddings, "embed_queries"):
+        vectors = embeddings.embed_queries(queries)
+    else:
+        vectors = [embeddings.embed_query(query) for query in queries]
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def multi_query_search(vectorstore, queries: List[str], k: int = 4, fetch_k: int = 20,
+                       lambda_mult: float = 0.5) -> List[Document]:
+    """MMR retrieval for several phrasings of a question, cached per index version (see ``_multi_query_search``)."""
+    key = ("mmr", tuple(normalize_query(query) for query in queries), k, fetch_k, lambda_mult)
+    return _cached_search(vectorstore, key,
+                          lambda: _multi_query_search(vectorstore, queries, k, fetch_k, lambda_mult))
+
+
+def _multi_query_search(vectorstore, queries: List[str], k: int, fetch_k: int,
+                        lambda_mult: float) -> List[Document]:
+    """MMR retrieval for several phrasings of a question at the cost of about one.
+
+    Embeds every query in one forward pass and searches the index for all of
+    them at once (``mmr_search_by_vectors``). The per-query MMR selections
+    are merged in query order with repeated chunks dropped by chunk ID.
+    """
+    if not queries or vectorstore.index.ntotal == 0:
+        return []
+
+    query_vectors = embed_queries(vectorstore.embedding_function, queries)
+    docs: List[Document] = []
+    seen_ids = set()
+    for doc_ids in mmr_search_by_vectors(vectorstore, query_vectors, k, fetch_k, lambda_mult):
+        for doc_id in doc_ids:
+            if doc_id in seen_ids:
+                continue
+            doc = vectorstore.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                seen_ids.add(doc_id)
+                docs.append(doc)
+    return docs
+
+
+# =============================================================================
+# HYBRID (BM25 + VECTOR) RETRIEVAL
+# =============================================================================
+def ensure_lexical_index(vectorstore) -> BM25Index:
+    """The BM25 index over the store's chunks, built on first use if the store has none yet."""
+    lexical_index = getattr(vectorstore, "lexical_index", None)
+    if lexical_index is None:
+        lexical_index = BM25Index(
+            (chunk_id, doc.page_content) for chunk_id, doc in iter_docstore(vectorstore.docstore)
+        )
+        vectorstore.lexical_index = lexical_index
+    return lexical_index
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rank_offset: int = RRF_K) -> List[str]:
+    """Merge ranked ID lists, scoring each ID by the sum of ``1 / (rank_offset + rank)``.
+
+    Ties keep the order in which IDs first appear across ``rankings``.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rank_offset + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def hybrid_search(vectorstore, query: str, k: int = 4, fetch_k: int = 20,
+                  lambda_mult: float = 0.5) -> List[Document]:
+    """BM25 and MMR vector retrieval fused by reciprocal rank, cached per index version."""
+    key = ("hybrid", normalize_query(query), k, fetch_k, lambda_mult)
+    return _cached_search(vectorstore, key,
+                          lambda: _hybrid_search(vectorstore, query, k, fetch_k, lambda_mult))
+
+
+def _hybrid_search(vectorstore, query: str, k: int, fetch_k: int, lambda_mult: float) -> List[Document]:
+    """Top ``k`` chunks of the fused BM25 and vector rankings.
+
+    Exact tokens such as doctor names, department codes and phone numbers
+    are found by BM25 even when the embedding of the query misses them;
+    the vector side still covers paraphrased questions.
+    """
+    if vectorstore.index.ntotal == 0:
+        return []
+
+    [vector_ids] = mmr_search_by_vectors(
+        vectorstore, embed_queries(vectorstore.embedding_function, [query]), k, fetch_k, lambda_mult
+    )
+    lexical_ids = [chunk_id for chunk_id, _ in ensure_lexical_index(vectorstore).search(query, k)]
+
+    docs: List[Document] = []
+    # Lexical ranking first: on equal fused scores, exact token matches win
+    for chunk_id in reciprocal_rank_fusion([lexical_ids, vector_ids]):
+        doc = vectorstore.docstore.search(chunk_id)
+        if isinstance(doc, Document):
+            docs.append(doc)
+            if len(docs) == k:
+                break
+    return docs
+
+
+class CachedMMRRetriever(BaseRetriever):
+    """MMR retriever over a LangChain FAISS store that goes through the result cache.
+
+    Drop-in for ``vectorstore.as_retriever(search_type="mmr", ...)``.
+    """
+
+    vectorstore: Any
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return multi_query_search(self.vectorstore, [query], self.k, self.fetch_k, self.lambda_mult)
@@ -0,0 +1,103 @@
+import os
+import re
+import shutil
+import sys
+import tempfile
+import zlib
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+# The backend modules are flat siblings imported by name, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Everything the server writes goes to a scratch directory, set before any
+# backend module reads its configuration
+WORK_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+STORAGE_DIR = os.path.join(WORK_DIR, "bucket")
+os.environ.update({
+    "LOCAL_STORAGE_DIR": STORAGE_DIR,
+    "INDEX_DIR": os.path.join(WORK_DIR, "vector_index"),
+    "EMBEDDING_CACHE_PATH": os.path.join(WORK_DIR, "embedding_cache.db"),
+    "BLOB_MIRROR_DIR": os.path.join(WORK_DIR, "blob_mirror"),
+    "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "test"),
+    "PARSE_WORKERS": "2",
+    "SNAPSHOT_CHECK_SECONDS": "0",
+})
+
+
+class HashingEmbeddings(Embeddings):
+    """Bag-of-words vectors: texts sharing most words get nearby vectors, like a real model."""
+
+    dim = 384
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def write_pdf(path, pages):
+    """Write a minimal PDF with one Helvetica text line per entry of each page's lines."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        commands = ["BT", "/F1 11 Tf", "14 TL", "72 760 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            commands.append(f"({escaped}) Tj T*")
+        commands.append("ET")
+        stream = "\n".join(commands)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+@pytest.fixture
+def server():
+    """``main`` with an empty bucket, no index and no jobs, embedding with HashingEmbeddings."""
+    import embedding_cache
+    import embedding_model
+    import index_store
+    import main
+
+    embedding_model._model = embedding_cache.CachedEmbeddings(HashingEmbeddings(), "hashing", True)
+    for path in (STORAGE_DIR, index_store.INDEX_DIR, main.REINDEX_JOBS_DIR, main.blob_mirror.mirror_dir):
+        shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(os.path.join(STORAGE_DIR, "documents"))
+    main.install_vectorstore(None, {})
+    main.reindex_jobs.clear()
+    yield main
+    main.reindex_executor.submit(lambda: None).result()  # let queued jobs finish before the next reset
+
+
+def put_document(name, content):
+    """Store ``content`` in the test bucket as ``documents/<name>``."""
+    path = os.path.join(STORAGE_DIR, "documents", name)
+    with open(path, "w" if isinstance(content, str) else "wb") as f:
+        f.write(content)
+    return path
@@ -0,0 +1,141 @@
+import os
+from typing import List
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from conftest import STORAGE_DIR
+
+
+def roster(count, prefix="Dr. A"):
+    return "Name,Dept,Phone\n" + "".join(f"{prefix}{i},Cardiology,0422-{i:06d}\n" for i in range(count))
+
+
+@pytest.fixture
+def client(server):
+    return TestClient(server.app)
+
+
+def finished_job(server, client, response):
+    """Wait for the reindex job started by ``response`` and return its final state."""
+    assert response.status_code == 200, response.text
+    server.reindex_executor.submit(lambda: None).result()
+    return client.get(f"/reindex-jobs/{response.json()['job_id']}").json()
+
+
+def test_upload_indexes_the_file(server, client):
+    job = finished_job(server, client, client.post("/upload-document", files={"file": ("a.csv", roster(10))}))
+    assert job["status"] == "completed", job["message"]
+    assert os.path.exists(os.path.join(STORAGE_DIR, "documents", "a.csv"))
+    assert server.loaded_document_counts == {"a.csv": 10}
+
+
+def test_reupload_replaces_the_file(server, client):
+    finished_job(server, client, client.post("/upload-document", files={"file": ("a.csv", roster(10))}))
+    job = finished_job(server, client, client.post("/upload-document", files={"file": ("a.csv", roster(4, "Dr. Z"))}))
+    assert job["status"] == "completed", job["message"]
+    assert server.loaded_document_counts == {"a.csv": 4}
+    results = server.retrieval.hybrid_search(server.vectorstore, "Dr. A1 Cardiology", k=10, fetch_k=20)
+    assert not any("Dr. A1" in doc.page_content for doc in results)
+
+
+def test_upload_rejects_unsupported_formats(client):
+    response = client.post("/upload-document", files={"file": ("notes.txt", b"hello")})
+    assert response.status_code == 400
+
+
+def limited_client(server, limit):
+    """A one-endpoint app behind UploadSizeLimitMiddleware that reports how many bytes it read."""
+    app = FastAPI()
+
+    @app.post("/upload-documents")
+    async def upload(files: List[UploadFile] = File(...)):
+        return {"bytes": sum([len(await file.read()) for file in files])}
+
+    app.add_middleware(server.UploadSizeLimitMiddleware, limits={"/upload-documents": limit})
+    return TestClient(app)
+
+
+def test_upload_under_the_limit_passes(server):
+    response = limited_client(server, 4096).post("/upload-documents", files=[("files", ("a.csv", b"x" * 1000))])
+    assert response.status_code == 200 and response.json() == {"bytes": 1000}
+
+
+def test_declared_oversized_upload_is_rejected(server):
+    response = limited_client(server, 4096).post("/upload-documents", files=[("files", ("a.csv", b"x" * 5000))])
+    assert response.status_code == 413
+    assert "Maximum total size" in response.json()["detail"]
+
+
+def test_chunked_oversized_upload_is_cut_off(server):
+    chunks = (b"x" * 1024 for _ in range(8))
+    response = limited_client(server, 4096).post(
+        "/upload-documents", content=chunks,
+        headers={"Content-Type": "multipart/form-data; boundary=b"},
+    )
+    assert response.status_code == 413
+
+
+def test_oversized_file_in_a_batch_is_rejected_on_its_own(server, client, monkeypatch):
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", 1024)
+    response = client.post("/upload-documents", files=[("files", ("big.csv", roster(100))),
+                                                       ("files", ("small.csv", roster(2)))])
+    results = {result["filename"]: result["status"] for result in response.json()["files"]}
+    assert results == {"big.csv": "rejected", "small.csv": "uploaded"}
+    server.reindex_executor.submit(lambda: None).result()
+    assert server.loaded_document_counts == {"small.csv": 2}
+
+
+def test_delete_removes_the_file_and_its_chunks(server, client):
+    finished_job(server, client, client.post("/upload-document", files={"file": ("a.csv", roster(10))}))
+    finished_job(server, client, client.post("/upload-document", files={"file": ("b.csv", roster(3, "Dr. B"))}))
+
+    job = finished_job(server, client, client.delete("/documents/a.csv"))
+    assert job["status"] == "completed", job["message"]
+    assert not os.path.exists(os.path.join(STORAGE_DIR, "documents", "a.csv"))
+    assert server.loaded_document_counts == {"b.csv": 3}
+    assert [doc["name"] for doc in client.get("/documents").json()["documents"]] == ["b.csv"]
+
+
+def test_delete_of_an_unknown_file_is_404(client):
+    assert client.delete("/documents/missing.csv").status_code == 404
+
+
+def test_batch_upload_indexes_every_file_in_one_job(server, client):
+    response = client.post("/upload-documents", files=[
+        ("files", ("a.csv", roster(10))),
+        ("files", ("b.csv", roster(3, "Dr. B"))),
+        ("files", ("bad.pdf", b"not a pdf")),
+        ("files", ("notes.txt", b"hello")),
+    ])
+    statuses = {result["filename"]: result["status"] for result in response.json()["files"]}
+    assert statuses == {"a.csv": "uploaded", "b.csv": "uploaded", "bad.pdf": "uploaded", "notes.txt": "rejected"}
+
+    job = finished_job(server, client, response)
+    assert job["status"] == "completed", job["message"]
+    assert {name: result["status"] for name, result in job["file_results"].items()} == \
+        {"a.csv": "indexed", "b.csv": "indexed", "bad.pdf": "failed"}
+    assert server.loaded_document_counts == {"a.csv": 10, "b.csv": 3}
+    assert client.get("/reindex-jobs").json()["count"] == 1
+
+
+def test_batch_upload_rejects_repeated_names(server, client):
+    response = client.post("/upload-documents", files=[("files", ("a.csv", roster(2))),
+                                                       ("files", ("a.csv", roster(3)))])
+    assert [result["status"] for result in response.json()["files"]] == ["uploaded", "rejected"]
+    finished_job(server, client, response)
+    assert server.loaded_document_counts == {"a.csv": 2}
+
+
+def test_already_indexed_content_is_not_uploaded_again(server, client):
+    finished_job(server, client, client.post("/upload-document", files={"file": ("a.csv", roster(10))}))
+
+    response = client.post("/upload-document", files={"file": ("a.csv", roster(10))})
+    assert response.json()["status"] == "unchanged" and response.json()["job_id"] is None
+
+    job = finished_job(server, client, client.post("/upload-document", files={"file": ("copy.csv", roster(10))}))
+    assert job["status"] == "completed", job["message"]
+    assert server.loaded_document_counts == {"a.csv": 10, "copy.csv": 10}
+    docstore = server.vectorstore.docstore
+    assert server.chunk_store.source_chunk_ids(docstore, "copy.csv") == server.chunk_store.source_chunk_ids(docstore, "a.csv")
@@ -0,0 +1,101 @@
+import base64
+import hashlib
+import os
+
+import pytest
+
+from blob_storage import BlobMirror, LocalDirectoryBucket
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    return LocalDirectoryBucket(str(tmp_path / "bucket"))
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    return BlobMirror(str(tmp_path / "mirror"))
+
+
+def put(bucket, name, content: bytes):
+    path = os.path.join(bucket.root, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    blob = bucket.blob(name)
+    blob.reload()
+    return blob
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_local_blob_md5_matches_gcs_format(bucket):
+    blob = put(bucket, "documents/a.csv", b"Name,Phone\n")
+    assert blob.md5_hash == base64.b64encode(hashlib.md5(b"Name,Phone\n").digest()).decode('ascii')
+    assert blob.size == len(b"Name,Phone\n")
+
+
+def test_fetch_downloads_once_per_version(bucket, mirror):
+    blob = put(bucket, "documents/a.csv", b"v1")
+    first = mirror.fetch(blob, blob.md5_hash, blob.generation)
+    second = mirror.fetch(blob, blob.md5_hash, blob.generation)
+
+    assert first == second
+    assert read(first) == b"v1"
+    assert mirror.get_stats() == {'hits': 1, 'downloads': 1}
+
+
+def test_fetch_replaces_changed_blob(bucket, mirror):
+    blob = put(bucket, "documents/a.csv", b"v1")
+    old_path = mirror.fetch(blob, blob.md5_hash, blob.generation)
+    blob = put(bucket, "documents/a.csv", b"v2")
+    new_path = mirror.fetch(blob, blob.md5_hash, blob.generation)
+
+    assert new_path != old_path
+    assert read(new_path) == b"v2"
+    assert not os.path.exists(old_path)
+    assert mirror.get_stats() == {'hits': 0, 'downloads': 2}
+
+
+def test_unversioned_blob_is_always_downloaded(bucket, mirror):
+    blob = put(bucket, "documents/a.csv", b"v1")
+    mirror.fetch(blob)
+    mirror.fetch(blob)
+    assert mirror.get_stats() == {'hits': 0, 'downloads': 2}
+
+
+def test_failed_download_leaves_no_partial_file(bucket, mirror):
+    blob = bucket.blob("documents/missing.csv")
+    with pytest.raises(FileNotFoundError):
+        mirror.fetch(blob, base64.b64encode(b"0" * 16).decode('ascii'))
+    for _, _, file_names in os.walk(mirror.mirror_dir):
+        assert not file_names
+
+
+def test_store_seeds_the_mirror(tmp_path, bucket, mirror):
+    blob = put(bucket, "documents/a.csv", b"uploaded")
+    local_copy = tmp_path / "upload.csv"
+    local_copy.write_bytes(b"uploaded")
+
+    stored = mirror.store(blob.name, blob.md5_hash, blob.generation, str(local_copy))
+    assert mirror.fetch(blob, blob.md5_hash, blob.generation) == stored
+    assert mirror.get_stats() == {'hits': 1, 'downloads': 0}
+    assert mirror.store(blob.name, None, None, str(local_copy)) is None
+
+
+def test_prune_keeps_only_listed_blobs(bucket, mirror):
+    kept = put(bucket, "documents/a b.csv", b"a")
+    gone = put(bucket, "documents/b.csv", b"b")
+    kept_path = mirror.fetch(kept, kept.md5_hash)
+    gone_path = mirror.fetch(gone, gone.md5_hash)
+
+    mirror.prune([kept.name])
+    assert os.path.exists(kept_path)
+    assert not os.path.exists(gone_path)
+
+
+def test_prune_without_mirror_dir(tmp_path):
+    BlobMirror(str(tmp_path / "never-created")).prune([])
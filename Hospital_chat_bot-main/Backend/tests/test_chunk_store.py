@@ -0,0 +1,78 @@
+import pytest
+from langchain.schema import Document
+
+import chunk_store
+
+
+def doc(text, *sources):
+    metadata = {"source": sources[0]}
+    if len(sources) > 1:
+        metadata["sources"] = list(sources)
+    return Document(page_content=text, metadata=metadata)
+
+
+@pytest.fixture
+def mapped(tmp_path):
+    docs = {
+        "c1": doc("first", "a.pdf"),
+        "c2": doc("second – shared", "a.pdf", "b.pdf"),
+        "c3": doc("third", "b.pdf"),
+    }
+    chunk_store.write_chunks(str(tmp_path), list(docs), chunk_store.SourceTrackedDocstore(dict(docs)))
+    return chunk_store.MappedDocstore(str(tmp_path))
+
+
+def test_round_trip(mapped):
+    assert len(mapped) == 3
+    assert mapped.search("c2").page_content == "second – shared"
+    assert mapped.search("c2").metadata == {"source": "a.pdf", "sources": ["a.pdf", "b.pdf"]}
+    assert mapped.search("missing") == "ID missing not found."
+    assert chunk_store.source_chunk_ids(mapped, "b.pdf") == ["c2", "c3"]
+
+
+def test_overlay_add_and_delete(mapped):
+    mapped.add({"c4": doc("fourth", "c.pdf")})
+    mapped.delete(["c1"])
+
+    assert [chunk_id for chunk_id, _ in mapped.items()] == ["c2", "c3", "c4"]
+    assert len(mapped) == 3
+    assert mapped.search("c4").page_content == "fourth"
+    assert isinstance(mapped.search("c1"), str)
+    assert chunk_store.source_chunk_ids(mapped, "a.pdf") == ["c2"]
+    assert chunk_store.source_chunk_ids(mapped, "c.pdf") == ["c4"]
+
+    with pytest.raises(ValueError):
+        mapped.add({"c2": doc("again", "a.pdf")})
+    with pytest.raises(ValueError):
+        mapped.delete(["c1"])
+
+
+def test_replace_document_in_overlay(mapped):
+    chunk_store.replace_document(mapped, "c3", doc("third", "b.pdf", "d.pdf"))
+    assert mapped.search("c3").metadata["sources"] == ["b.pdf", "d.pdf"]
+    assert chunk_store.source_chunk_ids(mapped, "d.pdf") == ["c3"]
+    assert len(mapped) == 3
+
+
+def test_copy_has_an_independent_overlay(mapped):
+    clone = mapped.copy()
+    clone.delete(["c3"])
+    clone.add({"c5": doc("fifth", "b.pdf")})
+
+    assert [chunk_id for chunk_id, _ in mapped.items()] == ["c1", "c2", "c3"]
+    assert chunk_store.source_chunk_ids(mapped, "b.pdf") == ["c2", "c3"]
+    assert chunk_store.source_chunk_ids(clone, "b.pdf") == ["c2", "c5"]
+
+
+def test_snapshot_of_overlay_reopens_with_changes(tmp_path, mapped):
+    mapped.delete(["c1"])
+    mapped.add({"c4": doc("fourth", "c.pdf")})
+    directory = tmp_path / "next"
+    directory.mkdir()
+    chunk_store.write_chunks(str(directory), ["c2", "c3", "c4"], mapped)
+
+    reopened = chunk_store.MappedDocstore(str(directory))
+    assert [(chunk_id, d.page_content) for chunk_id, d in reopened.items()] == [
+        ("c2", "second – shared"), ("c3", "third"), ("c4", "fourth"),
+    ]
+    assert "a.pdf" in reopened.source_chunk_ids and reopened.source_chunk_ids["c.pdf"] == {"c4"}
@@ -0,0 +1,64 @@
+from langchain.schema import Document
+
+import chunking
+
+COLUMNS = "Name | Dept | Phone"
+
+
+def rows(source, count, columns=COLUMNS):
+    return [
+        Document(page_content=f"Dr. A{i} | Cardiology | 0422-{i:06d}",
+                 metadata={"source": source, "type": "csv", "row": i + 1, "columns": columns})
+        for i in range(count)
+    ]
+
+
+def test_tabular_chunks_hold_whole_rows_within_budget():
+    documents = rows("a.csv", 200)
+    chunks = chunking.chunk_tabular_documents(documents, target_tokens=120)
+
+    assert len(chunks) > 1
+    assert all(chunk.page_content.startswith(COLUMNS + "\n") for chunk in chunks)
+    assert all(tokens <= 120 for tokens in chunking.count_tokens([chunk.page_content for chunk in chunks]))
+    packed = [line for chunk in chunks for line in chunk.page_content.split("\n")[1:]]
+    assert packed == [row.page_content for row in documents]
+    assert chunks[0].metadata["row"] == 1
+    assert chunks[-1].metadata["row_end"] == 200
+
+
+def test_tabular_chunks_do_not_mix_files_or_headers():
+    documents = rows("a.csv", 3) + rows("b.csv", 3) + rows("b.csv", 3, columns="Name | Ward")
+    chunks = chunking.chunk_tabular_documents(documents, target_tokens=1000)
+    assert [(chunk.metadata["source"], chunk.page_content.split("\n")[0]) for chunk in chunks] == [
+        ("a.csv", COLUMNS), ("b.csv", COLUMNS), ("b.csv", "Name | Ward"),
+    ]
+
+
+def test_oversized_row_is_a_chunk_of_its_own():
+    long_row = Document(page_content="word " * 500,
+                        metadata={"source": "a.csv", "type": "csv", "row": 4, "columns": COLUMNS})
+    documents = rows("a.csv", 3) + [long_row] + rows("a.csv", 1)
+    chunks = chunking.chunk_tabular_documents(documents, target_tokens=100)
+    assert [chunk.metadata["row"] for chunk in chunks] == [1, 4, 1]
+
+
+def test_text_chunks_end_on_paragraphs_and_repeat_section_titles():
+    paragraphs = [f"Paragraph {i} describes the visiting hours and the facilities of ward {i}." for i in range(12)]
+    page = "VISITING HOURS\n\n" + "\n\n".join(paragraphs)
+    document = Document(page_content=page, metadata={"source": "brochure.pdf", "type": "pdf", "page": 2})
+    chunks = chunking.chunk_text_documents([document], target_tokens=80)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        lines = chunk.page_content.split("\n")
+        assert lines[0] == "VISITING HOURS"
+        assert all(line in paragraphs for line in lines[1:])
+        assert chunk.metadata == document.metadata
+    assert [line for chunk in chunks for line in chunk.page_content.split("\n")[1:]] == paragraphs
+
+
+def test_split_documents_routes_by_type():
+    pdf_page = Document(page_content="Emergency care is available at all hours.",
+                        metadata={"source": "brochure.pdf", "type": "pdf", "page": 1})
+    chunks = chunking.split_documents([pdf_page] + rows("a.csv", 2))
+    assert [chunk.metadata["type"] for chunk in chunks] == ["pdf", "csv"]
@@ -0,0 +1,61 @@
+from langchain.schema import Document
+
+import dedup
+
+PROSE = ("Cardiology outpatient clinic runs Monday to Saturday from nine in the morning "
+         "until five in the evening on the second floor of the main block near the pharmacy.")
+
+
+def test_find_near_duplicates():
+    edited = PROSE.replace("pharmacy.", "pharmacy!")
+    other = "Emergency services are available around the clock at the casualty entrance."
+    assert dedup.find_near_duplicates([PROSE, other, edited, PROSE]) == [0, 1, 0, 0]
+
+
+def test_find_near_duplicates_does_not_chain_edits():
+    words = PROSE.split()
+    drifted = [" ".join(words[:position] + ["changed"] * 3 + words[position + 3:])
+               for position in range(0, len(words) - 3, 3)]
+    canonical = dedup.find_near_duplicates([PROSE] + drifted)
+    for text, target in zip([PROSE] + drifted, canonical):
+        if target != 0:
+            continue
+        assert dedup.estimated_jaccard(dedup.minhash_signature(text), dedup.minhash_signature(PROSE)) >= dedup.DEDUP_THRESHOLD
+
+
+def test_merge_near_duplicates_merges_edits_within_a_file_only():
+    edited = PROSE.replace("pharmacy", "canteen")
+    chunks = [
+        Document(page_content=PROSE, metadata={"source": "v1.pdf", "type": "pdf"}),
+        Document(page_content=edited, metadata={"source": "v1.pdf", "type": "pdf"}),
+        Document(page_content=edited, metadata={"source": "v2.pdf", "type": "pdf"}),
+    ]
+    assert dedup.estimated_jaccard(dedup.minhash_signature(PROSE), dedup.minhash_signature(edited)) >= dedup.DEDUP_THRESHOLD
+    merged = dedup.merge_near_duplicates(chunks)
+    assert [(chunk.page_content, chunk.metadata["source"]) for chunk in merged] == [(PROSE, "v1.pdf"), (edited, "v2.pdf")]
+
+
+def test_merge_near_duplicates_lists_every_source():
+    chunks = [
+        Document(page_content=PROSE, metadata={"source": "a.pdf", "type": "pdf"}),
+        Document(page_content=PROSE, metadata={"source": "b.pdf", "type": "pdf"}),
+        Document(page_content=PROSE, metadata={"source": "a.pdf", "type": "pdf"}),
+    ]
+    [merged] = dedup.merge_near_duplicates(chunks)
+    assert merged.metadata["source"] == "a.pdf"
+    assert merged.metadata["sources"] == ["a.pdf", "b.pdf"]
+
+
+def test_merge_near_duplicates_keeps_edited_spreadsheet_rows():
+    header = "Name | Dept | Phone\n"
+    rows = "".join(f"Dr. A{i} | Cardiology | 0422-{i:06d}\n" for i in range(30))
+    corrected = rows.replace("0422-000017", "0422-999917")
+    chunks = [
+        Document(page_content=header + rows, metadata={"source": "v1.csv", "type": "csv"}),
+        Document(page_content=header + corrected, metadata={"source": "v2.csv", "type": "csv"}),
+        Document(page_content=header + rows, metadata={"source": "v3.xlsx", "type": "excel"}),
+    ]
+    merged = dedup.merge_near_duplicates(chunks)
+    assert [chunk.page_content for chunk in merged] == [header + rows, header + corrected]
+    assert merged[0].metadata["sources"] == ["v1.csv", "v3.xlsx"]
+    assert "sources" not in merged[1].metadata
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+import document_loader
+from conftest import write_pdf
+
+PARAGRAPH = [
+    "The cardiology outpatient clinic runs from Monday to Saturday between nine",
+    "in the morning and five in the evening on the second floor of the main block.",
+    "Patients should bring their previous reports and a list of current medicines.",
+]
+
+
+def test_page_text_is_usable():
+    text = " ".join(PARAGRAPH)
+    assert document_loader.page_text_is_usable(text)
+    assert not document_loader.page_text_is_usable("Page 3")
+    assert not document_loader.page_text_is_usable(text[:150] + "�" * 50)
+    assert not document_loader.page_text_is_usable(text + "" * 40)
+
+
+def test_only_unusable_pages_go_to_unstructured(tmp_path, monkeypatch):
+    write_pdf(tmp_path / "brochure.pdf", [PARAGRAPH, ["Scanned page"], [], PARAGRAPH])
+    retried = []
+
+    def fake_unstructured(file_path, page_number):
+        retried.append(page_number)
+        return "Text recovered by layout analysis from the scanned page." if page_number == 1 else ""
+
+    monkeypatch.setattr(document_loader, "extract_page_unstructured", fake_unstructured)
+    documents = document_loader.load_pdf(str(tmp_path / "brochure.pdf"), "brochure.pdf", page_workers=1)
+
+    assert retried == [1, 2]
+    assert [(doc.metadata["page"], doc.metadata["extractor"]) for doc in documents] == [
+        (0, "pypdf"), (1, "unstructured"), (3, "pypdf"),
+    ]
+    assert documents[0].page_content.startswith("The cardiology outpatient clinic")
+    assert all(doc.metadata["total_pages"] == 4 for doc in documents)
+
+
+def test_text_pass_never_starts_a_pool(tmp_path):
+    write_pdf(tmp_path / "long.pdf", [PARAGRAPH] * 40)
+    documents = document_loader.load_pdf(str(tmp_path / "long.pdf"), "long.pdf", page_workers=4)
+    assert len(documents) == 40
+    assert 4 not in document_loader._unstructured_pools
+
+
+def test_unstructured_pool_is_reused(tmp_path):
+    write_pdf(tmp_path / "scans.pdf", [["Scan one"], ["Scan two"], PARAGRAPH])
+    pools = []
+    for _ in range(2):
+        documents = document_loader.load_pdf(str(tmp_path / "scans.pdf"), "scans.pdf", page_workers=2)
+        # Whatever Unstructured returns here, the text layer is kept unless it found more
+        assert [doc.metadata["page"] for doc in documents] == [0, 1, 2]
+        pools.append(document_loader._unstructured_pools[2])
+    assert pools[0] is pools[1]
+
+
+def test_render_row_texts_matches_a_row_loop():
+    df = pd.DataFrame({"Name": ["Dr. A", None, "Dr. C", None],
+                       "Room": [101, 102, np.nan, np.nan],
+                       "On call": [True, False, None, None]})
+    expected = [" | ".join("" if pd.isna(value) else str(value) for value in row)
+                if row.notna().any() else "" for _, row in df.iterrows()]
+    assert document_loader.render_row_texts(df).tolist() == expected
+
+
+def test_render_row_texts_keeps_repeated_columns():
+    df = pd.DataFrame([["Dr. A", "0422", "0423"]], columns=["Name", "Phone", "Phone"])
+    assert document_loader.render_row_texts(df).tolist() == ["Dr. A | 0422 | 0423"]
+
+
+def test_dedupe_column_names():
+    assert document_loader.dedupe_column_names(["Name", "Phone", "Phone", "Phone"]) == \
+        ["Name", "Phone", "Phone.1", "Phone.2"]
+    # A generated name never collides with a column already in the header
+    assert document_loader.dedupe_column_names(["X", "X", "X.1"]) == ["X", "X.2", "X.1"]
+
+
+def test_xlsx_is_read_in_batches(tmp_path, monkeypatch):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Name", "Phone", "Phone", None])
+    for i in range(5):
+        sheet.append([f"Dr. {i}", f"0422-{i}", None, "note"] if i != 2 else [None, None, None, None])
+    workbook.save(tmp_path / "staff.xlsx")
+    monkeypatch.setattr(document_loader, "TABULAR_BATCH_ROWS", 2)
+
+    documents = document_loader.load_document(str(tmp_path / "staff.xlsx"))
+    assert [doc.metadata["row"] for doc in documents] == [1, 2, 4, 5]
+    assert documents[0].page_content == "Dr. 0 | 0422-0 |  | note"
+    assert documents[0].metadata["columns"] == "Name | Phone | Phone.1 | Unnamed: 3"
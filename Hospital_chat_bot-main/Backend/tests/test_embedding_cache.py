@@ -0,0 +1,72 @@
+import embedding_cache
+from conftest import HashingEmbeddings
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    """HashingEmbeddings that records every text it is asked to embed."""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return super().embed_query(text)
+
+
+def test_documents_are_embedded_once(tmp_path):
+    model = CountingEmbeddings()
+    cache_path = str(tmp_path / "cache.db")
+    cached = embedding_cache.CachedEmbeddings(model, "hashing", True, cache_path)
+
+    first = cached.embed_documents(["cardiology clinic", "visiting hours", "cardiology clinic"])
+    assert model.embedded == ["cardiology clinic", "visiting hours"]
+    assert first[0] == first[2] == HashingEmbeddings().embed_query("cardiology clinic")
+
+    # A new process (new wrapper) finds the vectors on disk
+    model.embedded.clear()
+    reopened = embedding_cache.CachedEmbeddings(model, "hashing", True, cache_path)
+    assert reopened.embed_documents(["visiting hours", "pharmacy"]) == [first[1], HashingEmbeddings().embed_query("pharmacy")]
+    assert model.embedded == ["pharmacy"]
+
+
+def test_cache_is_keyed_by_model_and_normalization(tmp_path):
+    model = CountingEmbeddings()
+    cache_path = str(tmp_path / "cache.db")
+    for name, normalized in (("hashing", True), ("hashing", False), ("other", True)):
+        embedding_cache.CachedEmbeddings(model, name, normalized, cache_path).embed_documents(["cardiology clinic"])
+    assert model.embedded == ["cardiology clinic"] * 3
+    assert embedding_cache.get_stats(cache_path)["entries"] == 3
+
+
+def test_unreadable_cache_falls_back_to_the_model(tmp_path):
+    model = CountingEmbeddings()
+    cached = embedding_cache.CachedEmbeddings(model, "hashing", True, str(tmp_path / "missing" / "cache.db"))
+    assert cached.embed_documents(["cardiology clinic"]) == [HashingEmbeddings().embed_query("cardiology clinic")]
+
+
+def test_query_cache_evicts_the_least_recently_used():
+    cache = embedding_cache.QueryCache(max_size=2)
+    model_key = ("hashing", True)
+    cache.store(model_key, {"a": [1.0], "b": [2.0]})
+    assert set(cache.lookup(model_key, ["a"])) == {"a"}
+    cache.store(model_key, {"c": [3.0]})
+    assert set(cache.lookup(model_key, ["a", "b", "c"])) == {"a", "c"}
+    # Another model's vectors never answer a lookup
+    assert cache.lookup(("other", True), ["a"]) == {}
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_queries_are_embedded_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "query_cache", embedding_cache.QueryCache(max_size=10))
+    model = CountingEmbeddings()
+    cached = embedding_cache.CachedEmbeddings(model, "hashing", True, str(tmp_path / "cache.db"))
+
+    first = cached.embed_query("cardiology  timings ")
+    assert cached.embed_query("cardiology timings") == first
+    batch = cached.embed_queries(["cardiology timings", "pharmacy", "visiting hours", "pharmacy"])
+    assert batch[0] == first and batch[1] == batch[3] == HashingEmbeddings().embed_query("pharmacy")
+    assert model.embedded == ["cardiology timings", "pharmacy", "visiting hours"]
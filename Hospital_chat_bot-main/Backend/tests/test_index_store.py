@@ -0,0 +1,81 @@
+import numpy as np
+from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+import index_store
+from conftest import HashingEmbeddings
+from lexical_index import BM25Index
+
+LISTING = [
+    {"name": "a.csv", "size": 10, "md5": "bWQ1LWE=", "generation": 1},
+    {"name": "b.pdf", "size": 20, "md5": "bWQ1LWI=", "generation": 2},
+]
+
+
+def test_manifest_matches():
+    manifest = index_store.build_manifest(LISTING, {"a.csv": 3, "b.pdf": 1})
+    assert index_store.manifest_matches(manifest, LISTING)
+    assert index_store.manifest_matches(manifest, list(reversed(LISTING)))
+
+    changed = [dict(LISTING[0], md5="Y2hhbmdlZA=="), LISTING[1]]
+    assert not index_store.manifest_matches(manifest, changed)
+    assert not index_store.manifest_matches(manifest, LISTING[:1])
+    assert not index_store.manifest_matches(manifest, LISTING + [dict(LISTING[0], name="c.csv")])
+
+
+def test_manifest_without_md5_compares_generation_and_size():
+    listing = [{"name": "a.csv", "size": 10, "md5": None, "generation": 7}]
+    manifest = index_store.build_manifest(listing)
+    assert index_store.manifest_matches(manifest, listing)
+    assert not index_store.manifest_matches(manifest, [dict(listing[0], generation=8)])
+    assert not index_store.manifest_matches(manifest, [dict(listing[0], size=11)])
+
+
+def build_store(texts):
+    embeddings = HashingEmbeddings()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    chunk_ids = [f"chunk-{i}" for i in range(len(texts))]
+    store = FAISS.from_embeddings(list(zip(texts, vectors.tolist())), embeddings,
+                                  metadatas=[{"source": f"f{i % 2}.pdf"} for i in range(len(texts))], ids=chunk_ids)
+    store.lexical_index = BM25Index(zip(chunk_ids, texts))
+    return store
+
+
+TEXTS = [f"Ward {i} visiting hours are from {i % 12 + 1} to {i % 12 + 3} in the afternoon" for i in range(30)]
+
+
+def test_save_and_open_round_trip(tmp_path):
+    store = build_store(TEXTS)
+    manifest = index_store.build_manifest(LISTING)
+    index_dir = str(tmp_path / "vector_index")
+    index_store.save_index(store, manifest, index_dir)
+
+    assert index_store.read_manifest(index_dir) == manifest
+    opened = index_store.open_index(HashingEmbeddings(), index_dir)
+    assert opened.index.ntotal == len(TEXTS)
+    query = "Ward 7 visiting hours"
+    assert [doc.page_content for doc in opened.similarity_search(query, k=5)] == \
+           [doc.page_content for doc in store.similarity_search(query, k=5)]
+    assert opened.lexical_index.search(query, 5) == store.lexical_index.search(query, 5)
+    assert opened.docstore.source_chunk_ids["f1.pdf"] == {f"chunk-{i}" for i in range(1, 30, 2)}
+
+
+def test_save_replaces_the_previous_snapshot(tmp_path):
+    index_dir = str(tmp_path / "vector_index")
+    index_store.save_index(build_store(TEXTS), index_store.build_manifest(LISTING), index_dir)
+    index_store.save_index(build_store(TEXTS[:5]), index_store.build_manifest(LISTING[:1]), index_dir)
+
+    assert index_store.open_index(HashingEmbeddings(), index_dir).index.ntotal == 5
+    assert set(index_store.read_manifest(index_dir)["files"]) == {"a.csv"}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["vector_index"]
+
+
+def test_load_index_rejects_stale_snapshots(tmp_path):
+    index_dir = str(tmp_path / "vector_index")
+    index_store.save_index(build_store(TEXTS), index_store.build_manifest(LISTING), index_dir)
+
+    store, manifest = index_store.load_index(HashingEmbeddings(), LISTING, index_dir)
+    assert store is not None and manifest["files"]["a.csv"]["md5"] == LISTING[0]["md5"]
+    assert index_store.load_index(HashingEmbeddings(), LISTING[:1], index_dir) == (None, None)
+    assert index_store.load_index(HashingEmbeddings(), LISTING, str(tmp_path / "missing")) == (None, None)
@@ -0,0 +1,103 @@
+import chunk_store
+from conftest import put_document, write_pdf
+
+BROCHURE = [
+    "KG Hospital Cardiology Department",
+    "The cardiology outpatient clinic runs from Monday to Saturday between nine",
+    "in the morning and five in the evening on the second floor of the main block.",
+    "Patients should bring their previous reports and a list of current medicines.",
+    "For appointments and enquiries call the cardiology desk on 0422 111111.",
+]
+
+
+def indexed_texts(main, source):
+    docstore = main.vectorstore.docstore
+    return [docstore.search(chunk_id).page_content for chunk_id in chunk_store.source_chunk_ids(docstore, source)]
+
+
+def test_revised_pdf_replaces_the_old_revision(server, tmp_path):
+    revised = [line.replace("0422 111111", "0422 222222") for line in BROCHURE]
+    for name, lines in (("v1.pdf", BROCHURE), ("v2.pdf", revised)):
+        write_pdf(tmp_path / name, [lines])
+        assert server.index_document_file(str(tmp_path / name), name)[0]
+
+    assert server.remove_document_file("v1.pdf")[0]
+    texts = indexed_texts(server, "v2.pdf")
+    assert any("0422 222222" in text for text in texts)
+    assert not any("0422 111111" in text for text in texts)
+    assert server.loaded_document_counts == {"v2.pdf": 1}
+
+
+def roster(count, prefix="Dr. A"):
+    return "Name,Dept,Phone\n" + "".join(f"{prefix}{i},Cardiology,0422-{i:06d}\n" for i in range(count))
+
+
+def test_reload_leaves_failed_files_out_of_the_manifest(server):
+    put_document("a.csv", roster(20))
+    put_document("bad.pdf", b"not a pdf")
+
+    success, message = server.reload_all_documents()
+    assert success and "1 out of 2" in message
+    assert set(server.loaded_manifest["files"]) == {"a.csv"}
+    assert server.loaded_document_counts == {"a.csv": 20}
+    # The next start sees bad.pdf as not indexed yet instead of loading the snapshot
+    assert server.load_vectorstore_snapshot()[0] is False
+
+
+def test_manifest_follows_uploads_and_deletes(server, tmp_path):
+    put_document("a.csv", roster(10))
+    assert server.reload_all_documents()[0]
+    (tmp_path / "b.csv").write_text(roster(5, "Dr. B"))
+    assert server.index_document_file(str(tmp_path / "b.csv"), "b.csv")[0]
+
+    files = server.loaded_manifest["files"]
+    assert {name: info["documents"] for name, info in files.items()} == {"a.csv": 10, "b.csv": 5}
+    assert files["b.csv"]["md5"] == server.local_file_info(str(tmp_path / "b.csv"), "b.csv")["md5"]
+    assert server.index_store.read_manifest()["files"] == files
+
+    assert server.remove_document_file("a.csv")[0]
+    assert set(server.loaded_manifest["files"]) == {"b.csv"}
+    assert chunk_store.source_chunk_ids(server.vectorstore.docstore, "a.csv") == []
+
+
+def test_copy_of_a_deleted_file_is_parsed_instead(server):
+    put_document("a.csv", roster(10))
+    assert server.reload_all_documents()[0]
+    put_document("b.csv", roster(10))  # stored as a copy of a.csv, indexing still queued
+    assert server.remove_document_file("a.csv")[0]
+
+    success, _ = server.index_file_copy("b.csv", "a.csv")
+    assert success
+    assert set(server.loaded_manifest["files"]) == {"b.csv"}
+    assert server.loaded_document_counts == {"b.csv": 10}
+    assert chunk_store.source_chunk_ids(server.vectorstore.docstore, "b.csv")
+
+
+def test_batch_copy_of_a_deleted_file_is_parsed_instead(server, tmp_path):
+    put_document("a.csv", roster(10))
+    assert server.reload_all_documents()[0]
+    put_document("b.csv", roster(10))
+    assert server.remove_document_file("a.csv")[0]
+    (tmp_path / "c.csv").write_text(roster(5, "Dr. C"))
+
+    job = server.ReindexJob("upload", "test")
+    success, _ = server.index_uploaded_files([(str(tmp_path / "c.csv"), "c.csv")], [("b.csv", "a.csv")], job)
+    assert success
+    assert job.file_results["b.csv"]["status"] == "indexed" and "copy_of" not in job.file_results["b.csv"]
+    assert server.loaded_document_counts == {"b.csv": 10, "c.csv": 5}
+
+
+def test_deleting_the_last_file_empties_the_other_workers(server):
+    put_document("a.csv", roster(10))
+    assert server.reload_all_documents()[0]
+    other_worker = (server.vectorstore, server.loaded_manifest)
+
+    assert server.remove_document_file("a.csv")[0]
+    assert server.vectorstore is None
+    assert server.index_store.read_manifest()["files"] == {}
+
+    # A worker still serving the old index drops it at its next snapshot check
+    server.install_vectorstore(*other_worker)
+    assert server.refresh_vectorstore_snapshot()
+    assert server.vectorstore is None and server.loaded_document_counts == {}
+    assert not server.refresh_vectorstore_snapshot()
@@ -0,0 +1,89 @@
+import random
+
+import numpy as np
+import pytest
+
+import lexical_index
+from lexical_index import BM25Index
+
+WORDS = [f"w{i}" for i in range(40)]
+
+
+@pytest.fixture
+def corpus():
+    rng = random.Random(0)
+    return {f"c{i}": " ".join(rng.choices(WORDS, k=rng.randint(3, 25))) for i in range(600)}
+
+
+@pytest.fixture
+def queries():
+    rng = random.Random(1)
+    return [" ".join(rng.choices(WORDS, k=3)) for _ in range(40)]
+
+
+def assert_same_results(index, expected, queries):
+    for query in queries:
+        results, reference = index.search(query, 15), expected.search(query, 15)
+        assert len(results) == len(reference)
+        np.testing.assert_allclose([score for _, score in results], [score for _, score in reference], rtol=1e-5)
+        assert {chunk_id for chunk_id, _ in results[:5]} <= {chunk_id for chunk_id, _ in reference}
+
+
+def test_tokenize():
+    assert lexical_index.tokenize("Dr. A17 | Cardiology | 0422-000017") == ["dr", "a17", "cardiology", "0422", "000017"]
+
+
+def test_exact_term_ranks_first():
+    index = BM25Index([("c1", "Dr. Anand | Cardiology"), ("c2", "Dr. Bala | Neurology"), ("c3", "Cardiology ward")])
+    assert [chunk_id for chunk_id, _ in index.search("Bala neurology")] == ["c2"]
+    assert index.search("Cardiology Anand")[0][0] == "c1"
+    assert index.search("unknown") == []
+    assert index.search("cardiology", k=0) == []
+    assert BM25Index([]).search("cardiology") == []
+
+
+def test_incremental_updates_match_a_fresh_build(corpus, queries):
+    chunk_ids = list(corpus)
+    index = BM25Index((chunk_id, corpus[chunk_id]) for chunk_id in chunk_ids[:400])
+    index.add((chunk_id, corpus[chunk_id]) for chunk_id in chunk_ids[400:])
+    index.delete(chunk_ids[50:150] + chunk_ids[450:500])
+
+    live = chunk_ids[:50] + chunk_ids[150:450] + chunk_ids[500:]
+    fresh = BM25Index((chunk_id, corpus[chunk_id]) for chunk_id in live)
+    assert len(index) == len(live)
+    assert_same_results(index, fresh, queries)
+
+    index._compact()
+    assert not index._added
+    assert_same_results(index, fresh, queries)
+
+
+def test_add_rejects_indexed_chunks(corpus):
+    index = BM25Index(list(corpus.items())[:10])
+    with pytest.raises(ValueError):
+        index.add([("c3", "again")])
+    index.delete(["c3"])
+    index.add([("c3", "again")])
+    assert index.search("again")[0][0] == "c3"
+
+
+def test_copy_leaves_the_served_index_unchanged(corpus, queries):
+    index = BM25Index(corpus.items())
+    before = [index.search(query, 15) for query in queries]
+    clone = index.copy()
+    clone.delete(list(corpus)[:100])
+    clone.add([("new", "w1 w2 w3")])
+    assert [index.search(query, 15) for query in queries] == before
+
+
+def test_save_and_load(tmp_path, corpus, queries):
+    index = BM25Index(list(corpus.items())[:500])
+    index.add(list(corpus.items())[500:])
+    index.delete(["c0", "c550"])
+    index.save(str(tmp_path))
+
+    loaded = BM25Index.load(str(tmp_path))
+    assert isinstance(loaded._postings_positions, np.memmap)
+    assert_same_results(loaded, index, queries)
+    assert_same_results(BM25Index.load(str(tmp_path), mmap=False), index, queries)
+    assert BM25Index.load(str(tmp_path / "missing")) is None
@@ -0,0 +1,69 @@
+import os
+import time
+
+import pytest
+
+from document_loader import ParsePool, ParseTimeout
+
+
+def fake_parse(file_path, file_name):
+    """Stands in for load_document in the pool's worker processes."""
+    if file_path == "hang":
+        time.sleep(600)
+    if file_path == "crash":
+        os._exit(3)
+    if file_path == "fail":
+        raise ValueError(f"Could not parse {file_name}")
+    return [file_name, os.getpid()]
+
+
+def test_hung_files_do_not_time_out_the_files_behind_them():
+    pool = ParsePool(2, timeout=3, target=fake_parse)
+    start = time.monotonic()
+    try:
+        hung = [pool.submit("hang", f"hang{i}.pdf") for i in range(2)]
+        queued = [pool.submit("ok", f"file{i}.csv") for i in range(4)]
+        for future in hung:
+            with pytest.raises(ParseTimeout):
+                future.result()
+        assert [future.result()[0] for future in queued] == [f"file{i}.csv" for i in range(4)]
+    finally:
+        pool.shutdown()
+    # Each hung file costs its own timeout once, in parallel, not one per queued file
+    assert time.monotonic() - start < 15
+
+
+def test_failures_and_dead_workers_are_reported_per_file():
+    pool = ParsePool(1, timeout=60, target=fake_parse)
+    try:
+        first = pool.submit("ok", "a.csv").result()
+        with pytest.raises(Exception, match="Could not parse b.pdf"):
+            pool.submit("fail", "b.pdf").result()
+        with pytest.raises(Exception, match="exited"):
+            pool.submit("crash", "c.pdf").result()
+        after_crash = pool.submit("ok", "d.csv").result()
+    finally:
+        pool.shutdown()
+    assert first[0] == "a.csv" and after_crash[0] == "d.csv"
+    assert after_crash[1] != first[1]
+
+
+def test_workers_are_reused_and_stopped():
+    pool = ParsePool(2, timeout=60, target=fake_parse)
+    futures = [pool.submit("ok", f"file{i}.csv") for i in range(6)]
+    pool.shutdown()
+    assert len({future.result()[1] for future in futures}) <= 2
+    assert not pool._idle and not pool._busy
+
+
+def test_shutdown_with_cancel_stops_running_files():
+    pool = ParsePool(1, timeout=600, target=fake_parse)
+    running = pool.submit("hang", "a.pdf")
+    queued = pool.submit("ok", "b.csv")
+    for _ in range(300):
+        if running.running():
+            break
+        time.sleep(0.1)
+    pool.shutdown(cancel=True)
+    assert "cancelled" in str(running.exception())
+    assert queued.cancelled()
@@ -0,0 +1,51 @@
+import subprocess
+import sys
+
+from conftest import put_document
+
+
+def wait(main, job):
+    main.reindex_executor.submit(lambda: None).result()
+    return main.read_job_file(job.job_id)
+
+
+def test_job_runs_to_completion(server):
+    put_document("a.csv", "Name,Dept\nDr. A,Cardiology\n")
+    job = server.submit_reindex_job("reload", "Reload", server.reload_all_documents)
+
+    saved = wait(server, job)
+    assert saved["status"] == "completed" and saved["message"].startswith("Successfully loaded 1")
+    assert saved["files_total"] == saved["files_done"] == 1
+    assert saved["started_at"] and saved["finished_at"]
+    assert server.reindex_jobs[job.job_id].to_dict()["status"] == "completed"
+
+
+def test_failing_job_records_its_error(server):
+    def broken(job=None):
+        raise RuntimeError("disk full")
+
+    job = server.submit_reindex_job("reload", "Reload", broken)
+    saved = wait(server, job)
+    assert saved["status"] == "failed" and saved["message"] == "disk full"
+
+
+def test_read_job_file_rejects_unknown_and_malformed_ids(server):
+    assert server.read_job_file("00000000-0000-0000-0000-000000000000") is None
+    assert server.read_job_file("../manifest") is None
+
+
+def test_jobs_of_exited_workers_are_failed_at_start(server):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    orphaned, live, finished = (server.ReindexJob("reload", name) for name in ("orphaned", "live", "finished"))
+    orphaned.status = live.status = "running"
+    finished.status = "completed"
+    server.write_job_file(orphaned.job_id, {**orphaned.to_dict(), "worker_pid": exited.pid})
+    live.save()
+    server.write_job_file(finished.job_id, {**finished.to_dict(), "worker_pid": exited.pid})
+
+    assert server.fail_orphaned_jobs() == 1
+    saved = server.read_job_file(orphaned.job_id)
+    assert saved["status"] == "failed" and saved["finished_at"]
+    assert server.read_job_file(live.job_id)["status"] == "running"
+    assert server.read_job_file(finished.job_id)["status"] == "completed"
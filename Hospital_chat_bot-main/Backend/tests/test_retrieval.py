@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+import retrieval
+
+
+def clustered_vectors(rng, count, dim=32):
+    """Candidates with near-duplicates, where MMR and plain similarity ranking differ."""
+    centers = rng.standard_normal((max(1, count // 4), dim))
+    return (centers[rng.integers(0, len(centers), count)] + 0.3 * rng.standard_normal((count, dim))).astype(np.float32)
+
+
+@pytest.mark.parametrize("k, fetch_k, lambda_mult", [
+    (15, 30, 0.5), (12, 25, 0.4), (10, 25, 0.5), (6, 15, 0.5), (4, 20, 0.0), (4, 20, 1.0),
+])
+def test_mmr_select_matches_langchain(k, fetch_k, lambda_mult):
+    rng = np.random.default_rng(k * 100 + fetch_k)
+    for _ in range(50):
+        candidates = clustered_vectors(rng, fetch_k)
+        query = candidates[0] + 0.5 * rng.standard_normal(candidates.shape[1]).astype(np.float32)
+        expected = maximal_marginal_relevance(query, list(candidates), k=k, lambda_mult=lambda_mult)
+        assert retrieval.mmr_select(query, candidates, k, lambda_mult) == expected
+
+
+def test_mmr_select_fewer_candidates_than_k():
+    rng = np.random.default_rng(0)
+    candidates = clustered_vectors(rng, 3)
+    selected = retrieval.mmr_select(candidates[1], candidates, k=10)
+    assert sorted(selected) == [0, 1, 2]
+    assert selected[0] == 1
+
+
+def test_mmr_select_no_candidates():
+    assert retrieval.mmr_select(np.ones(4), np.zeros((0, 4)), k=4) == []
+    assert retrieval.mmr_select(np.ones(4), np.ones((2, 4)), k=0) == []
+
+
+def test_mmr_select_skips_duplicates():
+    base = np.eye(4, dtype=np.float32)
+    candidates = np.stack([base[0], base[0], base[1]])
+    query = base[0] + 0.1 * base[1]
+    assert retrieval.mmr_select(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+
+
+def test_reciprocal_rank_fusion():
+    # Chunks ranked by both lists come first; ties keep the first list's order
+    assert retrieval.reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]]) == ["c", "a", "b", "d"]
+    assert retrieval.reciprocal_rank_fusion([["a"], ["b"]]) == ["a", "b"]
@@ -3,6 +3,8 @@ import DatePicker from 'react-datepicker';
 import 'react-datepicker/dist/react-datepicker.css';
 
 const API_BASE_URL = 'http://localhost:8000'; // WiFi network access
+// Stop waiting for an indexing job whose progress has not changed for this long
+const REINDEX_JOB_STALL_TIMEOUT_MS = 15 * 60 * 1000;
 
 // Time formatting helpers (no seconds)
 const formatTime = (date) => {
@@ -860,7 +862,34 @@ const App = () => {
         const error = await response.json();
         throw new Error(error.detail || 'Upload failed');
       }
-      return await response.json();
+      const result = await response.json();
+      if (result.job_id) {
+        await api.waitForReindexJob(result.job_id);
+      }
+      return result;
+    },
+
+    // Indexing runs as a background job on the server; poll until it finishes
+    waitForReindexJob: async (jobId) => {
+      let lastProgress = null;
+      let lastProgressAt = Date.now();
+      while (Date.now() - lastProgressAt < REINDEX_JOB_STALL_TIMEOUT_MS) {
+        // Network errors and server errors are retried until the timeout
+        const response = await fetch(`${API_BASE_URL}/reindex-jobs/${jobId}`).catch(() => null);
+        if (response && response.status === 404) throw new Error('Indexing job not found');
+        if (response && response.ok) {
+          const job = await response.json();
+          if (job.status === 'completed') return job;
+          if (job.status === 'failed') throw new Error(job.message || 'Indexing failed');
+          const progress = [job.status, job.stage, job.files_done, job.chunks_embedded].join('/');
+          if (progress !== lastProgress) {
+            lastProgress = progress;
+            lastProgressAt = Date.now();
+          }
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+      }
+      throw new Error('Indexing status has not changed for 15 minutes; it may still finish in the background');
     },
 
     getDocuments: async () => {
@@ -874,7 +903,11 @@ const App = () => {
         method: 'POST'
       });
       if (!response.ok) throw new Error('Failed to reload documents');
-      return await response.json();
+      const result = await response.json();
+      if (result.job_id) {
+        await api.waitForReindexJob(result.job_id);
+      }
+      return result;
     },
 
     getSystemStatus: async () => {